@@ -61,6 +61,19 @@ bot_status = {
     "last_updated": datetime.now().isoformat()
 }
 
+# Aynı süreçte çalışan bot (main.py kaydeder); yoksa API sadece durumu günceller
+bot_instance = None
+
+def register_bot(bot):
+    """
+    Web API komutlarının uygulanacağı bot örneğini kaydet.
+    
+    Args:
+        bot: DarkEpochBot örneği
+    """
+    global bot_instance
+    bot_instance = bot
+
 # Model tanımlamaları
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -325,6 +338,9 @@ def api_status():
 @app.route('/api/start', methods=['POST'])
 def api_start():
     """Botu başlatma API'si"""
+    if bot_instance is not None and not bot_instance.running and not bot_instance.start():
+        return jsonify({"success": False, "error": "Failed to start bot"}), 500
+    
     bot_status["running"] = True
     bot_status["paused"] = False
     bot_status["last_updated"] = datetime.now().isoformat()
@@ -339,6 +355,10 @@ def api_start():
 @app.route('/api/stop', methods=['POST'])
 def api_stop():
     """Botu durdurma API'si"""
+    # Bekleme ortak durdurma olayıyla kesilir, stop hemen döner
+    if bot_instance is not None and bot_instance.running:
+        bot_instance.stop()
+    
     bot_status["running"] = False
     bot_status["paused"] = False
     bot_status["last_updated"] = datetime.now().isoformat()
@@ -353,6 +373,9 @@ def api_stop():
 @app.route('/api/pause', methods=['POST'])
 def api_pause():
     """Botu duraklatma API'si"""
+    if bot_instance is not None and bot_instance.running and not bot_instance.paused:
+        bot_instance.pause()
+    
     bot_status["paused"] = True
     bot_status["last_updated"] = datetime.now().isoformat()
     
@@ -366,6 +389,9 @@ def api_pause():
 @app.route('/api/resume', methods=['POST'])
 def api_resume():
     """Botu devam ettirme API'si"""
+    if bot_instance is not None and bot_instance.paused:
+        bot_instance.resume()
+    
     bot_status["paused"] = False
     bot_status["last_updated"] = datetime.now().isoformat()
     
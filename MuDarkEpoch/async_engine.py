@@ -0,0 +1,246 @@
+"""
+Dark Epoch Bot - Asyncio Engine
+Runs the bot on a single asyncio event loop: cycles, task waits, status
+reporting to the web API and client process supervision are coroutines,
+while capture, matching and input run on a thread pool.
+"""
+
+import json
+import asyncio
+import logging
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from scheduler import Wait
+
+# Loglama yapılandırması
+logger = logging.getLogger('DarkEpochBot.AsyncEngine')
+
+_DONE = object()  # Adım üreteci bitti
+
+def _advance(steps):
+    """Run a step generator up to its next effect (called on a worker thread)"""
+    try:
+        return next(steps)
+    except StopIteration:
+        return _DONE
+
+class AsyncBotEngine:
+    """
+    Event loop driver of a DarkEpochBot.
+
+    Each client's step generator is advanced on the worker pool, and its
+    Wait effects become asyncio sleeps, so clients overlap during waits and
+    the matching work of several clients runs at the same time. Stop wakes
+    every sleep at once; while paused, sleeps do not end and no step runs.
+    """
+    def __init__(self, bot):
+        """
+        Initialize the engine.
+
+        Args:
+            bot: DarkEpochBot to drive
+        """
+        self.bot = bot
+        self.config = bot.config
+        self.loop = None
+        self.executor = None
+        self._stop_event = None
+        self._resumed = None
+        self._stop_requested = False  # Döngü başlamadan gelen stop için
+        self.cycles = 0
+        self.status_interval = float(self.config.get('status_report_interval', 10.0))
+        self.process_check_interval = float(self.config.get('process_check_interval', 30.0))
+
+    def run(self):
+        """Run the engine on the calling thread until it is stopped"""
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            logger.error(f"Error in asyncio engine: {str(e)}")
+            self.bot.running = False
+        logger.info("Asyncio engine exited")
+
+    def stop(self):
+        """Stop the engine from any thread, also before it has started"""
+        self._stop_requested = True
+        if self.loop is not None and self._stop_event is not None:
+            try:
+                self.loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                pass  # Döngü zaten kapandı
+
+    def set_paused(self, paused):
+        """Pause or resume the engine from any thread (the loop also reads bot.paused on start)"""
+        if self.loop is not None and self._resumed is not None:
+            try:
+                self.loop.call_soon_threadsafe(self._resumed.clear if paused else self._resumed.set)
+            except RuntimeError:
+                pass  # Döngü zaten kapandı
+
+    async def _main(self):
+        # Olaylar döngüden önce atanır: stop/set_paused ikisini birlikte görür
+        self._stop_event = asyncio.Event()
+        self._resumed = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        if self._stop_requested or not self.bot.running:
+            return
+        if not self.bot.paused:
+            self._resumed.set()
+        # Odak ve girdiler eylem kanalında sıralanır; havuz yalnızca algıyı paralelleştirir
+        self.executor = ThreadPoolExecutor(max_workers=self.bot.client_workers,
+                                           thread_name_prefix='BotEngine')
+
+        services = [asyncio.create_task(self._cycle_loop())]
+        if self.status_interval > 0 and self.config.get('web_api_url'):
+            services.append(asyncio.create_task(self._status_loop()))
+        if self.process_check_interval > 0:
+            services.append(asyncio.create_task(self._supervisor_loop()))
+
+        try:
+            await self._stop_event.wait()
+        finally:
+            for service in services:
+                service.cancel()
+            await asyncio.gather(*services, return_exceptions=True)
+            self.executor.shutdown(wait=False)
+
+    @property
+    def stopping(self):
+        return self._stop_event.is_set() or not self.bot.running
+
+    async def sleep(self, seconds, pausable=True):
+        """
+        Sleep unless the engine is stopped first.
+
+        Args:
+            seconds: Seconds to sleep
+            pausable: While paused, keep sleeping past the time (like WaitControl.sleep)
+
+        Returns:
+            bool: True if the full time passed, False if the engine stopped
+        """
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=seconds)
+            return False
+        except asyncio.TimeoutError:
+            pass
+        if pausable:
+            return await self._wait_resumed()
+        return True
+
+    async def _wait_resumed(self):
+        """
+        Wait while the engine is paused.
+
+        Returns:
+            bool: True once running, False if the engine stopped
+        """
+        if not self._resumed.is_set() and not self._stop_event.is_set():
+            waiters = [asyncio.create_task(self._resumed.wait()),
+                       asyncio.create_task(self._stop_event.wait())]
+            _, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in pending:
+                waiter.cancel()
+        return not self._stop_event.is_set()
+
+    async def _offload(self, function, *args):
+        """Run a blocking function on the worker pool"""
+        return await self.loop.run_in_executor(self.executor, function, *args)
+
+    async def _cycle_loop(self):
+        """Run bot cycles until the engine stops"""
+        try:
+            while not self.stopping:
+                if not await self._wait_resumed():
+                    break
+                try:
+                    await self.run_cycle()
+                except Exception as e:
+                    logger.error(f"Error in bot loop: {str(e)}")
+                    self.bot.error_count += 1
+                    if self.bot.error_count >= int(self.config.get('error_threshold', 5)):
+                        logger.critical(f"Error threshold reached ({self.bot.error_count}). Stopping bot.")
+                        self.bot.running = False
+                        break
+
+                # Döngü gecikmesi
+                await self.sleep(Wait(float(self.config.get('cycle_delay_min', 1.0)),
+                                      float(self.config.get('cycle_delay_max', 3.0))).duration)
+        finally:
+            # Bot başka bir yoldan durduysa (running False) motor da kapansın
+            self._stop_event.set()
+
+    async def run_cycle(self):
+        """Run one cycle: every active client's tasks, overlapping during waits"""
+        active_clients = await self._offload(self.bot._cycle_clients)
+        if not active_clients:
+            return
+
+        with self.bot._actuation_lock:
+            self.bot._focused_client = None
+
+        results = await asyncio.gather(
+            *(self._drive_client(client, idx) for idx, client in enumerate(active_clients)),
+            return_exceptions=True
+        )
+        for idx, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"Error while processing client {idx}: {str(result)}")
+        self.cycles += 1
+
+    async def _drive_client(self, client, client_index):
+        """Drive one client's step generator, sleeping on the loop during its waits"""
+        steps = self.bot._client_steps(client, client_index)
+        try:
+            while True:
+                if self.stopping or not await self._wait_resumed():
+                    return
+
+                effect = await self._offload(_advance, steps)
+                if effect is _DONE:
+                    return
+                if isinstance(effect, Wait) and not await self.sleep(effect.duration):
+                    return
+        finally:
+            # Adım hâlâ bir iş parçacığında çalışıyorsa (iptal) kapatılamaz
+            if not steps.gi_running:
+                steps.close()
+
+    async def _status_loop(self):
+        """Report the bot status to the web API periodically"""
+        url = self.config.get('web_api_url', '').rstrip('/') + '/api/status/update'
+        while not self.stopping:
+            try:
+                await self._offload(self._post_status, url)
+            except Exception as e:
+                logger.debug(f"Status report to {url} failed: {str(e)}")
+            await self.sleep(self.status_interval, pausable=False)
+
+    def _post_status(self, url):
+        """Send the current status (blocking, runs on the worker pool)"""
+        clients = getattr(self.bot.client_manager, 'clients', []) or []
+        active = getattr(self.bot.client_manager, 'active_clients', []) or []
+        payload = {
+            'active_clients': len(active),
+            'total_clients': len(clients),
+            'current_task': self.bot.current_task,
+            'error_count': self.bot.error_count
+        }
+        headers = {'Content-Type': 'application/json'}
+        if self.config.get('api_key'):
+            headers['X-API-Key'] = self.config['api_key']
+        request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                         headers=headers, method='POST')
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+
+    async def _supervisor_loop(self):
+        """Check the client processes periodically"""
+        while not self.stopping:
+            try:
+                active = await self._offload(self.bot.client_manager.check_client_processes)
+                logger.debug(f"Process check: {active} client processes running")
+            except Exception as e:
+                logger.error(f"Error checking client processes: {str(e)}")
+            await self.sleep(self.process_check_interval, pausable=False)
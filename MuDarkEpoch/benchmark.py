@@ -0,0 +1,634 @@
+"""
+Dark Epoch Bot - Perception Benchmark
+Measures find_template, find_all_templates and the detect_* helpers of
+ImageRecognition on synthetic screens with known template placements and
+on recorded frames, for several matching modes, and writes a JSON report
+that later runs can be compared against.
+
+Usage:
+    python benchmark.py [--modes baseline,default] [--resolutions 1280x720,1920x1080]
+                        [--recording DIR --reference-dir DIR] [--output report.json]
+                        [--compare old_report.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+
+# Koşullu olarak OpenCV ve numpy'ı içe aktar
+try:
+    import cv2
+    import numpy as np
+    HAS_CV_SUPPORT = True
+except ImportError:
+    HAS_CV_SUPPORT = False
+
+# Bellek ölçümü için psutil (yoksa Linux'ta /proc kullanılır)
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+# Loglama yapılandırması
+logger = logging.getLogger('DarkEpochBot.Benchmark')
+
+# Eşleştirme modları: varsayılan yapılandırmanın üzerine yazılan ayarlar
+BENCHMARK_MODES = {
+    'baseline': {
+        'frame_diff_gating': False,
+        'memoize_detections': False,
+        'use_search_regions': False,
+        'use_state_cache': False,
+        'target_tracking': False,
+        'pyramid_levels': 0,
+        'color_mode': 'color',
+        'match_backend': 'opencv'
+    },
+    'default': {},
+    'gray': {'color_mode': 'gray'},
+    'pyramid': {'pyramid_levels': 1},
+    'fft': {'match_backend': 'fft'}
+}
+
+DEFAULT_RESOLUTIONS = [(800, 600), (1280, 720), (1920, 1080)]
+
+# Bot'un kullandığı şablonlar: (ad, (genişlik, yükseklik), tür)
+SYNTHETIC_TEMPLATES = [
+    ('login_button', (140, 44), 'button'),
+    ('play_button', (140, 44), 'button'),
+    ('confirm_button', (100, 36), 'button'),
+    ('health_bar', (200, 18), 'bar'),
+    ('minimap', (150, 150), 'map'),
+    ('inventory_button', (40, 40), 'icon'),
+    ('character_button', (40, 40), 'icon'),
+    ('low_health', (32, 32), 'icon'),
+    ('inventory_full', (32, 32), 'icon'),
+    ('mission_panel', (320, 220), 'panel'),
+    ('mission_objective', (24, 24), 'icon'),
+    ('upgrade_indicator', (20, 20), 'icon')
+]
+
+SINGLE_TEMPLATES = ['login_button', 'play_button', 'confirm_button', 'health_bar', 'minimap',
+                    'inventory_button', 'character_button', 'low_health', 'inventory_full',
+                    'mission_panel']
+MULTI_TEMPLATES = ['mission_objective', 'upgrade_indicator']
+DETECTORS = ['classify_screen', 'detect_login_screen', 'detect_main_menu', 'detect_in_game',
+             'detect_low_health', 'detect_full_inventory']
+
+def make_template(name, size, kind, rng):
+    """
+    Draw a synthetic UI element.
+
+    Args:
+        name: Template name, drawn as a label on buttons and panels
+        size: (width, height)
+        kind: "button", "bar", "map", "icon" or "panel"
+        rng: numpy random generator
+
+    Returns:
+        numpy.ndarray: BGR image
+    """
+    w, h = size
+    color = tuple(int(c) for c in rng.integers(40, 220, 3))
+    image = np.empty((h, w, 3), dtype=np.uint8)
+    image[:] = color
+
+    # Doku: şablonlar birbirine ve arka plana benzemesin
+    noise = rng.integers(0, 40, (h, w, 1), dtype=np.uint8)
+    image = cv2.add(image, np.repeat(noise, 3, axis=2))
+
+    if kind == 'button':
+        # Rastgele bloklar: benzer düğmeler birbiriyle karışmasın
+        for _ in range(3):
+            x, y = int(rng.integers(0, w - 12)), int(rng.integers(0, h - 8))
+            cv2.rectangle(image, (x, y), (x + 12, y + 8), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        cv2.rectangle(image, (1, 1), (w - 2, h - 2), (255, 255, 255), 2)
+        cv2.putText(image, name.split('_')[0].upper(), (8, h // 2 + 6),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.55, (20, 20, 20), 2)
+    elif kind == 'bar':
+        filled = int(w * rng.uniform(0.5, 0.9))
+        cv2.rectangle(image, (0, 0), (filled, h - 1), (30, 30, 200), -1)
+        cv2.rectangle(image, (0, 0), (w - 1, h - 1), (220, 220, 220), 1)
+    elif kind == 'map':
+        for _ in range(12):
+            center = tuple(int(v) for v in rng.integers(0, min(w, h), 2))
+            cv2.circle(image, center, int(rng.integers(4, 20)),
+                       tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        cv2.rectangle(image, (0, 0), (w - 1, h - 1), (200, 200, 200), 2)
+    elif kind == 'icon':
+        cv2.circle(image, (w // 2, h // 2), min(w, h) // 3,
+                   tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        cv2.putText(image, name[0].upper(), (w // 4, 3 * h // 4),
+                    cv2.FONT_HERSHEY_PLAIN, max(0.6, h / 30), (255, 255, 255), 1)
+        cv2.rectangle(image, (0, 0), (w - 1, h - 1), (0, 0, 0), 1)
+    else:
+        cv2.rectangle(image, (2, 2), (w - 3, h - 3), (230, 230, 230), 2)
+        cv2.putText(image, name.replace('_', ' '), (12, 28),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        for line in range(4):
+            y = 60 + line * 36
+            cv2.line(image, (16, y), (int(w * rng.uniform(0.4, 0.9)), y), (250, 250, 250), 3)
+
+    return image
+
+def make_templates(seed=0):
+    """
+    Create the synthetic template set.
+
+    Returns:
+        dict: {name: BGR image}
+    """
+    rng = np.random.default_rng(seed)
+    return {name: make_template(name, size, kind, rng) for name, size, kind in SYNTHETIC_TEMPLATES}
+
+def _place(occupied, size, screen_size, rng, attempts=50):
+    """Find a random position for a template that does not overlap earlier ones"""
+    w, h = size
+    for _ in range(attempts):
+        x = int(rng.integers(0, screen_size[0] - w))
+        y = int(rng.integers(0, screen_size[1] - h))
+        if all(x + w <= ox or ox + ow <= x or y + h <= oy or oy + oh <= y
+               for ox, oy, ow, oh in occupied):
+            occupied.append((x, y, w, h))
+            return x, y
+    return None
+
+def _scene(templates, screen_size, rng):
+    """Pick the screen state and template placements of a scene"""
+    state = rng.choice(['login', 'main_menu', 'in_game', 'in_game'])
+    names = {'login': ['login_button'], 'main_menu': ['play_button']}.get(
+        state, ['health_bar', 'minimap', 'inventory_button', 'character_button'])
+
+    if state == 'in_game':
+        names += [name for name in ('low_health', 'inventory_full', 'mission_panel', 'confirm_button')
+                  if rng.random() < 0.4]
+        names += ['mission_objective'] * int(rng.integers(1, 5))
+        names += ['upgrade_indicator'] * int(rng.integers(0, 4))
+
+    occupied, placements = [], []
+    for name in names:
+        h, w = templates[name].shape[:2]
+        position = _place(occupied, (w, h), screen_size, rng)
+        if position is not None:
+            placements.append((name, position[0], position[1], w, h))
+    return str(state), placements
+
+def synthetic_frames(templates, screen_size, count=20, scene_length=5, seed=0):
+    """
+    Generate a sequence of synthetic screens with known template placements.
+
+    Templates stay in place for scene_length frames while a sprite moves
+    across the background, like a game screen between two input actions.
+
+    Args:
+        templates: {name: BGR image}
+        screen_size: (width, height)
+        count: Number of frames
+        scene_length: Frames per scene
+        seed: Random seed
+
+    Yields:
+        tuple: (BGR screen, {"state": str, "placements": [(name, x, y, w, h)]})
+    """
+    rng = np.random.default_rng(seed)
+    width, height = screen_size
+
+    # Yumuşak gürültülü arka plan
+    background = cv2.resize(rng.integers(0, 120, (height // 16 + 1, width // 16 + 1, 3), dtype=np.uint8),
+                            (width, height), interpolation=cv2.INTER_CUBIC)
+
+    state, placements = None, []
+    for index in range(count):
+        if index % scene_length == 0:
+            state, placements = _scene(templates, screen_size, rng)
+
+        screen = background.copy()
+        sx = (index * 37) % max(1, width - 60)
+        sy = (index * 23) % max(1, height - 60)
+        cv2.rectangle(screen, (sx, sy), (sx + 60, sy + 60), (90, 160, 90), -1)
+
+        for name, x, y, w, h in placements:
+            screen[y:y + h, x:x + w] = templates[name]
+        yield screen, {'state': state, 'placements': placements}
+
+def recorded_frames(path, limit=None):
+    """
+    Read the frames of a recording made with FrameRecorder.
+
+    Yields:
+        tuple: (BGR screen, None) since recorded frames carry no ground truth
+    """
+    from recording import Recording
+    recording = Recording(path)
+    for index, (entry, image) in enumerate(recording.iter_frames()):
+        if limit is not None and index >= limit:
+            break
+        # Bellek eşlemeli salt okunur görünümü zamanlamadan önce kopyala
+        yield np.array(image), None
+
+class _Accuracy:
+    """Counts correct, missed and false detections against known placements"""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.false_positives = 0
+        self.states = 0
+        self.state_errors = 0
+
+    @staticmethod
+    def _near(point, placement):
+        name, x, y, w, h = placement
+        tolerance = max(4, min(w, h) // 4)
+        return abs(point[0] - (x + w // 2)) <= tolerance and abs(point[1] - (y + h // 2)) <= tolerance
+
+    def score(self, name, found, placements, multiple=False):
+        """
+        Score the result of a search against the placements of a frame.
+
+        Args:
+            name: Template searched for
+            found: Point found by find_template (or None), or list of points
+                found by find_all_templates
+            placements: Known (name, x, y, w, h) placements
+            multiple: True for find_all_templates results
+        """
+        expected = [p for p in placements if p[0] == name]
+        points = found if multiple else ([] if found is None else [found])
+        matched = set()
+        for point in points:
+            index = next((i for i, p in enumerate(expected) if i not in matched and self._near(point, p)), None)
+            if index is None:
+                self.false_positives += 1
+            else:
+                matched.add(index)
+        self.hits += len(matched)
+        # Tekli arama en fazla bir yerleşimi bulabilir
+        wanted = len(expected) if multiple else min(1, len(expected))
+        self.misses += max(0, wanted - len(matched))
+
+    def score_state(self, state, expected):
+        """Score a classify_screen result"""
+        self.states += 1
+        if state != expected:
+            self.state_errors += 1
+
+    def to_dict(self):
+        found = self.hits + self.false_positives
+        expected = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'false_positives': self.false_positives,
+            'precision': round(self.hits / found, 4) if found else None,
+            'recall': round(self.hits / expected, 4) if expected else None,
+            'state_accuracy': round(1 - self.state_errors / self.states, 4) if self.states else None
+        }
+
+def _operations(recognition, names):
+    """Build the (operation, label, template, function) list run on every frame"""
+    operations = []
+    for detector in DETECTORS:
+        operations.append(('detect', detector, None, getattr(recognition, detector)))
+    for name in SINGLE_TEMPLATES:
+        if name in names:
+            operations.append(('find_template', name, name,
+                               lambda frame, n=name: recognition.find_template(n, screen=frame)))
+    for name in MULTI_TEMPLATES:
+        if name in names:
+            operations.append(('find_all_templates', name, name,
+                               lambda frame, n=name: recognition.find_all_templates(n, screen=frame)))
+    return operations
+
+def _summarize(latencies):
+    """Latency percentiles and throughput of a list of per-call seconds"""
+    values = np.array(latencies) * 1000
+    total = values.sum() / 1000
+    return {
+        'calls': len(values),
+        'mean_ms': round(float(values.mean()), 4),
+        'p50_ms': round(float(np.percentile(values, 50)), 4),
+        'p90_ms': round(float(np.percentile(values, 90)), 4),
+        'p99_ms': round(float(np.percentile(values, 99)), 4),
+        'max_ms': round(float(values.max()), 4),
+        'throughput_per_s': round(len(values) / total, 2) if total > 0 else None
+    }
+
+def _rss_bytes():
+    """
+    Resident set size of this process.
+
+    Unlike tracemalloc, this includes the native allocations of OpenCV and
+    numpy.
+
+    Returns:
+        int: RSS in bytes, or None if it cannot be read on this platform
+    """
+    if HAS_PSUTIL:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _create_recognition(reference_dir, work_dir, overrides):
+    """Create an ImageRecognition instance for one benchmark mode"""
+    from image_recognition import ImageRecognition
+    config = {
+        'reference_images_dir': reference_dir,
+        'use_template_store': False,
+        'search_regions_path': os.path.join(work_dir, 'search_regions.json'),
+        'watch_reference_images': False,
+        'background_capture': False,
+        'record_frames': False,
+        'capture_backend': 'pyautogui'
+    }
+    config.update(overrides)
+    return ImageRecognition(config)
+
+def run_mode(mode, overrides, sources, reference_dir, warmup=1, measure_memory=True):
+    """
+    Benchmark one matching mode on every frame source.
+
+    Args:
+        mode: Mode name
+        overrides: Configuration overrides of the mode
+        sources: {source name: function returning an iterable of (screen, truth)}
+        reference_dir: Directory with the reference images
+        warmup: Frames per source run before measuring (template scaling, caches)
+        measure_memory: Also sample the process RSS after every frame
+
+    Returns:
+        dict: Results per source with per-operation latency statistics,
+            frames per second, accuracy (synthetic sources) and peak RSS
+
+    Every operation is timed on its own frame context and screen stream, so
+    it never reuses the memoized results of the operations before it. The
+    frame time is measured in a second pass where all operations share one
+    context, as in a bot cycle.
+    """
+    work_dir = tempfile.mkdtemp(prefix='bench_')
+    try:
+        start_rss = _rss_bytes() if measure_memory else None
+        recognition = _create_recognition(reference_dir, work_dir, overrides)
+        names = set(recognition._template_sources)
+        operations = _operations(recognition, names)
+        results = {}
+
+        for source_name, frames in sources.items():
+            latencies = {}
+            accuracy = _Accuracy()
+            has_truth = False
+            frame_times = []
+            peak_rss = start_rss
+
+            for index, (screen, truth) in enumerate(frames()):
+                for kind, label, template_name, function in operations:
+                    # Ayrı bağlam ve akış: önceki işlemlerin sonuçları ölçüme karışmasın
+                    frame = recognition.create_frame_context({'id': f'benchmark-{source_name}-{kind}:{label}'})
+                    frame.set_image(screen)
+                    start = time.perf_counter()
+                    found = function(frame)
+                    elapsed = time.perf_counter() - start
+
+                    if index < warmup:
+                        continue
+                    latencies.setdefault((kind, label), []).append(elapsed)
+                    if truth is None:
+                        continue
+                    has_truth = True
+                    if template_name is not None:
+                        accuracy.score(template_name, found, truth['placements'],
+                                       multiple=kind == 'find_all_templates')
+                    elif label == 'classify_screen':
+                        accuracy.score_state(found, truth['state'])
+
+                # Döngüdeki gibi tüm işlemler tek bağlamı paylaşır
+                frame = recognition.create_frame_context({'id': f'benchmark-{source_name}'})
+                frame.set_image(screen)
+                frame_start = time.perf_counter()
+                for kind, label, template_name, function in operations:
+                    function(frame)
+                if index >= warmup:
+                    frame_times.append(time.perf_counter() - frame_start)
+
+                if measure_memory:
+                    rss = _rss_bytes()
+                    if rss is not None:
+                        peak_rss = max(peak_rss or 0, rss)
+
+            if not frame_times:
+                continue
+            results[source_name] = {
+                'frames': len(frame_times),
+                'frame': _summarize(frame_times),
+                'operations': {f"{kind}:{label}": _summarize(values)
+                               for (kind, label), values in latencies.items()},
+                'accuracy': accuracy.to_dict() if has_truth else None
+            }
+            if peak_rss is not None:
+                results[source_name]['peak_rss_mb'] = round(peak_rss / 2 ** 20, 1)
+                results[source_name]['rss_growth_mb'] = round((peak_rss - start_rss) / 2 ** 20, 1)
+
+        recognition.shutdown()
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def run_benchmark(modes=None, resolutions=None, frames_per_resolution=10, recording=None,
+                  reference_dir=None, recording_limit=None, warmup=1, measure_memory=True, seed=0):
+    """
+    Run the benchmark suite.
+
+    Args:
+        modes: Mode names from BENCHMARK_MODES (all by default)
+        resolutions: List of (width, height) for synthetic screens
+        frames_per_resolution: Synthetic frames per resolution
+        recording: Optional recording directory to benchmark as well
+        reference_dir: Reference images for the recording (synthetic
+            templates are used for synthetic screens)
+        recording_limit: Optional maximum number of recorded frames
+        warmup: Frames per source excluded from the measurements
+        measure_memory: Measure the peak RSS of each mode
+        seed: Random seed of the synthetic screens
+
+    Returns:
+        dict: JSON serializable report, or None if image recognition is not available
+    """
+    import image_recognition
+    if not image_recognition.HAS_CV_SUPPORT:
+        # Simüle edilen tanıma rastgele sonuç verir, ölçmenin anlamı yok
+        logger.error("Image recognition dependencies (OpenCV, numpy) not available")
+        return None
+
+    modes = modes or list(BENCHMARK_MODES)
+    resolutions = DEFAULT_RESOLUTIONS if resolutions is None else resolutions
+    report = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count()
+        },
+        'settings': {
+            'resolutions': [list(r) for r in resolutions],
+            'frames_per_resolution': frames_per_resolution,
+            'recording': recording,
+            'warmup': warmup,
+            'seed': seed
+        },
+        'modes': {}
+    }
+
+    synthetic_dir = tempfile.mkdtemp(prefix='bench_templates_')
+    try:
+        templates = make_templates(seed)
+        for name, image in templates.items():
+            cv2.imwrite(os.path.join(synthetic_dir, f'{name}.png'), image)
+
+        synthetic_sources = {}
+        for size in resolutions:
+            def frames(size=size):
+                return synthetic_frames(templates, size, frames_per_resolution, seed=seed)
+            synthetic_sources[f'synthetic_{size[0]}x{size[1]}'] = frames
+
+        recorded_sources = {}
+        if recording:
+            def frames():
+                return recorded_frames(recording, recording_limit)
+            recorded_sources[f'recording_{os.path.basename(os.path.normpath(recording))}'] = frames
+
+        for mode in modes:
+            if mode not in BENCHMARK_MODES:
+                logger.error(f"Unknown benchmark mode: {mode}")
+                continue
+            logger.info(f"Benchmarking mode '{mode}'")
+            results = {}
+            if synthetic_sources:
+                results.update(run_mode(mode, BENCHMARK_MODES[mode], synthetic_sources, synthetic_dir,
+                                        warmup, measure_memory))
+            if recorded_sources:
+                results.update(run_mode(mode, BENCHMARK_MODES[mode], recorded_sources,
+                                        reference_dir or 'reference_images', warmup, measure_memory))
+            report['modes'][mode] = results
+    finally:
+        shutil.rmtree(synthetic_dir, ignore_errors=True)
+
+    return report
+
+def compare_reports(old, new, tolerance=0.1, min_delta_ms=0.05):
+    """
+    Compare the median latencies of two reports.
+
+    Args:
+        old: Earlier report
+        new: Current report
+        tolerance: Relative change below which a difference is ignored
+        min_delta_ms: Absolute change below which a difference is ignored
+            (memoized calls take microseconds and are mostly noise)
+
+    Returns:
+        list: Dicts with mode, source, operation, old/new p50 and the relative
+            change, sorted from the largest slowdown down; "regression" is
+            True for slowdowns beyond the tolerance
+    """
+    rows = []
+    for mode, sources in new.get('modes', {}).items():
+        for source, result in sources.items():
+            old_result = old.get('modes', {}).get(mode, {}).get(source)
+            if old_result is None:
+                continue
+            pairs = [('frame', old_result['frame'], result['frame'])]
+            pairs += [(operation, old_result['operations'][operation], stats)
+                      for operation, stats in result['operations'].items()
+                      if operation in old_result['operations']]
+            for operation, before, after in pairs:
+                if not before['p50_ms']:
+                    continue
+                change = (after['p50_ms'] - before['p50_ms']) / before['p50_ms']
+                rows.append({
+                    'mode': mode,
+                    'source': source,
+                    'operation': operation,
+                    'old_p50_ms': before['p50_ms'],
+                    'new_p50_ms': after['p50_ms'],
+                    'change': round(change, 4),
+                    'regression': (change > tolerance and
+                                   after['p50_ms'] - before['p50_ms'] > min_delta_ms)
+                })
+    return sorted(rows, key=lambda row: -row['change'])
+
+def print_report(report):
+    """Print a short summary of a report"""
+    for mode, sources in report['modes'].items():
+        for source, result in sources.items():
+            frame = result['frame']
+            line = (f"{mode:<10}{source:<28}{frame['p50_ms']:>9.2f} ms/frame p50"
+                    f"{frame['p99_ms']:>9.2f} p99{frame['throughput_per_s']:>9.1f} fps")
+            if 'peak_rss_mb' in result:
+                line += f"{result['peak_rss_mb']:>9.1f} MB RSS"
+            if result['accuracy']:
+                line += f"  precision {result['accuracy']['precision']} recall {result['accuracy']['recall']}"
+            print(line)
+
+def _parse_resolutions(text):
+    return [tuple(int(v) for v in item.split('x')) for item in text.split(',') if item]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the image recognition pipeline")
+    parser.add_argument('--modes', default=','.join(BENCHMARK_MODES),
+                        help="Comma separated modes: " + ', '.join(BENCHMARK_MODES))
+    parser.add_argument('--resolutions', default=','.join(f'{w}x{h}' for w, h in DEFAULT_RESOLUTIONS),
+                        help="Comma separated synthetic screen sizes, empty to skip synthetic screens")
+    parser.add_argument('--frames', type=int, default=10, help="Synthetic frames per resolution")
+    parser.add_argument('--recording', help="Recording directory to benchmark as well")
+    parser.add_argument('--reference-dir', default='reference_images', help="Reference images for the recording")
+    parser.add_argument('--recording-limit', type=int, help="Maximum number of recorded frames")
+    parser.add_argument('--warmup', type=int, default=1, help="Frames per source excluded from measurements")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the RSS measurement")
+    parser.add_argument('--output', default='benchmark_report.json', help="Report file to write")
+    parser.add_argument('--compare', help="Earlier report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Relative slowdown reported as regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(name)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO)
+
+    report = run_benchmark(
+        modes=[m for m in args.modes.split(',') if m],
+        resolutions=_parse_resolutions(args.resolutions),
+        frames_per_resolution=args.frames,
+        recording=args.recording,
+        reference_dir=args.reference_dir,
+        recording_limit=args.recording_limit,
+        warmup=args.warmup,
+        measure_memory=not args.no_memory
+    )
+    if report is None:
+        sys.exit(2)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        rows = compare_reports(previous, report, args.tolerance)
+        regressions = [row for row in rows if row['regression']]
+        for row in rows:
+            if row['regression'] or row['change'] < -args.tolerance:
+                marker = 'SLOWER' if row['regression'] else 'faster'
+                print(f"{marker:<7}{row['mode']:<10}{row['source']:<28}{row['operation']:<40}"
+                      f"{row['old_p50_ms']:>9.3f} -> {row['new_p50_ms']:>9.3f} ms ({row['change']:+.0%})")
+        print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
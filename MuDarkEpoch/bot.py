@@ -9,6 +9,11 @@ import logging
 import json
 import threading
 import platform
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from scheduler import Wait, TaskScheduler, WaitControl, run_blocking, wait_until
+from async_engine import AsyncBotEngine
 
 # Koşullu modül içe aktarma
 try:
@@ -17,7 +22,8 @@ try:
     from image_recognition import ImageRecognition
     from utils import safe_wait, calculate_distance, random_offset
     HAS_GUI_SUPPORT = True
-except ImportError:
+except Exception:
+    # Ekransız Linux'ta pyautogui ImportError yerine KeyError('DISPLAY') fırlatabilir
     HAS_GUI_SUPPORT = False
     # Simüle edilmiş sınıflar ve işlevler oluştur
     class DummyClientManager:
@@ -72,15 +78,33 @@ except ImportError:
             return self.client_tasks.get("dummy_client")
         
     class DummyImageRecognition:
-        def __init__(self):
+        def __init__(self, config=None):
+            pass
+            
+        def create_frame_context(self, client=None):
+            return None
+            
+        def record_decision(self, *args, **kwargs):
+            pass
+            
+        def start(self):
+            pass
+            
+        def shutdown(self):
             pass
             
         def find_template(self, *args, **kwargs):
             return None
             
+        def has_template(self, *args):
+            return False
+            
         def find_all_templates(self, *args, **kwargs):
             return []
             
+        def classify_screen(self, *args):
+            return 'in_game'  # Oyunda olduğunu varsay
+            
         def detect_login_screen(self, *args):
             return False
             
@@ -112,6 +136,13 @@ except ImportError:
         def find_enemies(self, *args, **kwargs):
             return []
             
+        def track_enemies(self, *args, **kwargs):
+            return []
+            
+        def track_resource_nodes(self, *args, **kwargs):
+            return [{'id': None, 'template': 'ore_node', 'x': x, 'y': y, 'score': 1.0}
+                    for x, y in self.find_resource_nodes()]
+            
         def find_mission_objectives(self, *args):
             return None
             
@@ -124,9 +155,12 @@ except ImportError:
         def find_confirm_button(self, *args):
             return None
         
-    def safe_wait(min_time, max_time=None):
+    def safe_wait(min_time, max_time=None, control=None):
         """Dummy safe_wait function"""
-        time.sleep(0.1)
+        if control is not None:
+            control.sleep(0.1)
+        else:
+            time.sleep(0.1)
         
     def calculate_distance(p1, p2):
         """Dummy distance calculation"""
@@ -152,14 +186,36 @@ class DarkEpochBot:
         self.paused = False
         self.error_count = 0
         self.current_task = None
+        self.engaged_targets = {}  # {istemci id: saldırılan hedefin takip kimliği}
+        
+        # Tüm beklemelerin ortak durdurma/duraklatma durumu (stop ve pause beklemeyi keser)
+        self.wait_control = WaitControl()
+        
+        # Paralel döngü: istemcilerin algısı havuzda paralel, girdiler tek bir eylem kanalından sırayla
+        self.parallel_clients = bool(config.get('parallel_clients', False))
+        self.client_workers = max(1, int(config.get('client_workers', 4)))
+        self._client_executor = None
+        self._actuation_lock = threading.RLock()
+        self._focused_client = None  # Eylem kanalının en son odakladığı istemci
+        self._key_hold = None  # Basılı tutulan tuş; sahibi bırakana kadar kanalı başka istemci kullanmaz
+        
+        # Araya serpiştirilmiş döngü: bir istemci beklerken tek iş parçacığı diğerini sürer
+        self.interleave_clients = bool(config.get('interleave_clients', False))
+        
+        # Koşullu beklemelerde ekranın yeniden kontrol aralığı
+        self.wait_poll_interval = float(config.get('wait_poll_interval', 0.25))
+        
+        # Çalışma motoru: "thread" (döngü iş parçacığı) veya "asyncio" (tek olay döngüsü)
+        self.engine = config.get('engine', 'thread')
+        self._async_engine = None
         
         # Koşullu olarak bileşenleri başlat
         if HAS_GUI_SUPPORT:
             self.client_manager = ClientManager(config)
-            self.image_recognition = ImageRecognition()
+            self.image_recognition = ImageRecognition(config)
         else:
             self.client_manager = DummyClientManager(config)
-            self.image_recognition = DummyImageRecognition()
+            self.image_recognition = DummyImageRecognition(config)
         
         # Bot thread'i
         self.bot_thread = None
@@ -182,9 +238,17 @@ class DarkEpochBot:
         
         self.running = True
         self.paused = False
+        self.wait_control.reset()
         
-        # Bot thread'ini başlat
-        self.bot_thread = threading.Thread(target=self._bot_loop)
+        # Önceki stop'ta kapatılan yakalama, kayıt ve şablon izleyicisini yeniden aç
+        self.image_recognition.start()
+        
+        # Bot thread'ini başlat (asyncio motorunda olay döngüsü bu iş parçacığında çalışır)
+        target = self._bot_loop
+        if self.engine == 'asyncio':
+            self._async_engine = AsyncBotEngine(self)
+            target = self._async_engine.run
+        self.bot_thread = threading.Thread(target=target)
         self.bot_thread.daemon = True
         self.bot_thread.start()
         
@@ -199,11 +263,21 @@ class DarkEpochBot:
         
         self.running = False
         self.paused = False
+        self.wait_control.stop()
+        if self._async_engine is not None:
+            self._async_engine.stop()
         
         # Thread'in durmasını bekle
         if self.bot_thread and self.bot_thread.is_alive():
             self.bot_thread.join(timeout=5.0)
         
+        if self._client_executor is not None:
+            self._client_executor.shutdown(wait=False)
+            self._client_executor = None
+        
+        # Öğrenilen tanıma durumunu kaydet
+        self.image_recognition.shutdown()
+        
         logger.info("Bot stopped")
         return True
     
@@ -218,9 +292,24 @@ class DarkEpochBot:
             return False
         
         self.paused = True
+        self.wait_control.pause()
+        self._release_held_key()
+        if self._async_engine is not None:
+            self._async_engine.set_paused(True)
         logger.info("Bot paused")
         return True
     
+    def _release_held_key(self):
+        """Release a key held by _hold_key so the character stops while paused"""
+        with self._actuation_lock:
+            hold = self._key_hold
+            if hold is not None and hold['down']:
+                pyautogui.keyUp(hold['key'])
+                hold['down'] = False
+                hold['released_at'] = time.monotonic()
+            # Devam edildiğinde kullanıcı odağı değiştirmiş olabilir; yeniden odakla
+            self._focused_client = None
+    
     def resume(self):
         """Resume the bot operation"""
         if not self.running:
@@ -232,6 +321,9 @@ class DarkEpochBot:
             return False
         
         self.paused = False
+        self.wait_control.resume()
+        if self._async_engine is not None:
+            self._async_engine.set_paused(False)
         logger.info("Bot resumed")
         return True
     
@@ -245,7 +337,8 @@ class DarkEpochBot:
                 # Döngü gecikmesi
                 safe_wait(
                     float(self.config.get('cycle_delay_min', 1.0)),
-                    float(self.config.get('cycle_delay_max', 3.0))
+                    float(self.config.get('cycle_delay_max', 3.0)),
+                    control=self.wait_control
                 )
             except Exception as e:
                 logger.error(f"Error in bot loop: {str(e)}")
@@ -261,9 +354,38 @@ class DarkEpochBot:
     
     def run_cycle(self):
         """Run a single cycle of the bot operation"""
+        active_clients = self._cycle_clients()
+        if not active_clients:
+            return
+        
+        overlap = self._overlap_mode(active_clients)
+        if overlap == 'interleaved':
+            self._run_clients_interleaved(active_clients)
+            return
+        if overlap == 'parallel':
+            self._run_clients_parallel(active_clients)
+            return
+        
+        # Her istemci için görevleri gerçekleştir
+        for idx, client in enumerate(active_clients):
+            if self.wait_control.stopped:
+                break
+            try:
+                self.client_manager.focus_client(client)
+                self._perform_client_tasks(client, idx)
+            except Exception as e:
+                logger.error(f"Error while processing client {idx}: {str(e)}")
+    
+    def _cycle_clients(self):
+        """
+        Scan the client windows at the start of a cycle.
+        
+        Returns:
+            list: Active clients, or None if there is nothing to do
+        """
         if not HAS_GUI_SUPPORT:
             logger.warning("GUI support not available - simulating bot cycle")
-            return
+            return None
         
         logger.debug("Running bot cycle")
         
@@ -276,65 +398,227 @@ class DarkEpochBot:
         if not active_clients:
             logger.warning("No active clients found")
             self.error_count += 1
-            return
+            return None
         
         # Hata sayacını sıfırla
         self.error_count = 0
+        return active_clients
+    
+    @property
+    def _lane_focus(self):
+        """True if the actuation lane focuses clients instead of the task handlers"""
+        return self.parallel_clients or self.interleave_clients or self.engine == 'asyncio'
+    
+    def _overlap_mode(self, active_clients):
+        """
+        Check how the clients of this cycle can overlap.
         
-        # Her istemci için görevleri gerçekleştir
-        for idx, client in enumerate(active_clients):
+        Overlapping clients needs client-scoped capture, since a client's
+        window rectangle can then be captured without focusing it.
+        
+        Returns:
+            str: "interleaved", "parallel" or None for one client after another
+        """
+        if not self._lane_focus or len(active_clients) < 2:
+            return None
+        
+        if not getattr(self.image_recognition, 'client_scoped_capture', False):
+            logger.warning("Overlapping client cycle needs client_scoped_capture, running clients sequentially")
+            return None
+        
+        return 'interleaved' if self.interleave_clients else 'parallel'
+    
+    def _run_clients_parallel(self, active_clients):
+        """
+        Process all clients at the same time on the client worker pool.
+        
+        Capturing and analyzing run concurrently; every input action goes
+        through the actuation lane, which focuses the acting client first.
+        
+        Args:
+            active_clients: Clients of this cycle
+        """
+        if self._client_executor is None:
+            self._client_executor = ThreadPoolExecutor(
+                max_workers=self.client_workers, thread_name_prefix='BotClient'
+            )
+        
+        # Kullanıcı odağı değiştirmiş olabilir, ilk eylemde yeniden odakla
+        with self._actuation_lock:
+            self._focused_client = None
+        
+        futures = {
+            self._client_executor.submit(self._perform_client_tasks, client, idx): idx
+            for idx, client in enumerate(active_clients)
+        }
+        for future in as_completed(futures):
             try:
-                self.client_manager.focus_client(client)
-                self._perform_client_tasks(client, idx)
+                future.result()
             except Exception as e:
-                logger.error(f"Error while processing client {idx}: {str(e)}")
+                logger.error(f"Error while processing client {futures[future]}: {str(e)}")
+    
+    def _run_clients_interleaved(self, active_clients):
+        """
+        Process all clients on this thread, switching clients during waits.
+        
+        Each client's task runs as a step generator on a TaskScheduler; when
+        a client waits for an animation or travel, the next due client is
+        driven meanwhile. Input goes through the actuation lane as well.
+        
+        Args:
+            active_clients: Clients of this cycle
+        """
+        self._focused_client = None
+        scheduler = TaskScheduler(sleep=self.wait_control.sleep)
+        for idx, client in enumerate(active_clients):
+            scheduler.add(idx, self._client_steps(client, idx))
+        
+        started = time.monotonic()
+        scheduler.run()
+        elapsed = time.monotonic() - started
+        logger.debug(f"Interleaved {len(active_clients)} clients: {scheduler.steps} steps, "
+                     f"{scheduler.waited:.1f}s of waits in {elapsed:.1f}s")
+    
+    def _focus_client(self, client, min_wait, max_wait):
+        """
+        Focus a client before its actions and let the window settle.
+        
+        When clients overlap, the actuation lane focuses the client right
+        before each input action instead, so nothing happens here.
+        
+        Args:
+            client: Client info dictionary
+            min_wait: Minimum settle time in seconds
+            max_wait: Maximum settle time in seconds
+        """
+        if self._lane_focus:
+            return
+        self.client_manager.focus_client(client)
+        yield Wait(min_wait, max_wait)
+    
+    @contextmanager
+    def _actuation(self, frame=None):
+        """
+        Run input actions in the actuation lane.
+        
+        Only one client sends input at a time. When clients overlap, the
+        client the frame belongs to is focused first if another client
+        acted last.
+        
+        Args:
+            frame: Optional FrameContext of the acting client
+        """
+        with self._actuation_lock:
+            client = getattr(frame, 'client', None)
+            if self._lane_focus and isinstance(client, dict):
+                key = self._lane_key(frame)
+                if key != self._focused_client:
+                    self.client_manager.focus_client(client)
+                    self._focused_client = key
+            yield
+    
+    def _lane_key(self, frame=None):
+        """
+        Identify the client a frame belongs to in the actuation lane.
+        
+        Args:
+            frame: Optional FrameContext of the acting client
+            
+        Returns:
+            The client's window handle or id, None without a client
+        """
+        client = getattr(frame, 'client', None)
+        if isinstance(client, dict):
+            return client.get('hwnd', client.get('id'))
+        return None
+    
+    def _act(self, frame, action):
+        """
+        Run an input action in the actuation lane once no other client owns it.
+        
+        Generator: while another client holds a key, waits in steps of
+        wait_poll_interval so the holder keeps its focus.
+        
+        Args:
+            frame: Optional FrameContext of the acting client
+            action: Callable sending the input
+        """
+        key = self._lane_key(frame)
+        while True:
+            with self._actuation_lock:
+                hold = self._key_hold
+                if hold is None or hold['owner'] == key:
+                    with self._actuation(frame):
+                        action()
+                    return
+            yield Wait(self.wait_poll_interval)
     
     def _perform_client_tasks(self, client, client_index):
         """
-        Perform tasks for a specific client.
+        Perform tasks for a specific client, blocking until they are done.
         
         Args:
             client: The client object/window
             client_index: Index of the client
         """
-        # Ekran görüntüsü al
-        screen = None  # self.image_recognition.get_screen()
+        return run_blocking(self._client_steps(client, client_index), sleep=self.wait_control.sleep)
+    
+    def _client_steps(self, client, client_index):
+        """
+        Step generator of a client's tasks for one cycle.
+        
+        Task handlers yield Wait effects instead of sleeping, so a scheduler
+        can drive other clients while this one waits; run_blocking simply
+        sleeps through them.
+        
+        Args:
+            client: The client object/window
+            client_index: Index of the client
+        """
+        # Döngü boyunca tüm dedektörlerin paylaşacağı kare
+        frame = self.image_recognition.create_frame_context(client)
         
-        # Ekran durumunu tespit et
-        if self.image_recognition.detect_login_screen(screen):
+        # Ekran durumunu tespit et (öğrenilmiş parmak izleri önce denenir)
+        screen_state = self.image_recognition.classify_screen(frame)
+        self.image_recognition.record_decision(frame, 'screen_state', state=screen_state)
+        
+        if screen_state == 'login':
             logger.info(f"Client {client_index}: Login screen detected")
-            self._handle_login(client)
-        elif self.image_recognition.detect_main_menu(screen):
+            yield from self._handle_login(client, frame)
+        elif screen_state == 'main_menu':
             logger.info(f"Client {client_index}: Main menu detected")
-            self._handle_main_menu(client)
-        elif self.image_recognition.detect_in_game(screen):
+            yield from self._handle_main_menu(client, frame)
+        elif screen_state == 'in_game':
             logger.info(f"Client {client_index}: In-game detected")
-            self._handle_in_game(client, client_index)
+            yield from self._handle_in_game(client, client_index, frame)
         else:
             logger.warning(f"Client {client_index}: Unknown screen state")
-            self._handle_unknown_screen(client)
+            yield from self._handle_unknown_screen(client, frame)
+        
+        if frame is not None:
+            logger.debug(f"Client {client_index}: {frame.capture_count} screen captures this cycle")
     
-    def _handle_login(self, client):
+    def _handle_login(self, client, frame=None):
         """Handle login screen"""
         # Login button'u bul ve tıkla
-        login_pos = self.image_recognition.find_login_button()
+        login_pos = self.image_recognition.find_login_button(frame)
         if login_pos:
-            self._safe_click(*login_pos)
+            yield from self._safe_click(*login_pos, frame=frame)
             logger.info("Clicked login button")
         else:
             logger.warning("Login button not found")
     
-    def _handle_main_menu(self, client):
+    def _handle_main_menu(self, client, frame=None):
         """Handle main menu screen"""
         # Play button'u bul ve tıkla
-        play_pos = self.image_recognition.find_play_button()
+        play_pos = self.image_recognition.find_play_button(frame)
         if play_pos:
-            self._safe_click(*play_pos)
+            yield from self._safe_click(*play_pos, frame=frame)
             logger.info("Clicked play button")
         else:
             logger.warning("Play button not found")
     
-    def _handle_in_game(self, client, client_index):
+    def _handle_in_game(self, client, client_index, frame=None):
         """
         Handle in-game actions based on client index.
         Each client might have different tasks based on database task definitions.
@@ -342,6 +626,7 @@ class DarkEpochBot:
         Args:
             client: Client object
             client_index: Index of client (0 or 1 for active clients)
+            frame: Optional FrameContext shared with the screen detection
         """
         # İstemciye atanmış görevi kontrol et
         client_task = self.client_manager.get_client_task(client)
@@ -356,49 +641,54 @@ class DarkEpochBot:
             logger.info(f"Executing assigned task for client {client_index}: {task_name}")
             
             if task_type == 'resource_gathering':
-                self._perform_resource_gathering(client, task_params)
+                yield from self._perform_resource_gathering(client, task_params, frame)
             elif task_type == 'combat':
-                self._perform_combat_actions(client, task_params)
+                yield from self._perform_combat_actions(client, task_params, frame)
             elif task_type == 'mission':
-                self._perform_mission_tasks(client, task_params)
+                yield from self._perform_mission_tasks(client, task_params, frame)
             else:
                 logger.warning(f"Unknown task type: {task_type}")
-                self._perform_character_maintenance(client)
+                yield from self._perform_character_maintenance(client, frame=frame)
         else:
             # Varsayılan görevler - client indexe göre
             if client_index == 0:
                 # İlk istemci için görevler
                 self.current_task = "Resource Gathering"
                 logger.info(f"Executing default task for client {client_index}: Resource Gathering")
-                self._perform_resource_gathering(client)
+                yield from self._perform_resource_gathering(client, frame=frame)
             elif client_index == 1:
                 # İkinci istemci için görevler
                 self.current_task = "Combat"
                 logger.info(f"Executing default task for client {client_index}: Combat")
-                self._perform_combat_actions(client)
+                yield from self._perform_combat_actions(client, frame=frame)
             else:
                 # Diğer istemciler için varsayılan görevler
                 self.current_task = "Basic Maintenance"
                 logger.info(f"Executing default task for client {client_index}: Basic Maintenance")
-                self._perform_character_maintenance(client)
+                yield from self._perform_character_maintenance(client, frame=frame)
     
-    def _handle_unknown_screen(self, client):
+    def _handle_unknown_screen(self, client, frame=None):
         """Handle unknown screen by trying common actions"""
         # ESC tuşuna bas
         if HAS_GUI_SUPPORT:
-            pyautogui.press('esc')
-            safe_wait(1.0, 2.0)
+            yield from self._press_key('esc', frame)
+            # Ekran tanınır hale gelene kadar bekle
+            yield from self._wait_until(
+                frame, lambda f: self.image_recognition.classify_screen(f) != 'unknown',
+                timeout=2.0, min_wait=0.3
+            )
         
         # Rastgele bir yere tıkla
         # TODO: Implement random click logic
     
-    def _perform_resource_gathering(self, client=None, task_params=None):
+    def _perform_resource_gathering(self, client=None, task_params=None, frame=None):
         """
         Perform resource gathering actions
         
         Args:
             client: Client window to perform actions on
             task_params: Parameters for the resource gathering task
+            frame: Optional FrameContext shared within the cycle
         """
         # Veritabanından görev parametrelerini al veya varsayılanları kullan
         if task_params is None:
@@ -415,17 +705,16 @@ class DarkEpochBot:
             
         # İstemciye odaklan (varsa)
         if client and HAS_GUI_SUPPORT:
-            self.client_manager.focus_client(client)
-            safe_wait(0.5, 1.0)
+            yield from self._focus_client(client, 0.5, 1.0)
         
         # Kaynak düğümlerini bul
         resource_types = task_params.get('resource_types', ['ore', 'herb', 'wood'])
         logger.info(f"Searching for resource nodes: {resource_types}")
-        resource_positions = self.image_recognition.find_resource_nodes(limit=5)
+        resource_nodes = self.image_recognition.track_resource_nodes(frame, limit=5)
         
-        if not resource_positions:
+        if not resource_nodes:
             logger.warning("No resource nodes found, performing random movement to search")
-            self._random_movement()
+            yield from self._random_movement(frame)
             return False
         
         # Mevcut pozisyonu al (istemci merkezi veya ekran merkezi)
@@ -442,65 +731,72 @@ class DarkEpochBot:
                 center_x, center_y = 400, 300  # Varsayılan merkez
         
         # En yakın kaynağı bul
-        closest_resource = resource_positions[0]
-        min_distance = calculate_distance((center_x, center_y), closest_resource)
+        closest_node = resource_nodes[0]
+        min_distance = calculate_distance((center_x, center_y), (closest_node['x'], closest_node['y']))
         
-        for pos in resource_positions[1:]:
-            dist = calculate_distance((center_x, center_y), pos)
+        for node in resource_nodes[1:]:
+            dist = calculate_distance((center_x, center_y), (node['x'], node['y']))
             if dist < min_distance:
                 min_distance = dist
-                closest_resource = pos
+                closest_node = node
+        
+        # Düğümün takip kimliği (kamera kaysa da aynı düğüm izlenir)
+        closest_resource = (closest_node['x'], closest_node['y'])
+        node_id = closest_node['id']
         
         # En yakın kaynağa tıkla
         logger.info(f"Moving to nearest resource at {closest_resource}")
-        self._safe_click(*closest_resource)
-        
-        # Toplama işleminin başlamasını bekle
-        safe_wait(1.0, 2.0)
+        yield from self._safe_click(*closest_resource, frame=frame)
         
-        # Toplama animasyonunun tamamlanmasını bekle
+        # Toplama bitene kadar bekle: envanter dolar ya da düğüm kaybolur
         gather_wait_time = min(5.0, task_params.get('gather_time', 3.0))
-        logger.debug(f"Waiting for gathering animation ({gather_wait_time}s)")
-        safe_wait(gather_wait_time, gather_wait_time + 1.0)
+        logger.debug(f"Waiting for gathering to finish (max {gather_wait_time + 3.0:.1f}s)")
+        yield from self._wait_until(
+            frame,
+            lambda f: (self.image_recognition.detect_full_inventory(f)
+                       or not self._resource_node_present(f, node_id, closest_resource)),
+            timeout=gather_wait_time + 3.0, min_wait=1.0
+        )
         
         # İşlem sonrası kontroller
         
         # 1. Envanter doluluk kontrolü
-        if self.image_recognition.detect_full_inventory():
+        if self.image_recognition.detect_full_inventory(frame):
             logger.info("Inventory is full")
             
             # Üsse dönme ayarı varsa
             if task_params.get('return_to_base', False):
                 logger.info("Returning to base to empty inventory")
-                self._return_to_base(client)
+                yield from self._return_to_base(client, frame)
             else:
                 logger.info("Stopping resource gathering due to full inventory")
             
             return True
         
         # 2. Düşük sağlık kontrolü
-        if self.image_recognition.detect_low_health():
+        if self.image_recognition.detect_low_health(frame):
             logger.warning("Low health detected during resource gathering")
-            self._use_health_items()
+            yield from self._use_health_items(frame=frame)
             
             # Sağlık çok düşükse üsse dön
             health_percent = task_params.get('retreat_health_percent', 30)
             if health_percent < 30:  # 30% altı kritik seviye
                 logger.warning(f"Health below critical level ({health_percent}%), returning to base")
-                self._return_to_base(client)
+                yield from self._return_to_base(client, frame)
                 return False
         
         # Başarılı toplama
         logger.info("Successfully gathered resources")
         return True
     
-    def _perform_character_maintenance(self, client=None, task_params=None):
+    def _perform_character_maintenance(self, client=None, task_params=None, frame=None):
         """
         Perform character maintenance actions
         
         Args:
             client: Client window to perform actions on
             task_params: Parameters for the maintenance task
+            frame: Optional FrameContext shared within the cycle
         """
         if task_params is None:
             task_params = {
@@ -511,33 +807,33 @@ class DarkEpochBot:
         
         # İstemciye odaklan (varsa)
         if client and HAS_GUI_SUPPORT:
-            self.client_manager.focus_client(client)
-            safe_wait(0.5, 1.0)
+            yield from self._focus_client(client, 0.5, 1.0)
             
         # Envanteri kontrol et
         if task_params.get('check_inventory', True):
             logger.debug("Checking inventory")
-            self._check_inventory(client)
+            yield from self._check_inventory(client, frame)
         
         # Sağlık kontrolü
-        if task_params.get('check_health', True) and self.image_recognition.detect_low_health():
+        if task_params.get('check_health', True) and self.image_recognition.detect_low_health(frame):
             logger.info("Low health detected - using health items")
-            self._use_health_items(client)
+            yield from self._use_health_items(client, frame)
         
         # Ekipman yükseltme
         if task_params.get('upgrade_equipment', True):
             logger.debug("Checking for equipment upgrades")
-            self._upgrade_equipment(client)
+            yield from self._upgrade_equipment(client, frame)
             
         return True
     
-    def _perform_combat_actions(self, client=None, task_params=None):
+    def _perform_combat_actions(self, client=None, task_params=None, frame=None):
         """
         Perform combat related actions
         
         Args:
             client: Client window to perform actions on
             task_params: Parameters for the combat task
+            frame: Optional FrameContext shared within the cycle
         """
         if task_params is None:
             task_params = {
@@ -548,39 +844,43 @@ class DarkEpochBot:
         
         # İstemciye odaklan (varsa)
         if client and HAS_GUI_SUPPORT:
-            self.client_manager.focus_client(client)
-            safe_wait(0.5, 1.0)
+            yield from self._focus_client(client, 0.5, 1.0)
             
         # Düşmanları bul
         enemy_types = task_params.get('enemy_types', ['wolf', 'boar', 'bandit'])
         logger.info(f"Searching for enemies: {enemy_types}")
-        enemy_positions = self.image_recognition.find_enemies(limit=3)
+        enemies = self.image_recognition.track_enemies(frame, limit=3)
         
-        if not enemy_positions:
+        if not enemies:
             logger.warning("No enemies found, performing random movement to search")
-            self._random_movement()
+            yield from self._random_movement(frame)
             return False
         
-        # En yakın düşmanı seç (ilk örnek için basitleştirilmiş)
-        closest_enemy = enemy_positions[0]
-        logger.info(f"Engaging enemy at {closest_enemy}")
+        # Daha önce saldırılan düşman hâlâ takipteyse ona devam et, yoksa en güvenilir olanı seç
+        client_key = client.get('id') if isinstance(client, dict) else None
+        engaged_id = self.engaged_targets.get(client_key)
+        target = next((enemy for enemy in enemies if engaged_id is not None and enemy['id'] == engaged_id),
+                      enemies[0])
+        self.engaged_targets[client_key] = target['id']
+        closest_enemy = (target['x'], target['y'])
+        logger.info(f"Engaging enemy {target['id']} at {closest_enemy}")
         
         # Düşmana tıkla
-        self._safe_click(*closest_enemy)
-        safe_wait(1.0, 2.0)
+        yield from self._safe_click(*closest_enemy, frame=frame)
+        yield Wait(1.0, 2.0)
         
         # Dövüş yeteneklerini kullan
-        self._use_combat_abilities(client, task_params)
+        yield from self._use_combat_abilities(client, task_params, frame)
         
         # Düşük sağlık kontrolü
-        if self.image_recognition.detect_low_health():
+        if self.image_recognition.detect_low_health(frame):
             logger.warning("Low health detected during combat")
             
             # Sağlık yüzdesi kontrolü
             health_percent = task_params.get('retreat_health_percent', 30)
             
             # Sağlık itemlerini kullan
-            self._use_health_items(client)
+            yield from self._use_health_items(client, frame)
             
             # Çok düşük sağlık varsa geri çekil
             if health_percent < 30:  # 30% altı kritik seviye
@@ -588,25 +888,26 @@ class DarkEpochBot:
                 
                 # Kaçma tuşu (ESC)
                 if HAS_GUI_SUPPORT:
-                    pyautogui.press('esc')
-                    safe_wait(0.5, 1.0)
+                    yield from self._press_key('esc', frame)
+                    yield Wait(0.5, 1.0)
                 
                 # Rastgele yönde kaç
-                self._random_movement()
+                yield from self._random_movement(frame)
                 
                 # Üsse dön
-                self._return_to_base(client)
+                yield from self._return_to_base(client, frame)
                 return False
         
         return True
     
-    def _perform_mission_tasks(self, client=None, task_params=None):
+    def _perform_mission_tasks(self, client=None, task_params=None, frame=None):
         """
         Perform mission related tasks
         
         Args:
             client: Client window to perform actions on
             task_params: Parameters for mission tasks
+            frame: Optional FrameContext shared within the cycle
         """
         if task_params is None:
             task_params = {
@@ -617,43 +918,42 @@ class DarkEpochBot:
         
         # İstemciye odaklan (varsa)
         if client and HAS_GUI_SUPPORT:
-            self.client_manager.focus_client(client)
-            safe_wait(0.5, 1.0)
+            yield from self._focus_client(client, 0.5, 1.0)
             
         # Oyunda olup olmadığımızı kontrol et
-        if not self.image_recognition.detect_in_game():
+        if not self.image_recognition.detect_in_game(frame):
             logger.warning("Not in game, cannot perform mission tasks")
             return False
             
         # Görev panelini aç
         logger.info("Opening mission panel")
-        mission_panel_pos = self.image_recognition.find_mission_panel()
+        mission_panel_pos = self.image_recognition.find_mission_panel(frame)
         
         if mission_panel_pos:
             logger.debug(f"Found mission panel at {mission_panel_pos}, clicking")
-            self._safe_click(*mission_panel_pos)
-            safe_wait(0.5, 1.0)
+            yield from self._safe_click(*mission_panel_pos, frame=frame)
+            yield Wait(0.5, 1.0)
         else:
             # Görev paneli bulunamadıysa kısayol tuşunu dene
             if HAS_GUI_SUPPORT:
                 logger.debug("Mission panel not found, trying shortcut key")
-                pyautogui.press('q')  # Görev paneli kısayolu - oyuna göre değişebilir
-                safe_wait(0.5, 1.0)
+                yield from self._press_key('q', frame)  # Görev paneli kısayolu - oyuna göre değişebilir
+                yield Wait(0.5, 1.0)
         
         # Görev türünü seç (ana görev, yan görev, vb.)
         mission_type = task_params.get('mission_type', 'main')
         logger.info(f"Selecting mission type: {mission_type}")
         
         # Görev listesini kontrol et
-        mission_list_pos = self.image_recognition.find_template(f"mission_{mission_type}")
+        mission_list_pos = self.image_recognition.find_template(f"mission_{mission_type}", screen=frame)
         if mission_list_pos:
             logger.debug(f"Found mission list at {mission_list_pos}, clicking")
-            self._safe_click(*mission_list_pos)
-            safe_wait(0.5, 1.0)
+            yield from self._safe_click(*mission_list_pos, frame=frame)
+            yield Wait(0.5, 1.0)
         
         # Görev hedeflerini bul
         logger.info("Searching for mission objectives")
-        objective_positions = self.image_recognition.find_mission_objectives()
+        objective_positions = self.image_recognition.find_mission_objectives(frame)
         
         if not objective_positions:
             logger.warning("No mission objectives found")
@@ -666,34 +966,43 @@ class DarkEpochBot:
         logger.info(f"Focusing on mission objective at {active_objective}")
         
         # Hedefe tıkla
-        self._safe_click(*active_objective)
-        safe_wait(1.0, 2.0)
+        yield from self._safe_click(*active_objective, frame=frame)
         
-        # Onay düğmesini bul ve tıkla
-        confirm_pos = self.image_recognition.find_confirm_button()
+        # Onay düğmesi görünene kadar bekle ve tıkla
+        confirm_pos = yield from self._wait_until(
+            frame, self.image_recognition.find_confirm_button, timeout=2.0, min_wait=0.3
+        )
         if confirm_pos:
             logger.debug(f"Found confirmation button at {confirm_pos}, clicking")
-            self._safe_click(*confirm_pos)
-            
-            # Yolculuk/navigasyon varsa bekle
-            max_travel_time = min(120, task_params.get('max_travel_time', 60))
-            logger.info(f"Waiting for mission travel/navigation (max {max_travel_time}s)")
-            
-            # Gerçek uygulamada burada görevin ilerlemesini kontrol etmek için
-            # image_recognition ile döngüsel kontroller yapılabilir
-            safe_wait(3.0, 5.0)
+            yield from self._safe_click(*confirm_pos, frame=frame)
+            
+            # Yolculuk/navigasyon varsa bekle: "mission_complete" şablonu varsa görünene kadar,
+            # yoksa varış anlaşılamadığından kısa sabit süre
+            if self.image_recognition.has_template("mission_complete"):
+                max_travel_time = min(120, task_params.get('max_travel_time', 60))
+                logger.info(f"Waiting for mission travel/navigation (max {max_travel_time}s)")
+                reached = yield from self._wait_until(
+                    frame, lambda f: self.image_recognition.find_template("mission_complete", screen=f),
+                    timeout=max_travel_time, poll_interval=1.0, min_wait=3.0
+                )
+                if not reached:
+                    logger.warning(f"Mission objective not completed within {max_travel_time}s")
+            else:
+                logger.info("Waiting for mission travel/navigation")
+                yield Wait(3.0, 5.0)
             
             return True
         
         logger.warning("Could not find confirmation button for mission objective")
         return False
     
-    def _check_inventory(self, client=None):
+    def _check_inventory(self, client=None, frame=None):
         """
         Check inventory and manage items
         
         Args:
             client: Client window to perform actions on
+            frame: Optional FrameContext shared within the cycle
         """
         if not HAS_GUI_SUPPORT:
             logger.debug("Simulated inventory check")
@@ -701,31 +1010,31 @@ class DarkEpochBot:
             
         # İstemciye odaklan (varsa)
         if client:
-            self.client_manager.focus_client(client)
-            safe_wait(0.3, 0.5)
+            yield from self._focus_client(client, 0.3, 0.5)
             
         try:
             # Envanteri aç - genellikle 'i' tuşu
             logger.debug("Opening inventory")
-            pyautogui.press('i')
-            safe_wait(0.5, 1.0)
+            yield from self._press_key('i', frame)
+            yield Wait(0.5, 1.0)
             
             # Öğeleri kontrol et ve düzenle
             # Örnek: Değerli eşyaları kullan veya düşür
             
             # Envanteri kapat
             logger.debug("Closing inventory")
-            pyautogui.press('esc')
+            yield from self._press_key('esc', frame)
             
         except Exception as e:
             logger.error(f"Error checking inventory: {str(e)}")
     
-    def _use_health_items(self, client=None):
+    def _use_health_items(self, client=None, frame=None):
         """
         Use health items if needed
         
         Args:
             client: Client window to perform actions on
+            frame: Optional FrameContext shared within the cycle
         """
         if not HAS_GUI_SUPPORT:
             logger.debug("Simulated health item usage")
@@ -733,34 +1042,34 @@ class DarkEpochBot:
             
         # İstemciye odaklan (varsa)
         if client:
-            self.client_manager.focus_client(client)
-            safe_wait(0.3, 0.5)
+            yield from self._focus_client(client, 0.3, 0.5)
             
         try:
             # Sağlık potion kısayolu - genellikle bir fonksiyon tuşu
             logger.info("Using health potion")
-            pyautogui.press('h')  # Sağlık potunu genellikle 'h' tuşu ile kullanabilirsiniz
+            yield from self._press_key('h', frame)  # Sağlık potunu genellikle 'h' tuşu ile kullanabilirsiniz
             
             # Alternatif olarak envanterden potion kullanma
-            inventory_health_item = self.image_recognition.find_template("health_potion")
+            inventory_health_item = self.image_recognition.find_template("health_potion", screen=frame)
             if inventory_health_item:
                 logger.debug(f"Found health potion at {inventory_health_item}, clicking")
-                self._safe_click(*inventory_health_item)
+                yield from self._safe_click(*inventory_health_item, frame=frame)
                 
                 # Onay tuşu varsa tıkla
-                confirm = self.image_recognition.find_template("use_item_confirm")
+                confirm = self.image_recognition.find_template("use_item_confirm", screen=frame)
                 if confirm:
-                    self._safe_click(*confirm)
+                    yield from self._safe_click(*confirm, frame=frame)
             
         except Exception as e:
             logger.error(f"Error using health items: {str(e)}")
     
-    def _upgrade_equipment(self, client=None):
+    def _upgrade_equipment(self, client=None, frame=None):
         """
         Check and upgrade equipment
         
         Args:
             client: Client window to perform actions on
+            frame: Optional FrameContext shared within the cycle
         """
         if not HAS_GUI_SUPPORT:
             logger.debug("Simulated equipment upgrade")
@@ -768,13 +1077,12 @@ class DarkEpochBot:
             
         # İstemciye odaklan (varsa)
         if client:
-            self.client_manager.focus_client(client)
-            safe_wait(0.3, 0.5)
+            yield from self._focus_client(client, 0.3, 0.5)
             
         try:
             # Yükseltme göstergelerini bul
             logger.debug("Searching for upgrade indicators")
-            upgrade_positions = self.image_recognition.find_upgrade_indicators()
+            upgrade_positions = self.image_recognition.find_upgrade_indicators(frame)
             
             if not upgrade_positions:
                 logger.debug("No equipment upgrades available")
@@ -785,26 +1093,27 @@ class DarkEpochBot:
             # İlk 2 yükseltmeyi uygula
             for pos in upgrade_positions[:2]:
                 logger.debug(f"Clicking upgrade indicator at {pos}")
-                self._safe_click(*pos)
-                safe_wait(0.5, 1.0)
+                yield from self._safe_click(*pos, frame=frame)
+                yield Wait(0.5, 1.0)
                 
                 # Onay düğmesini bul ve tıkla
-                confirm_pos = self.image_recognition.find_confirm_button()
+                confirm_pos = self.image_recognition.find_confirm_button(frame)
                 if confirm_pos:
                     logger.debug(f"Clicking upgrade confirmation at {confirm_pos}")
-                    self._safe_click(*confirm_pos)
-                    safe_wait(1.0, 1.5)  # Yükseltme animasyonunu bekle
+                    yield from self._safe_click(*confirm_pos, frame=frame)
+                    yield Wait(1.0, 1.5)  # Yükseltme animasyonunu bekle
                     
         except Exception as e:
             logger.error(f"Error upgrading equipment: {str(e)}")
     
-    def _use_combat_abilities(self, client=None, combat_params=None):
+    def _use_combat_abilities(self, client=None, combat_params=None, frame=None):
         """
         Use combat abilities
         
         Args:
             client: Client window to perform actions on
             combat_params: Parameters for combat
+            frame: Optional FrameContext shared within the cycle
         """
         if not HAS_GUI_SUPPORT:
             logger.debug("Simulated combat ability usage")
@@ -815,16 +1124,15 @@ class DarkEpochBot:
         
         # İstemciye odaklan (varsa)
         if client:
-            self.client_manager.focus_client(client)
-            safe_wait(0.3, 0.5)
+            yield from self._focus_client(client, 0.3, 0.5)
             
         try:
             logger.debug(f"Using combat abilities: {ability_keys}")
             
             for key in ability_keys:
                 # Yeteneği kullan
-                pyautogui.press(key)
-                safe_wait(0.5, 1.0)
+                yield from self._press_key(key, frame)
+                yield Wait(0.5, 1.0)
                 
                 # Düşman sağlık durumunu kontrol et
                 # İleride şöyle bir şey eklenebilir: if self.image_recognition.detect_enemy_dead(): break
@@ -832,23 +1140,77 @@ class DarkEpochBot:
         except Exception as e:
             logger.error(f"Error using combat abilities: {str(e)}")
     
-    def _random_movement(self):
+    def _random_movement(self, frame=None):
         """Perform random movement"""
         # TODO: Implement random movement logic
         if HAS_GUI_SUPPORT:
             # WASD ile rastgele hareket
             movement_keys = ['w', 'a', 's', 'd']
             key = movement_keys[int(time.time()) % len(movement_keys)]
-            pyautogui.keyDown(key)
-            safe_wait(0.5, 1.5)
-            pyautogui.keyUp(key)
+            self.image_recognition.record_decision(frame, 'move', key=key)
+            yield from self._hold_key(key, 0.5, 1.5, frame)
             
-    def _return_to_base(self, client=None):
+    def _hold_key(self, key, min_seconds, max_seconds, frame=None):
+        """
+        Hold a key down for a random time within the given range.
+        
+        Generator: the hold is a Wait, so other clients keep running while
+        the key is down. The client owns the actuation lane until the key
+        is released, and input of other clients waits for it. pause()
+        releases the key, which is pressed again for the rest of the time
+        on resume; on stop it is released for good.
+        
+        Args:
+            key: Key name as understood by pyautogui
+            min_seconds: Minimum seconds to hold the key
+            max_seconds: Maximum seconds to hold the key
+            frame: Optional FrameContext to invalidate afterwards
+        """
+        if self.wait_control.stopped:
+            return
+        
+        hold = {'key': key, 'owner': self._lane_key(frame), 'down': False, 'released_at': None}
+        
+        def press():
+            # Tuş basılıyken odak bu istemcide kalsın
+            self._key_hold = hold
+            pyautogui.keyDown(key)
+            hold['down'] = True
+        
+        remaining = Wait(min_seconds, max_seconds).duration
+        try:
+            yield from self._act(frame, press)
+            while remaining > 0 and not self.wait_control.stopped:
+                started = time.monotonic()
+                yield Wait(remaining)
+                with self._actuation_lock:
+                    released_at = hold['released_at']
+                    hold['released_at'] = None
+                if released_at is None:
+                    remaining -= time.monotonic() - started
+                    continue
+                # Duraklatmada bırakıldı: kalan süre için yeniden bas
+                remaining -= released_at - started
+                if remaining > 0 and not self.wait_control.stopped:
+                    with self._actuation(frame):
+                        pyautogui.keyDown(key)
+                        hold['down'] = True
+        finally:
+            with self._actuation(frame):
+                if hold['down']:
+                    pyautogui.keyUp(key)
+                    hold['down'] = False
+                if self._key_hold is hold:
+                    self._key_hold = None
+        self._invalidate_frame(frame)
+            
+    def _return_to_base(self, client=None, frame=None):
         """
         Return to base to empty inventory or heal
         
         Args:
             client: Client window to perform actions on
+            frame: Optional FrameContext shared within the cycle
             
         Returns:
             bool: True if successfully returned to base
@@ -861,30 +1223,36 @@ class DarkEpochBot:
         
         # İstemciye odaklan (varsa)
         if client:
-            self.client_manager.focus_client(client)
-            safe_wait(0.5, 1.0)
+            yield from self._focus_client(client, 0.5, 1.0)
             
         # Haritayı aç
         logger.debug("Opening map")
-        pyautogui.press('m')
-        safe_wait(1.0, 1.5)
+        yield from self._press_key('m', frame)
         
-        # Haritada şehir ikonunu bul
-        city_pos = self.image_recognition.find_template("city_icon")
+        # Harita açılıp şehir ikonu görünene kadar bekle
+        city_pos = yield from self._wait_until(
+            frame, lambda f: self.image_recognition.find_template("city_icon", screen=f),
+            timeout=1.5, min_wait=0.3
+        )
         if city_pos:
             logger.debug(f"Found city at {city_pos}, clicking")
-            self._safe_click(*city_pos)
-            safe_wait(0.5, 1.0)
+            yield from self._safe_click(*city_pos, frame=frame)
+            yield Wait(0.5, 1.0)
             
             # Hızlı seyahat düğmesini bul
-            travel_button = self.image_recognition.find_template("travel_button")
+            travel_button = self.image_recognition.find_template("travel_button", screen=frame)
             if travel_button:
                 logger.debug(f"Found travel button at {travel_button}, clicking")
-                self._safe_click(*travel_button)
+                yield from self._safe_click(*travel_button, frame=frame)
                 
-                # Seyahat süresini bekle
+                # Seyahat bitene kadar bekle: harita kapanır ve oyun ekranı döner
                 logger.info("Traveling to base, waiting...")
-                safe_wait(5.0, 10.0)
+                yield from self._wait_until(
+                    frame,
+                    lambda f: (self.image_recognition.detect_in_game(f)
+                               and not self.image_recognition.find_template("city_icon", screen=f)),
+                    timeout=10.0, poll_interval=0.5, min_wait=2.0
+                )
                 
                 # Başarılı dönüş
                 logger.info("Successfully returned to base")
@@ -892,20 +1260,19 @@ class DarkEpochBot:
         
         # Haritayı kapat - manuel dönüş yap
         logger.warning("Could not use fast travel, attempting manual return")
-        pyautogui.press('esc')
-        safe_wait(0.5, 1.0)
+        yield from self._press_key('esc', frame)
+        yield Wait(0.5, 1.0)
         
         # Kuzey yönünde 10-15 saniye boyunca ilerle (oyun tasarımına göre değişebilir)
         logger.debug("Moving north for 10-15 seconds")
-        pyautogui.keyDown('w')
-        safe_wait(10.0, 15.0)
-        pyautogui.keyUp('w')
+        self.image_recognition.record_decision(frame, 'move', key='w')
+        yield from self._hold_key('w', 10.0, 15.0, frame)
         
         # Başarısız/belirsiz dönüş
         logger.warning("Manual return to base completed (success unknown)")
         return False
     
-    def _safe_click(self, x, y, button='left'):
+    def _safe_click(self, x, y, button='left', frame=None):
         """
         Safely click at given coordinates with slight random offset
         to avoid detection patterns.
@@ -914,19 +1281,99 @@ class DarkEpochBot:
             x: x-coordinate
             y: y-coordinate
             button: mouse button to click
+            frame: Optional FrameContext to invalidate after the click
         """
         if not HAS_GUI_SUPPORT:
             logger.debug(f"Simulated click at ({x}, {y})")
             return
         
+        # Durdurulduktan sonra girdi gönderme
+        if self.wait_control.stopped:
+            return
+        
         # Rastgele offset ekle
         x, y = random_offset(x, y, max_offset=5)
         
         # Tıklama
-        pyautogui.click(x=x, y=y, button=button)
+        yield from self._act(frame, lambda: pyautogui.click(x=x, y=y, button=button))
+        self.image_recognition.record_decision(frame, 'click', x=x, y=y, button=button)
+        self._invalidate_frame(frame)
         
         # İki tıklama arasında bekleme
-        safe_wait(
+        yield Wait(
             float(self.config.get('click_delay_min', 0.2)), 
             float(self.config.get('click_delay_max', 0.5))
-        )
\ No newline at end of file
+        )
+    
+    def _press_key(self, key, frame=None):
+        """
+        Press a key and invalidate the shared frame.
+        
+        Generator: waits while another client holds a key.
+        
+        Args:
+            key: Key name as understood by pyautogui
+            frame: Optional FrameContext to invalidate after the key press
+        """
+        if not HAS_GUI_SUPPORT:
+            logger.debug(f"Simulated key press: {key}")
+            return
+        
+        # Durdurulduktan sonra girdi gönderme
+        if self.wait_control.stopped:
+            return
+        
+        yield from self._act(frame, lambda: pyautogui.press(key))
+        self.image_recognition.record_decision(frame, 'key', key=key)
+        self._invalidate_frame(frame)
+    
+    def _invalidate_frame(self, frame):
+        """Mark the shared frame stale after an input action changed the screen"""
+        if frame is not None:
+            frame.invalidate()
+    
+    def _wait_until(self, frame, predicate, timeout, poll_interval=None, min_wait=0.0):
+        """
+        Wait until a screen condition holds instead of sleeping the worst case.
+        
+        Every check runs the predicate on a newly captured frame. Generator:
+        yields Wait effects between checks (see scheduler.wait_until).
+        
+        Args:
+            frame: FrameContext to re-capture for each check (a new one if None)
+            predicate: Function of the frame returning a truthy value once the condition holds
+            timeout: Maximum seconds to wait
+            poll_interval: Seconds between two checks (defaults to wait_poll_interval)
+            min_wait: Seconds to wait before the first check
+            
+        Returns:
+            The first truthy value of the predicate, or None on timeout
+        """
+        if frame is None:
+            frame = self.image_recognition.create_frame_context()
+        if poll_interval is None:
+            poll_interval = self.wait_poll_interval
+        
+        def check():
+            self._invalidate_frame(frame)
+            return predicate(frame)
+        
+        return (yield from wait_until(check, timeout, poll_interval, min_wait))
+    
+    def _resource_node_present(self, frame, node_id, position, radius=40):
+        """
+        Check whether a resource node is still on screen.
+        
+        Args:
+            frame: FrameContext to search
+            node_id: Tracking ID of the node (None without target tracking)
+            position: Last known (x, y) position, used when the node has no ID
+            radius: Maximum distance in pixels to count a node at the position
+            
+        Returns:
+            bool: True if the node is still visible
+        """
+        nodes = self.image_recognition.track_resource_nodes(frame, limit=5)
+        if node_id is not None:
+            return any(node['id'] == node_id for node in nodes)
+        return any(calculate_distance(position, (node['x'], node['y'])) <= radius for node in nodes)
@@ -0,0 +1,698 @@
+"""
+Dark Epoch Bot - Screen Capture Backends
+Platform specific screen grabbers that write into reused, preallocated
+buffers instead of allocating a new image for every screenshot.
+"""
+
+import os
+import sys
+import time
+import logging
+import platform
+import threading
+import ctypes
+import ctypes.util
+from collections import OrderedDict
+
+# Koşullu olarak OpenCV, numpy ve pyautogui'yi içe aktar
+try:
+    import cv2
+    import numpy as np
+    HAS_CV_SUPPORT = True
+except ImportError:
+    HAS_CV_SUPPORT = False
+
+# Ekransız Linux'ta pyautogui ImportError yerine KeyError('DISPLAY') fırlatabilir
+try:
+    import pyautogui
+    HAS_PYAUTOGUI = True
+except Exception:
+    HAS_PYAUTOGUI = False
+
+# Loglama yapılandırması
+logger = logging.getLogger('DarkEpochBot.Capture')
+
+class CaptureError(Exception):
+    """Raised when a capture backend cannot be used"""
+
+class CaptureBackend:
+    """
+    Base class of screen capture backends.
+
+    grab() returns a view of a buffer owned by the backend. The buffer of a
+    region is reused by the next capture of the same region and released
+    when evicted, so a frame is only valid until its region is captured
+    again; pass out= to capture into a caller-owned buffer instead.
+    """
+    name = None
+    color_format = 'BGRA'
+    # grab() görüntüleri yeniden kullanılan tamponlara işaret eder (out= olmadan saklanmamalı)
+    shared_buffers = True
+
+    # Bölge başına en fazla bu kadar tampon tutulur
+    max_buffers = 8
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._buffers = OrderedDict()  # {bölge: tampon}
+
+    def screen_size(self):
+        """Get the (width, height) of the screen"""
+        raise NotImplementedError
+
+    def output_shape(self, region=None):
+        """
+        Get the shape of the image grab() returns for a region.
+
+        Args:
+            region: Optional (left, top, width, height)
+
+        Returns:
+            tuple: (height, width, channels), the shape an out= array needs
+        """
+        left, top, width, height = self._full_region(region)
+        return (height, width, len(self.color_format))
+
+    def _full_region(self, region):
+        if region is None:
+            width, height = self.screen_size()
+            return (0, 0, width, height)
+        return tuple(int(v) for v in region)
+
+    def _buffer(self, region, create):
+        """
+        Get the buffer of a region, creating it on first use.
+
+        Args:
+            region: (left, top, width, height)
+            create: Function (width, height) -> buffer object
+
+        Returns:
+            Buffer object of the region
+        """
+        buffer = self._buffers.get(region)
+        if buffer is None:
+            buffer = create(region[2], region[3])
+            self._buffers[region] = buffer
+            while len(self._buffers) > self.max_buffers:
+                old_region, old_buffer = self._buffers.popitem(last=False)
+                self._release(old_buffer)
+        else:
+            self._buffers.move_to_end(region)
+        return buffer
+
+    def _release(self, buffer):
+        """Free a buffer created by the backend"""
+
+    def grab(self, region=None, out=None):
+        """
+        Capture the screen or a region of it.
+
+        Args:
+            region: Optional (left, top, width, height) to capture
+            out: Optional preallocated array of shape (height, width, channels) to fill
+
+        Returns:
+            numpy.ndarray: Captured image in the backend's color_format
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release all buffers and system resources"""
+        with self.lock:
+            while self._buffers:
+                self._release(self._buffers.popitem()[1])
+
+class PyAutoGUICapture(CaptureBackend):
+    """Portable fallback using pyautogui.screenshot (allocates a new image every time)"""
+    name = 'pyautogui'
+    color_format = 'RGB'
+    shared_buffers = False
+
+    def __init__(self):
+        super().__init__()
+        if not HAS_PYAUTOGUI:
+            raise CaptureError("pyautogui is not available")
+
+    def screen_size(self):
+        return tuple(pyautogui.size())
+
+    def grab(self, region=None, out=None):
+        if region is None:
+            image = np.asarray(pyautogui.screenshot())
+        else:
+            image = np.asarray(pyautogui.screenshot(region=tuple(int(v) for v in region)))
+        if out is not None:
+            np.copyto(out, image)
+            return out
+        return image
+
+class GDICapture(CaptureBackend):
+    """
+    Windows GDI capture into DIB sections.
+
+    Each region gets a top-down 32-bit DIB section whose pixel memory is
+    wrapped by a numpy array, so BitBlt writes straight into the array the
+    detectors read from.
+    """
+    name = 'gdi'
+    color_format = 'BGRA'
+
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000
+
+    def __init__(self):
+        super().__init__()
+        if platform.system() != 'Windows':
+            raise CaptureError("GDI capture is only available on Windows")
+
+        from ctypes import wintypes
+
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [('biSize', wintypes.DWORD), ('biWidth', wintypes.LONG),
+                        ('biHeight', wintypes.LONG), ('biPlanes', wintypes.WORD),
+                        ('biBitCount', wintypes.WORD), ('biCompression', wintypes.DWORD),
+                        ('biSizeImage', wintypes.DWORD), ('biXPelsPerMeter', wintypes.LONG),
+                        ('biYPelsPerMeter', wintypes.LONG), ('biClrUsed', wintypes.DWORD),
+                        ('biClrImportant', wintypes.DWORD)]
+
+        class BITMAPINFO(ctypes.Structure):
+            _fields_ = [('bmiHeader', BITMAPINFOHEADER), ('bmiColors', wintypes.DWORD * 3)]
+
+        self._BITMAPINFO = BITMAPINFO
+        self.user32 = ctypes.WinDLL('user32', use_last_error=True)
+        self.gdi32 = ctypes.WinDLL('gdi32', use_last_error=True)
+
+        # 64 bit tutamaçların kesilmemesi için dönüş tiplerini belirt
+        self.user32.GetDC.restype = wintypes.HDC
+        self.user32.GetDC.argtypes = [wintypes.HWND]
+        self.user32.ReleaseDC.argtypes = [wintypes.HWND, wintypes.HDC]
+        self.user32.GetSystemMetrics.argtypes = [ctypes.c_int]
+        self.gdi32.CreateCompatibleDC.restype = wintypes.HDC
+        self.gdi32.CreateCompatibleDC.argtypes = [wintypes.HDC]
+        self.gdi32.CreateDIBSection.restype = wintypes.HBITMAP
+        self.gdi32.CreateDIBSection.argtypes = [wintypes.HDC, ctypes.c_void_p, wintypes.UINT,
+                                                ctypes.POINTER(ctypes.c_void_p), wintypes.HANDLE,
+                                                wintypes.DWORD]
+        self.gdi32.SelectObject.restype = wintypes.HGDIOBJ
+        self.gdi32.SelectObject.argtypes = [wintypes.HDC, wintypes.HGDIOBJ]
+        self.gdi32.DeleteObject.argtypes = [wintypes.HGDIOBJ]
+        self.gdi32.DeleteDC.argtypes = [wintypes.HDC]
+        self.gdi32.BitBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                      ctypes.c_int, wintypes.HDC, ctypes.c_int, ctypes.c_int,
+                                      wintypes.DWORD]
+
+        self.screen_dc = self.user32.GetDC(None)
+        if not self.screen_dc:
+            raise CaptureError("GetDC failed")
+
+    def screen_size(self):
+        # SM_CXSCREEN, SM_CYSCREEN
+        return (self.user32.GetSystemMetrics(0), self.user32.GetSystemMetrics(1))
+
+    def _create(self, width, height):
+        info = self._BITMAPINFO()
+        info.bmiHeader.biSize = ctypes.sizeof(info.bmiHeader)
+        info.bmiHeader.biWidth = width
+        info.bmiHeader.biHeight = -height  # Yukarıdan aşağı satır sırası
+        info.bmiHeader.biPlanes = 1
+        info.bmiHeader.biBitCount = 32
+        info.bmiHeader.biCompression = 0  # BI_RGB
+
+        mem_dc = self.gdi32.CreateCompatibleDC(self.screen_dc)
+        bits = ctypes.c_void_p()
+        bitmap = self.gdi32.CreateDIBSection(mem_dc, ctypes.byref(info), 0, ctypes.byref(bits), None, 0)
+        if not bitmap or not bits.value:
+            self.gdi32.DeleteDC(mem_dc)
+            raise CaptureError("CreateDIBSection failed")
+
+        old = self.gdi32.SelectObject(mem_dc, bitmap)
+        array = np.ctypeslib.as_array((ctypes.c_uint8 * (width * height * 4)).from_address(bits.value))
+        return {'dc': mem_dc, 'bitmap': bitmap, 'old': old, 'array': array.reshape(height, width, 4)}
+
+    def _release(self, buffer):
+        self.gdi32.SelectObject(buffer['dc'], buffer['old'])
+        self.gdi32.DeleteObject(buffer['bitmap'])
+        self.gdi32.DeleteDC(buffer['dc'])
+
+    def grab(self, region=None, out=None):
+        region = self._full_region(region)
+        left, top, width, height = region
+
+        with self.lock:
+            buffer = self._buffer(region, self._create)
+            if not self.gdi32.BitBlt(buffer['dc'], 0, 0, width, height, self.screen_dc, left, top,
+                                     self.SRCCOPY | self.CAPTUREBLT):
+                raise CaptureError(f"BitBlt failed for region {region}")
+            self.gdi32.GdiFlush()
+
+            if out is not None:
+                np.copyto(out, buffer['array'])
+                return out
+            return buffer['array']
+
+    def close(self):
+        super().close()
+        if self.screen_dc:
+            self.user32.ReleaseDC(None, self.screen_dc)
+            self.screen_dc = None
+
+class XShmCapture(CaptureBackend):
+    """
+    X11 capture through the MIT-SHM extension.
+
+    XShmGetImage copies the requested area into a shared memory segment,
+    which is wrapped by a numpy array without any further copying. Only
+    32 bits per pixel visuals (the usual 24/32 bit TrueColor) are supported.
+    """
+    name = 'xshm'
+    color_format = 'BGRA'
+
+    ZPIXMAP = 2
+    IPC_PRIVATE = 0
+    IPC_CREAT = 0o1000
+    IPC_RMID = 0
+
+    def __init__(self, display_name=None):
+        super().__init__()
+        if sys.byteorder != 'little':
+            raise CaptureError("XShm capture assumes a little-endian host")
+
+        xlib_path = ctypes.util.find_library('X11')
+        xext_path = ctypes.util.find_library('Xext')
+        if not xlib_path or not xext_path:
+            raise CaptureError("libX11/libXext not found")
+
+        class XShmSegmentInfo(ctypes.Structure):
+            _fields_ = [('shmseg', ctypes.c_ulong), ('shmid', ctypes.c_int),
+                        ('shmaddr', ctypes.c_void_p), ('readOnly', ctypes.c_int)]
+
+        class XImage(ctypes.Structure):
+            # Sadece kullanılan baştaki alanlar
+            _fields_ = [('width', ctypes.c_int), ('height', ctypes.c_int), ('xoffset', ctypes.c_int),
+                        ('format', ctypes.c_int), ('data', ctypes.c_void_p), ('byte_order', ctypes.c_int),
+                        ('bitmap_unit', ctypes.c_int), ('bitmap_bit_order', ctypes.c_int),
+                        ('bitmap_pad', ctypes.c_int), ('depth', ctypes.c_int),
+                        ('bytes_per_line', ctypes.c_int), ('bits_per_pixel', ctypes.c_int)]
+
+        self._XShmSegmentInfo = XShmSegmentInfo
+        self.xlib = ctypes.CDLL(xlib_path)
+        self.xext = ctypes.CDLL(xext_path)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        self.xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self.xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self.xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        self.xlib.XRootWindow.restype = ctypes.c_ulong
+        self.xlib.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XDefaultVisual.restype = ctypes.c_void_p
+        self.xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.xlib.XDestroyImage.argtypes = [ctypes.POINTER(XImage)]
+        self.xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self.xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        self.xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+        self.xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                                              ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo),
+                                              ctypes.c_uint, ctypes.c_uint]
+        self.xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        self.xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        self.xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage),
+                                           ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        self.libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        self.libc.shmat.restype = ctypes.c_void_p
+        self.libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        self.libc.shmdt.argtypes = [ctypes.c_void_p]
+        self.libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+        name = display_name or os.environ.get('DISPLAY')
+        self.display = self.xlib.XOpenDisplay(name.encode() if name else None)
+        if not self.display:
+            raise CaptureError(f"Cannot open X display {name!r}")
+        if not self.xext.XShmQueryExtension(self.display):
+            self.xlib.XCloseDisplay(self.display)
+            raise CaptureError("X server does not support MIT-SHM")
+
+        self.screen = self.xlib.XDefaultScreen(self.display)
+        self.root = self.xlib.XRootWindow(self.display, self.screen)
+        self.visual = self.xlib.XDefaultVisual(self.display, self.screen)
+        self.depth = self.xlib.XDefaultDepth(self.display, self.screen)
+
+    def screen_size(self):
+        return (self.xlib.XDisplayWidth(self.display, self.screen),
+                self.xlib.XDisplayHeight(self.display, self.screen))
+
+    def _create(self, width, height):
+        info = self._XShmSegmentInfo()
+        image = self.xext.XShmCreateImage(self.display, self.visual, self.depth, self.ZPIXMAP,
+                                          None, ctypes.byref(info), width, height)
+        if not image:
+            raise CaptureError("XShmCreateImage failed")
+        if image.contents.bits_per_pixel != 32:
+            self.xlib.XDestroyImage(image)
+            raise CaptureError(f"Unsupported X visual: {image.contents.bits_per_pixel} bits per pixel")
+
+        stride = image.contents.bytes_per_line
+        info.shmid = self.libc.shmget(self.IPC_PRIVATE, stride * height, self.IPC_CREAT | 0o600)
+        if info.shmid < 0:
+            self.xlib.XDestroyImage(image)
+            raise CaptureError(f"shmget failed: errno {ctypes.get_errno()}")
+
+        address = self.libc.shmat(info.shmid, None, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            self.libc.shmctl(info.shmid, self.IPC_RMID, None)
+            self.xlib.XDestroyImage(image)
+            raise CaptureError(f"shmat failed: errno {ctypes.get_errno()}")
+
+        info.shmaddr = address
+        info.readOnly = 0
+        image.contents.data = address
+        self.xext.XShmAttach(self.display, ctypes.byref(info))
+        self.xlib.XSync(self.display, 0)
+        # Segment, iki taraf da ayrıldığında sistem tarafından silinir
+        self.libc.shmctl(info.shmid, self.IPC_RMID, None)
+
+        raw = np.ctypeslib.as_array((ctypes.c_uint8 * (stride * height)).from_address(address))
+        array = raw.reshape(height, stride)[:, :width * 4].reshape(height, width, 4)
+        return {'image': image, 'info': info, 'address': address, 'array': array}
+
+    def _release(self, buffer):
+        self.xext.XShmDetach(self.display, ctypes.byref(buffer['info']))
+        self.xlib.XSync(self.display, 0)
+        # Veri paylaşılan bellekte; XDestroyImage'in onu serbest bırakmasını engelle
+        buffer['image'].contents.data = None
+        self.xlib.XDestroyImage(buffer['image'])
+        self.libc.shmdt(buffer['address'])
+
+    def grab(self, region=None, out=None):
+        region = self._full_region(region)
+
+        with self.lock:
+            buffer = self._buffer(region, self._create)
+            if not self.xext.XShmGetImage(self.display, self.root, buffer['image'],
+                                          region[0], region[1], 0xFFFFFFFF):
+                raise CaptureError(f"XShmGetImage failed for region {region}")
+
+            if out is not None:
+                np.copyto(out, buffer['array'])
+                return out
+            return buffer['array']
+
+    def close(self):
+        super().close()
+        if self.display:
+            self.xlib.XCloseDisplay(self.display)
+            self.display = None
+
+class FileCapture(CaptureBackend):
+    """
+    Serves screenshots from image files instead of the screen.
+
+    A single file is returned on every grab; a directory is played back in
+    file name order, one image per grab, looping at the end. Images are
+    decoded once, and regions are returned as views into them.
+    """
+    name = 'file'
+    color_format = 'BGR'
+    shared_buffers = False
+
+    def __init__(self, path, loop=True):
+        """
+        Initialize the file capture backend.
+
+        Args:
+            path: Image file or directory of image files
+            loop: Start over after the last image of a directory
+        """
+        super().__init__()
+        if os.path.isdir(path):
+            files = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                     if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
+        else:
+            files = [path]
+
+        self.frames = [image for image in (cv2.imread(f) for f in files) if image is not None]
+        if not self.frames:
+            raise CaptureError(f"No images found at {path}")
+
+        self.loop = loop
+        self.position = 0
+
+    def screen_size(self):
+        frame = self.frames[min(self.position, len(self.frames) - 1)]
+        return (frame.shape[1], frame.shape[0])
+
+    def grab(self, region=None, out=None):
+        with self.lock:
+            frame = self.frames[self.position]
+            if self.position + 1 < len(self.frames):
+                self.position += 1
+            elif self.loop:
+                self.position = 0
+
+        if region is not None:
+            left, top, width, height = (int(v) for v in region)
+            frame = frame[top:top + height, left:left + width]
+
+        if out is not None:
+            np.copyto(out, frame)
+            return out
+        return frame
+
+def _replay_capture(path, loop):
+    # recording modülü bu modülü içe aktarır; döngüsel içe aktarmayı önlemek için burada yükle
+    from recording import ReplayCapture
+    return ReplayCapture(path, loop)
+
+def create_capture_backend(config=None):
+    """
+    Create the screen capture backend selected in the configuration.
+
+    "auto" picks GDI on Windows and XShm on Linux with an X display, and
+    falls back to pyautogui if the native backend cannot be initialized.
+    "file" plays back screenshots and "replay" a frame recording, both
+    read from capture_source.
+
+    Args:
+        config: Optional bot configuration dictionary
+
+    Returns:
+        CaptureBackend: Capture backend, or None if no backend is available
+    """
+    config = config or {}
+    name = config.get('capture_backend', 'auto')
+    source = config.get('capture_source') or config.get('screenshots_dir', 'screenshots')
+
+    candidates = [name]
+    if name == 'auto':
+        if platform.system() == 'Windows':
+            candidates = ['gdi', 'pyautogui']
+        elif os.environ.get('DISPLAY'):
+            candidates = ['xshm', 'pyautogui']
+        else:
+            candidates = ['pyautogui']
+
+    factories = {
+        'gdi': GDICapture,
+        'xshm': XShmCapture,
+        'pyautogui': PyAutoGUICapture,
+        'file': lambda: FileCapture(source),
+        'replay': lambda: _replay_capture(source, bool(config.get('replay_loop', False)))
+    }
+    for candidate in candidates:
+        factory = factories.get(candidate)
+        if factory is None:
+            logger.error(f"Unknown capture backend: {candidate}")
+            continue
+        try:
+            backend = factory()
+            logger.info(f"Using {backend.name} screen capture")
+            return backend
+        except Exception as e:
+            logger.warning(f"Capture backend {candidate} not available: {str(e)}")
+
+    return None
+
+class FrameRing:
+    """
+    Small ring of preallocated frame buffers filled by a capture thread.
+
+    Readers take the newest frame and pin its slot until they release it;
+    the writer never overwrites a pinned slot or the newest frame, so a
+    frame in use stays intact without being copied.
+    """
+    def __init__(self, slots=3, max_slots=6):
+        """
+        Initialize the frame ring.
+
+        Args:
+            slots: Number of buffers allocated up front
+            max_slots: Number of buffers the ring may grow to while frames are pinned
+        """
+        self.slots = max(2, slots)
+        self.max_slots = max(self.slots, max_slots)
+        self.buffers = []
+        self.timestamps = []
+        self.pins = []
+        self.newest = None
+        self.sequence = 0
+        self.condition = threading.Condition()
+
+    def writable_slot(self, shape, dtype):
+        """
+        Get a slot the writer may fill, allocating buffers on first use.
+
+        Args:
+            shape: Frame shape
+            dtype: Frame data type
+
+        Returns:
+            int: Slot index, or None if every slot is in use
+        """
+        with self.condition:
+            if self.buffers and self.buffers[0].shape != shape:
+                # Bölge boyutu değişti; sabitlenmemiş eski tamponları at
+                if any(self.pins):
+                    return None
+                self.buffers, self.timestamps, self.pins, self.newest = [], [], [], None
+
+            while len(self.buffers) < self.slots:
+                self._add_slot(shape, dtype)
+
+            free = [i for i in range(len(self.buffers)) if not self.pins[i] and i != self.newest]
+            if not free and len(self.buffers) < self.max_slots:
+                self._add_slot(shape, dtype)
+                free = [len(self.buffers) - 1]
+            if not free:
+                return None
+            return min(free, key=lambda i: self.timestamps[i])
+
+    def _add_slot(self, shape, dtype):
+        self.buffers.append(np.empty(shape, dtype=dtype))
+        self.timestamps.append(0.0)
+        self.pins.append(0)
+
+    def publish(self, slot, timestamp):
+        """Mark a filled slot as the newest frame and wake up waiting readers"""
+        with self.condition:
+            self.timestamps[slot] = timestamp
+            self.newest = slot
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def acquire(self, newer_than=0.0, timeout=0.0):
+        """
+        Pin and return the newest frame.
+
+        Args:
+            newer_than: Only accept frames captured after this time
+            timeout: Seconds to wait for such a frame
+
+        Returns:
+            tuple: (slot, image, timestamp), or None if no frame is recent enough
+        """
+        with self.condition:
+            def ready():
+                return self.newest is not None and self.timestamps[self.newest] > newer_than
+
+            if not ready() and (timeout <= 0 or not self.condition.wait_for(ready, timeout)):
+                return None
+            slot = self.newest
+            self.pins[slot] += 1
+            return slot, self.buffers[slot], self.timestamps[slot]
+
+    def release(self, slot):
+        """Unpin a slot taken with acquire"""
+        with self.condition:
+            if slot < len(self.pins) and self.pins[slot] > 0:
+                self.pins[slot] -= 1
+
+class CaptureWorker:
+    """
+    Background thread that keeps capturing one screen region into a FrameRing.
+
+    The thread stops by itself once no frame was taken for idle_timeout
+    seconds, e.g. after its client was closed.
+    """
+    def __init__(self, backend, region, interval=0.05, slots=3, idle_timeout=10.0):
+        """
+        Initialize the capture worker.
+
+        Args:
+            backend: CaptureBackend to capture with
+            region: (left, top, width, height) to capture, None for the full screen
+            interval: Minimum seconds between two captures
+            slots: Number of ring buffers
+            idle_timeout: Seconds without readers after which the thread stops
+        """
+        self.backend = backend
+        self.region = region
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.ring = FrameRing(slots)
+        self.last_read = time.time()
+        self.captures = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def color_format(self):
+        return self.backend.color_format
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the capture thread"""
+        if self.is_alive():
+            return
+        self._stop_event.clear()
+        self.last_read = time.time()
+        self._thread = threading.Thread(target=self._run, name=f'Capture-{self.region}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the capture thread"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def acquire(self, newer_than=0.0, timeout=0.0):
+        """Pin and return the newest frame (see FrameRing.acquire)"""
+        self.last_read = time.time()
+        return self.ring.acquire(newer_than, timeout)
+
+    def release(self, slot):
+        """Unpin a frame taken with acquire"""
+        self.ring.release(slot)
+
+    def _run(self):
+        """Capture loop"""
+        shape = dtype = None
+        while not self._stop_event.is_set():
+            if time.time() - self.last_read > self.idle_timeout:
+                logger.debug(f"Capture worker for {self.region} idle, stopping")
+                break
+
+            started = time.time()
+            try:
+                if shape is None:
+                    # İlk kare: tampon boyutunu öğren
+                    sample = self.backend.grab(self.region)
+                    shape, dtype = sample.shape, sample.dtype
+
+                slot = self.ring.writable_slot(shape, dtype)
+                if slot is not None:
+                    self.backend.grab(self.region, out=self.ring.buffers[slot])
+                    self.ring.publish(slot, started)
+                    self.captures += 1
+            except Exception as e:
+                logger.error(f"Background capture of {self.region} failed: {str(e)}")
+                shape = None
+                self._stop_event.wait(1.0)
+
+            self._stop_event.wait(max(0.0, self.interval - (time.time() - started)))
@@ -25,7 +25,53 @@ DEFAULT_CONFIG = {
     "api_key": "",
     "reference_images_dir": "reference_images",
     "screenshots_dir": "screenshots",
-    "logs_dir": "logs"
+    "logs_dir": "logs",
+    "client_scoped_capture": True,
+    "use_search_regions": True,
+    "search_region_padding": 24,
+    "pyramid_levels": 0,
+    "color_mode": "color",
+    "template_settings": {},
+    "use_template_store": True,
+    "lazy_templates": False,
+    "template_cache_mb": 64,
+    "watch_reference_images": False,
+    "reference_watch_interval": 2.0,
+    "frame_diff_gating": True,
+    "frame_diff_tile_size": 32,
+    "frame_diff_tolerance": 0,
+    "memoize_detections": True,
+    "use_state_cache": True,
+    "state_hash_distance": 8,
+    "state_cache_size": 256,
+    "state_verify_interval": 20,
+    "capture_backend": "auto",
+    "capture_source": "",
+    "background_capture": False,
+    "capture_interval": 0.05,
+    "capture_ring_size": 3,
+    "capture_idle_timeout": 10.0,
+    "screen_max_age": 0.5,
+    "record_frames": False,
+    "recordings_dir": "recordings",
+    "recording_chunk_frames": 128,
+    "replay_loop": False,
+    "parallel_clients": False,
+    "client_workers": 4,
+    "interleave_clients": False,
+    "engine": "thread",
+    "status_report_interval": 10.0,
+    "process_check_interval": 30.0,
+    "wait_poll_interval": 0.25,
+    "template_base_resolution": None,
+    "match_backend": "auto",
+    "fft_min_template_area": 4096,
+    "sqdiff_tolerance": 12,
+    "target_tracking": True,
+    "track_search_radius": 48,
+    "track_max_distance": 64,
+    "track_max_misses": 2,
+    "track_full_search_interval": 10
 }
 
 def load_config(config_path="config.json"):
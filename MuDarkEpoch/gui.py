@@ -410,10 +410,10 @@ class BotGUI(tk.Tk):
         try:
             logger.info("Bot worker thread started")
             
-            # Main bot loop
+            # Main bot loop (the asyncio engine runs its own cycles)
             while not self.stop_flag.is_set() and self.bot.running:
                 # Check if paused
-                if not self.bot.paused:
+                if not self.bot.paused and self.bot.engine != 'asyncio':
                     self.bot.run_cycle()
                 
                 # Prevent CPU overload
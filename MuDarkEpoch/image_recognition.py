@@ -7,67 +7,1068 @@ import os
 import time
 import logging
 import platform
+import itertools
+import json
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-# Koşullu olarak OpenCV ve numpy'ı içe aktar
+from template_store import TemplateStore, TemplateCache, ReferenceWatcher, IMAGE_EXTENSIONS
+from screen_state import ScreenStateCache, difference_hash
+from tracking import TargetTracker
+from match_backends import create_backends, time_backend, benchmark_backends
+from capture import create_capture_backend, CaptureWorker
+from recording import FrameRecorder
+
+# Koşullu olarak OpenCV ve numpy'ı içe aktar (şablon eşleştirme için yeterli)
 try:
     import cv2
     import numpy as np
-    import pyautogui
-    HAS_GUI_SUPPORT = True
+    HAS_CV_SUPPORT = True
 except ImportError:
-    HAS_GUI_SUPPORT = False
+    HAS_CV_SUPPORT = False
     # Dummy NumPy
     class DummyNP:
         def array(self, *args, **kwargs):
             return None
     np = DummyNP()
 
+# pyautogui yalnızca girdi ve pyautogui ile yakalama için gerekli; ekransız
+# Linux'ta ImportError yerine KeyError('DISPLAY') fırlatabilir
+try:
+    import pyautogui
+    HAS_GUI_SUPPORT = HAS_CV_SUPPORT
+except Exception:
+    HAS_GUI_SUPPORT = False
+
 # Loglama yapılandırması
 logger = logging.getLogger('DarkEpochBot.ImageRecognition')
 
+# Her yakalanan kareye benzersiz bir kimlik ver
+_frame_ids = itertools.count(1)
+
+# Renk modları: tam renk, gri ton veya tek kanal
+COLOR_MODES = ('color', 'gray', 'channel')
+_CHANNEL_INDEX = {'b': 0, 'g': 1, 'r': 2}
+
+def convert_color(image, source_format, mode):
+    """
+    Convert an image to the given matching color mode.
+
+    Args:
+        image: Source image
+        source_format: Channel order of the source ("BGR", "RGB" or "BGRA")
+        mode: "color", "gray" or a single channel ("b", "g", "r")
+
+    Returns:
+        numpy.ndarray: BGR image for "color", single channel image otherwise
+    """
+    if mode == 'color':
+        if source_format == 'RGB':
+            return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        if source_format == 'BGRA':
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        return image
+
+    if mode == 'gray':
+        if source_format == 'RGB':
+            return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        if source_format == 'BGRA':
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    index = _CHANNEL_INDEX[mode]
+    if source_format == 'RGB':
+        index = 2 - index
+    return cv2.extractChannel(image, index)
+
+def suppress_overlaps(xs, ys, scores, template_size, limit):
+    """
+    Greedy non-maximum suppression of match locations.
+
+    Matches are visited from the highest confidence down; a match is dropped
+    if its distance to an already kept match is below half the template size
+    on both axes.
+
+    Args:
+        xs, ys: Top-left corners of the matches (numpy arrays)
+        scores: Confidence of each match (numpy array)
+        template_size: (width, height) of the template
+        limit: Maximum number of matches to keep
+
+    Returns:
+        list: List of (x, y, confidence) tuples sorted by confidence
+    """
+    min_dx, min_dy = template_size[0] // 2, template_size[1] // 2
+    order = np.argsort(-scores, kind='stable')
+    xs, ys, scores = xs[order], ys[order], scores[order]
+
+    kept = []
+    alive = np.ones(len(scores), dtype=bool)
+    for i in range(len(scores)):
+        if not alive[i]:
+            continue
+        kept.append((int(xs[i]), int(ys[i]), float(scores[i])))
+        if len(kept) >= limit:
+            break
+
+        # Bu eşleşmeye çok yakın olan daha zayıf eşleşmeleri ele
+        close = (np.abs(xs[i + 1:] - xs[i]) < min_dx) & (np.abs(ys[i + 1:] - ys[i]) < min_dy)
+        alive[i + 1:] &= ~close
+
+    return kept
+
+def extract_peaks(result, threshold, template_size, limit):
+    """
+    Extract the strongest separated peaks from a template matching result.
+
+    Local maxima are found with a dilation pass, so only a handful of
+    candidates (instead of every pixel above the threshold) reach the
+    suppression step.
+
+    Args:
+        result: TM_CCOEFF_NORMED result map
+        threshold: Minimum confidence of a peak
+        template_size: (width, height) of the template
+        limit: Maximum number of peaks to return
+
+    Returns:
+        list: List of (x, y, confidence) tuples sorted by confidence
+    """
+    kernel_w = max(1, template_size[0] // 2) | 1
+    kernel_h = max(1, template_size[1] // 2) | 1
+    dilated = cv2.dilate(result, np.ones((kernel_h, kernel_w), np.uint8))
+
+    peaks = (result >= dilated) & (result >= threshold)
+    ys, xs = np.nonzero(peaks)
+    if len(xs) == 0:
+        return []
+
+    return suppress_overlaps(xs, ys, result[ys, xs], template_size, limit)
+
+class FrameContext:
+    """
+    A screen frame shared by every detector during one client's bot cycle.
+
+    The frame is captured lazily on first access and reused by all later
+    detector calls until it is invalidated, typically right after an input
+    action (click, key press) has changed what is on screen. Color converted
+    and downscaled copies are derived once per capture and shared as well.
+
+    With background capture enabled, the newest frame of the capture thread
+    is taken instead of capturing, as long as it is at most max_age seconds
+    old and was captured after the last invalidation.
+    """
+    def __init__(self, recognition, client=None, max_age=None):
+        """
+        Initialize the frame context.
+
+        Args:
+            recognition: ImageRecognition instance used for capturing
+            client: Optional client info dictionary the frame belongs to
+            max_age: Oldest background frame to accept in seconds
+                (defaults to the recognition's screen_max_age)
+        """
+        self.recognition = recognition
+        self.client = client
+        self.max_age = recognition.screen_max_age if max_age is None else max_age
+        self.frame_id = None
+        self.timestamp = 0
+        self.invalidated_at = 0.0
+        self.record_index = None  # Kayıttaki kare numarası (kayıt açıksa)
+        self.capture_count = 0
+        self.origin = (0, 0)
+        self._source = None
+        self._source_format = 'BGR'
+        self._variants = {}
+        self.diff_seq = None  # Kare fark izleyicisindeki sıra numarası
+        self.results = {}  # Bu karedeki tespit sonuçları (aynı sorgu tekrar eşleştirilmez)
+        self._release = None  # Arka plan halka tamponundaki yuvayı serbest bırakır
+        # find_many iş parçacıkları tembel önbellekleri (türevler, fark sırası) paylaşır
+        self._lock = threading.RLock()
+
+    @property
+    def stream_key(self):
+        """Key of the screen stream this frame belongs to (client id, or None for the screen)"""
+        if isinstance(self.client, dict):
+            return self.client.get('id')
+        return None
+
+    @property
+    def image(self):
+        """Current frame in BGR format, captured on first access"""
+        return self.mode_image('color')
+
+    @property
+    def is_valid(self):
+        """True if a frame has been captured and not invalidated since"""
+        return self._source is not None
+
+    @property
+    def size(self):
+        """(width, height) of the frame, capturing it if needed"""
+        if self._source is None:
+            self.refresh()
+        if self._source is None:
+            return None
+        return (self._source.shape[1], self._source.shape[0])
+
+    def refresh(self):
+        """
+        Capture a new frame immediately.
+
+        Returns:
+            bool: True if the capture succeeded
+        """
+        # Sadece istemci dikdörtgenini yakala (bölge yoksa tüm ekran)
+        region = self.recognition.get_client_region(self.client)
+        origin = (region[0], region[1]) if region is not None else (0, 0)
+
+        latest = self.recognition.latest_frame(region, self.max_age, newer_than=self.invalidated_at)
+        if latest is not None:
+            image, color_format, timestamp, release = latest
+            self.set_image(image, origin, color_format, timestamp, release)
+        else:
+            # Aynı bölgeyi yakalayan diğer iş parçacıkları kareyi döngü içinde değiştirmesin
+            image, color_format = self.recognition.grab_screen(region, owned=True)
+            self.set_image(image, origin, color_format)
+        self.capture_count += 1
+        self.recognition.record_frame(self)
+        return self._source is not None
+
+    def set_image(self, image, origin=(0, 0), color_format='BGR', timestamp=None, release=None):
+        """
+        Use an already captured image as the current frame.
+
+        Args:
+            image: Frame image
+            origin: (x, y) screen position of the frame's top-left corner
+            color_format: Channel order of the image ("BGR", "RGB" or "BGRA")
+            timestamp: Capture time of the image (defaults to now)
+            release: Optional function called once the image is no longer used
+        """
+        self._release_source()
+        if release is not None:
+            # Bağlam çöp toplansa bile yuva serbest kalsın
+            self._release = weakref.finalize(self, release)
+        self._source = image
+        self._source_format = color_format
+        self._variants = {}
+        self.diff_seq = None
+        self.results = {}
+        self.record_index = None
+        self.origin = origin
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.frame_id = next(_frame_ids)
+
+    def invalidate(self):
+        """Mark the frame stale so the next access captures a new one"""
+        self._release_source()
+        self.invalidated_at = time.time()
+        self._source = None
+        self.record_index = None
+        self._variants = {}
+        self.diff_seq = None
+        self.results = {}
+
+    def _release_source(self):
+        """Hand a background frame back to its ring buffer"""
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+    def mode_image(self, mode):
+        """
+        Get the frame converted to a matching color mode.
+
+        Args:
+            mode: "color", "gray" or a single channel ("b", "g", "r")
+
+        Returns:
+            numpy.ndarray: Converted frame, or None if there is no frame
+        """
+        return self.variant(('mode', mode),
+                            lambda: convert_color(self._source, self._source_format, mode))
+
+    def variant(self, key, build):
+        """
+        Get a derived image of the frame, building it once per capture.
+
+        Args:
+            key: Hashable key of the derived image
+            build: Function without arguments creating the derived image
+
+        Returns:
+            numpy.ndarray: Derived image, or None if there is no frame
+        """
+        # Yeniden girişli kilit: türev oluşturma başka türevleri isteyebilir
+        with self._lock:
+            if self._source is None:
+                self.refresh()
+            if self._source is None:
+                return None
+
+            derived = self._variants.get(key)
+            if derived is None:
+                derived = build()
+                self._variants[key] = derived
+            return derived
+
+    def to_screen(self, point):
+        """
+        Translate a frame-relative point to screen coordinates.
+
+        Args:
+            point: (x, y) position inside the frame
+
+        Returns:
+            tuple: (x, y) position on the screen
+        """
+        return (point[0] + self.origin[0], point[1] + self.origin[1])
+
+class SearchRegionIndex:
+    """
+    Remembers where each template was recently found, per frame geometry.
+
+    Static UI elements appear at (nearly) the same position every time, so a
+    small padded window around the recent hits is searched before falling
+    back to the full frame. The index is persisted as JSON so it survives
+    restarts.
+    """
+    def __init__(self, path, padding=24, history=8, save_interval=30.0):
+        """
+        Initialize the search region index.
+
+        Args:
+            path: JSON file used to persist the index (None disables saving)
+            padding: Extra pixels added around the remembered hit area
+            history: Number of recent hit locations kept per template
+            save_interval: Minimum seconds between two automatic saves
+        """
+        self.path = path
+        self.padding = padding
+        self.history = history
+        self.save_interval = save_interval
+        self.hits = {}  # {template_name: {"WxH": [[x, y], ...]}}
+        self.lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Yazmalar sırayla; eski içerik yenisinin üzerine yazılmasın
+        self.dirty = False
+        self.last_save = 0
+        self.load()
+
+    @staticmethod
+    def _geometry_key(geometry):
+        return f"{geometry[0]}x{geometry[1]}"
+
+    def load(self):
+        """Load the index from disk if it exists"""
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            with self.lock:
+                self.hits = data.get('hits', {})
+            logger.info(f"Loaded search regions for {len(self.hits)} templates from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading search region index {self.path}: {str(e)}")
+
+    def save(self):
+        """
+        Write the index to disk atomically.
+
+        Returns:
+            bool: True if saved successfully
+        """
+        with self._save_lock:
+            return self._save(due_only=False)
+
+    def maybe_save(self):
+        """Save the index if it changed and the save interval has passed"""
+        # Başka bir iş parçacığı zaten kaydediyorsa bekleme
+        if self._save_lock.acquire(blocking=False):
+            try:
+                self._save(due_only=True)
+            finally:
+                self._save_lock.release()
+
+    def _save(self, due_only):
+        """
+        Snapshot the index and write it through a unique temporary file.
+
+        Args:
+            due_only: Only save if the index changed and the save interval has passed
+
+        Returns:
+            bool: True if saved successfully
+        """
+        if not self.path:
+            return False
+
+        with self.lock:
+            # Kontrol ve sahiplenme aynı kilit altında: aynı değişiklik iki kez yazılmasın
+            if due_only and not (self.dirty and time.time() - self.last_save >= self.save_interval):
+                return False
+            data = json.dumps({'hits': self.hits})
+            self.dirty = False
+            self.last_save = time.time()
+
+        tmp_path = None
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + '.',
+                                            suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving search region index {self.path}: {str(e)}")
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            with self.lock:
+                # Bir sonraki aralıkta yeniden dene
+                self.dirty = True
+            return False
+
+    def lookup(self, name, geometry, template_size):
+        """
+        Get the expected search window of a template.
+
+        Args:
+            name: Template name
+            geometry: (width, height) of the frame
+            template_size: (width, height) of the template
+
+        Returns:
+            tuple: (left, top, right, bottom) window in frame coordinates,
+                or None if there is no history for this geometry
+        """
+        with self.lock:
+            points = self.hits.get(name, {}).get(self._geometry_key(geometry))
+            if not points:
+                return None
+            xs = [p[0] for p in points]
+            ys = [p[1] for p in points]
+
+        left = max(0, min(xs) - self.padding)
+        top = max(0, min(ys) - self.padding)
+        right = min(geometry[0], max(xs) + template_size[0] + self.padding)
+        bottom = min(geometry[1], max(ys) + template_size[1] + self.padding)
+
+        # Pencere şablondan küçükse kullanma
+        if right - left < template_size[0] or bottom - top < template_size[1]:
+            return None
+
+        return (left, top, right, bottom)
+
+    def record(self, name, geometry, location):
+        """
+        Remember a hit location (top-left corner) of a template.
+
+        Args:
+            name: Template name
+            geometry: (width, height) of the frame
+            location: (x, y) top-left corner of the match in frame coordinates
+        """
+        key = self._geometry_key(geometry)
+        point = [int(location[0]), int(location[1])]
+
+        with self.lock:
+            points = self.hits.setdefault(name, {}).setdefault(key, [])
+            if point in points:
+                return
+            points.append(point)
+            del points[:-self.history]
+            self.dirty = True
+
+        self.maybe_save()
+
+    def forget(self, name):
+        """Drop all remembered locations of a template"""
+        with self.lock:
+            if self.hits.pop(name, None) is not None:
+                self.dirty = True
+
+class FrameDiffTracker:
+    """
+    Tracks which tiles of each client's screen changed between frames.
+
+    Every frame is compared with the previous frame of the same client on a
+    coarse tile grid, and each tile remembers the sequence number of the
+    frame it last changed in. Match results are stored with the sequence
+    number they were computed on, so a later search only has to look at the
+    tiles that changed since then, or can return the stored result as-is
+    when nothing in its search area changed.
+    """
+    def __init__(self, tile_size=32, tolerance=0, max_dirty_ratio=0.5):
+        """
+        Initialize the frame difference tracker.
+
+        Args:
+            tile_size: Tile edge length in pixels
+            tolerance: Largest per-channel pixel difference still treated as unchanged
+            max_dirty_ratio: Changed share of the frame above which a full search is cheaper
+        """
+        self.tile_size = max(4, int(tile_size))
+        self.tolerance = int(tolerance)
+        self.max_dirty_ratio = float(max_dirty_ratio)
+        self.streams = {}  # {client_key: {"image", "seq", "changed_at"}}
+        self.results = {}  # {(client_key, template_name, ...): (seq, result)}
+        self.lock = threading.Lock()
+        self.reused = 0
+        self.partial = 0
+        self.full = 0
+
+    def update(self, key, image):
+        """
+        Register a new frame of a client and mark the tiles that changed.
+
+        Args:
+            key: Client key the frame belongs to
+            image: Frame image
+
+        Returns:
+            int: Sequence number of the frame within the client's stream
+        """
+        ts = self.tile_size
+        h, w = image.shape[:2]
+        rows = np.arange(0, h, ts)
+        cols = np.arange(0, w, ts)
+
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is None or stream['image'].shape != image.shape:
+                # İlk kare veya boyut değişti: tüm karolar değişmiş sayılır
+                seq = stream['seq'] + 1 if stream else 1
+                stream = {'changed_at': np.full((len(rows), len(cols)), seq, dtype=np.int64)}
+                self.streams[key] = stream
+            else:
+                seq = stream['seq'] + 1
+                diff = cv2.absdiff(image, stream['image'])
+                if diff.ndim == 3:
+                    diff = diff.reshape(h, -1)
+                    channels = image.shape[2]
+                else:
+                    channels = 1
+                # Her karodaki en büyük farkı bul (kenar karoları daha küçük olabilir)
+                tile_max = np.maximum.reduceat(np.maximum.reduceat(diff, rows, axis=0), cols * channels, axis=1)
+                stream['changed_at'][tile_max > self.tolerance] = seq
+
+            # Yakalama tamponları yeniden kullanıldığı için karenin kopyasını sakla
+            if 'image' in stream:
+                np.copyto(stream['image'], image)
+            else:
+                stream['image'] = image.copy()
+            stream['seq'] = seq
+            return seq
+
+    def _tile_span(self, start, length, count):
+        return start // self.tile_size, min(count, (start + length - 1) // self.tile_size + 1)
+
+    def is_clean(self, key, since, rect):
+        """
+        Check that no tile under a rectangle changed after a frame.
+
+        Args:
+            key: Client key
+            since: Sequence number the rectangle was last checked on
+            rect: (x, y, width, height) in frame coordinates
+
+        Returns:
+            bool: True if the whole rectangle is unchanged
+        """
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is None:
+                return False
+            changed_at = stream['changed_at']
+            ty0, ty1 = self._tile_span(rect[1], rect[3], changed_at.shape[0])
+            tx0, tx1 = self._tile_span(rect[0], rect[2], changed_at.shape[1])
+            return not (changed_at[ty0:ty1, tx0:tx1] > since).any()
+
+    def dirty_windows(self, key, since, template_size):
+        """
+        Get the windows a template has to be re-matched in.
+
+        Each connected area of changed tiles is grown by the template size,
+        so every position where the template would overlap a changed pixel
+        is covered.
+
+        Args:
+            key: Client key
+            since: Sequence number the previous result was computed on
+            template_size: (width, height) of the template
+
+        Returns:
+            list: (left, top, right, bottom) windows, empty if nothing changed,
+                or None if a full search is cheaper or required
+        """
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is None:
+                return None
+            mask = (stream['changed_at'] > since).astype(np.uint8)
+            h, w = stream['image'].shape[:2]
+
+        if not mask.any():
+            return []
+        if mask.mean() > self.max_dirty_ratio:
+            return None
+
+        ts = self.tile_size
+        tw, th = template_size
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+        windows = []
+        for x, y, cw, ch, area in stats[1:]:
+            left = max(0, x * ts - tw + 1)
+            top = max(0, y * ts - th + 1)
+            right = min(w, (x + cw) * ts + tw - 1)
+            bottom = min(h, (y + ch) * ts + th - 1)
+            # Şablon sığmıyorsa bu bölgede eşleşme olamaz
+            if right - left >= tw and bottom - top >= th:
+                windows.append((int(left), int(top), int(right), int(bottom)))
+        return windows
+
+    def get_result(self, key):
+        """Get a stored result as (seq, result), or None"""
+        with self.lock:
+            return self.results.get(key)
+
+    def put_result(self, key, seq, result, outcome):
+        """
+        Store a match result computed on the frame with the given sequence number.
+
+        Args:
+            key: Result key (client key first, template name second)
+            seq: Sequence number of the frame the result belongs to
+            result: Frame-relative match result
+            outcome: How it was obtained: "reused", "partial" or "full"
+        """
+        with self.lock:
+            self.results[key] = (seq, result)
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def forget(self, name):
+        """Drop all stored results of a template"""
+        with self.lock:
+            for key in [key for key in self.results if key[1] == name]:
+                del self.results[key]
+
+    def stats(self):
+        """
+        Get gating statistics.
+
+        Returns:
+            dict: Counts of reused, partially re-matched and fully searched results
+        """
+        with self.lock:
+            total = self.reused + self.partial + self.full
+            return {
+                'reused': self.reused,
+                'partial': self.partial,
+                'full': self.full,
+                'skip_rate': (self.reused + self.partial) / total if total else 0.0,
+                'clients': len(self.streams)
+            }
+
 class ImageRecognition:
-    def __init__(self):
-        """Initialize the Image Recognition module"""
-        self.reference_images = {}
+    def __init__(self, config=None):
+        """
+        Initialize the Image Recognition module
+
+        Args:
+            config (dict): Optional bot configuration dictionary
+        """
+        if config is None:
+            config = {}
+
+        self.config = config
+        self.reference_dir = config.get('reference_images_dir', 'reference_images')
         self.screen_cache = None
         self.screen_timestamp = 0
-        self.confidence_threshold = 0.7  # Varsayılan eşik değeri
+        self.screen_max_age = float(config.get('screen_max_age', 0.5))  # Önbellekteki ekranın en fazla yaşı
+        self.confidence_threshold = float(config.get('confidence_threshold', 0.7))  # Varsayılan eşik değeri
+
+        # İstemci penceresi bazlı yakalama ve eşleştirme
+        self.client_scoped_capture = bool(config.get('client_scoped_capture', True))
+
+        # Şablon bazlı eşleştirme ayarları, örn. {"mission_panel": {"pyramid_levels": 2}}
+        self.template_settings = config.get('template_settings', {}) or {}
+        self.pyramid_levels = int(config.get('pyramid_levels', 0))
+        self.pyramid_margin = float(config.get('pyramid_margin', 0.2))
+        self.color_mode = config.get('color_mode', 'color')
+        
+        # Eşleştirme arka uçları: "auto" her şablon için ölçülen en hızlı eşdeğer arka ucu seçer
+        self.match_backends = create_backends(config)
+        self.match_backend = config.get('match_backend', 'auto')
+        self.fft_min_template_area = int(config.get('fft_min_template_area', 4096))
+        self._backend_choice = {}  # {(şablon, şablon boyutu, kare boyutu): MatchBackend}
+        self._backend_lock = threading.Lock()
+        
+        # Referans resimlerin yakalandığı istemci çözünürlüğü [genişlik, yükseklik];
+        # farklı boyuttaki istemciler için şablonlar bir kez ölçeklenip saklanır
+        self.template_base_resolution = config.get('template_base_resolution')
+
+        # Çoklu şablon aramaları için iş parçacığı havuzu (OpenCV GIL'i bırakır)
+        self.perception_workers = int(config.get('perception_workers', min(4, os.cpu_count() or 1)))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        # Çözülmüş şablonların derlenmiş önbelleği (tek, belleğe eşlenebilir dosya)
+        self.template_store = None
+        if config.get('use_template_store', True):
+            self.template_store = TemplateStore(
+                config.get('template_store_path', os.path.join(self.reference_dir, 'templates.store'))
+            )
+
+        # Bellekteki şablonlar: tembel modda ilk kullanımda yüklenir ve bütçe aşılınca atılır
+        self.lazy_templates = bool(config.get('lazy_templates', False))
+        max_bytes = None
+        if self.lazy_templates:
+            max_bytes = int(float(config.get('template_cache_mb', 64)) * 1024 * 1024)
+        self.templates = TemplateCache(max_bytes)
+        self._template_sources = {}  # {template_name: dosya yolu}
+
+        # Şablonların son bulunduğu bölgeler (önce bu bölgelerde ara)
+        self.search_regions = None
+        if config.get('use_search_regions', True):
+            self.search_regions = SearchRegionIndex(
+                config.get('search_regions_path', os.path.join(self.reference_dir, 'search_regions.json')),
+                padding=int(config.get('search_region_padding', 24))
+            )
+        
+        # Ekran yakalama arka ucu (önceden ayrılmış tamponlara yazar, start() açar)
+        self.capture_backend = None
+        self._started = False
+        
+        # Arka plan yakalama: bölge başına bir iş parçacığı en yeni kareleri halka tampona yazar
+        self.background_capture = bool(config.get('background_capture', False))
+        self.capture_interval = float(config.get('capture_interval', 0.05))
+        self.capture_ring_size = int(config.get('capture_ring_size', 3))
+        self.capture_idle_timeout = float(config.get('capture_idle_timeout', 10.0))
+        self._capture_workers = {}  # {bölge: CaptureWorker}
+        self._capture_workers_lock = threading.Lock()
+        
+        # Ham kareleri ve kararları yeniden oynatılabilir bir kayda yaz (start() açar)
+        self.recorder = None
+        
+        # Karolar bazında kare farkı: değişmeyen bölgelerde eşleştirmeyi atla
+        self.frame_diff = None
+        if config.get('frame_diff_gating', True):
+            self.frame_diff = FrameDiffTracker(
+                tile_size=int(config.get('frame_diff_tile_size', 32)),
+                tolerance=int(config.get('frame_diff_tolerance', 0))
+            )
+        
+        # Aynı karede tekrarlanan sorguların sonuçlarını sakla
+        self.memoize_detections = bool(config.get('memoize_detections', True))
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self._memo_lock = threading.Lock()
+        self._screen_frame = None  # get_screen önbelleğini saran kare
+        
+        # Ekran durumu sınıflandırma: parmak izi -> durum tablosu ve istemci başına son durum
+        self.state_cache = None
+        if config.get('use_state_cache', True):
+            self.state_cache = ScreenStateCache(
+                max_distance=int(config.get('state_hash_distance', 8)),
+                max_entries=int(config.get('state_cache_size', 256))
+            )
+        self.state_verify_interval = int(config.get('state_verify_interval', 20))
+        self._last_states = {}  # {stream_key: (durum, doğrulamasız tahmin sayısı)}
+        
+        # Düşman ve kaynakları kareler arasında takip et
+        self.target_tracking = bool(config.get('target_tracking', True))
+        self.track_settings = {
+            'search_radius': int(config.get('track_search_radius', 48)),
+            'max_distance': int(config.get('track_max_distance', 64)),
+            'max_misses': int(config.get('track_max_misses', 2)),
+            'full_search_interval': int(config.get('track_full_search_interval', 10))
+        }
+        self._trackers = {}  # {(stream_key, grup): TargetTracker}
+        self._trackers_lock = threading.Lock()
+        
+        # Referans dizinini izleyip değişen şablonları yeniden başlatmadan yükle
+        self.template_watcher = None
+        if config.get('watch_reference_images', False):
+            self.template_watcher = ReferenceWatcher(
+                self.reference_dir, self.reload_templates,
+                interval=float(config.get('reference_watch_interval', 2.0))
+            )
         
         # Referans resimleri yükle
-        if HAS_GUI_SUPPORT:
+        if HAS_CV_SUPPORT:
             self._load_reference_images()
         else:
-            logger.warning("GUI support not available - image recognition will be simulated")
+            logger.warning("OpenCV not available - image recognition will be simulated")
+        
+        self.start()
+    
+    def start(self):
+        """
+        Open the capture backend and frame recording and start watching the
+        reference images.
+        
+        Called on creation; call it again to resume after shutdown (the bot
+        reuses the instance across stop and start).
+        """
+        if self._started:
+            return
+        
+        if HAS_CV_SUPPORT and self.capture_backend is None:
+            self.capture_backend = create_capture_backend(self.config)
+        
+        # Önceki çalışmadan kalan ekran görüntüsünü kullanma
+        self.screen_cache = None
+        self.screen_timestamp = 0
+        self._screen_frame = None
+        
+        if self.recorder is None and self.config.get('record_frames', False):
+            # Her çalışma ayrı bir kayda yazılır (aynı saniyede yeniden başlatılsa da)
+            base = os.path.join(self.config.get('recordings_dir', 'recordings'), time.strftime('%Y%m%d_%H%M%S'))
+            path, suffix = base, 1
+            while os.path.exists(path):
+                suffix += 1
+                path = f"{base}_{suffix}"
+            try:
+                self.recorder = FrameRecorder(
+                    path, chunk_frames=int(self.config.get('recording_chunk_frames', 128))
+                )
+            except Exception as e:
+                logger.error(f"Error starting frame recording: {str(e)}")
+        
+        if HAS_CV_SUPPORT and self.template_watcher is not None:
+            self.template_watcher.start()
+        
+        self._started = True
+    
+    def shutdown(self):
+        """
+        Persist learned state, stop worker threads and close the capture
+        backend and recording. start() opens them again.
+        """
+        self._started = False
+        if self.template_watcher is not None:
+            self.template_watcher.stop()
+        
+        if self.search_regions is not None and self.search_regions.dirty:
+            self.search_regions.save()
+        
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        
+        with self._capture_workers_lock:
+            workers, self._capture_workers = list(self._capture_workers.values()), {}
+        for worker in workers:
+            worker.stop()
+        
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        
+        if self.capture_backend is not None:
+            self.capture_backend.close()
+            self.capture_backend = None
+    
+    @property
+    def reference_images(self):
+        """Color images of the templates currently held in memory, by name"""
+        with self.templates.lock:
+            return {name: variants[('color', 0)] for name, variants in self.templates.entries.items()}
+    
+    def get_template_cache_stats(self):
+        """
+        Get template cache statistics.
+        
+        Returns:
+            dict: Known template count plus cache size and hit/miss counters
+        """
+        stats = self.templates.stats()
+        stats['known_templates'] = len(self._template_sources)
+        stats['lazy'] = self.lazy_templates
+        return stats
     
     def _load_reference_images(self):
         """Load reference images from the reference_images directory"""
-        ref_dir = "reference_images"
+        ref_dir = self.reference_dir
         
         if not os.path.exists(ref_dir):
             os.makedirs(ref_dir)
             logger.info(f"Created reference images directory: {ref_dir}")
             return
         
-        loaded = 0
+        # Dosya adından referans adını çıkar
         for filename in os.listdir(ref_dir):
-            if filename.endswith(('.png', '.jpg', '.jpeg')):
-                try:
-                    img_path = os.path.join(ref_dir, filename)
-                    img = cv2.imread(img_path)
-                    
-                    if img is None:
-                        logger.warning(f"Failed to load reference image: {filename}")
-                        continue
-                    
-                    # Dosya adından referans adını çıkar
-                    name = os.path.splitext(filename)[0]
-                    self.reference_images[name] = img
-                    loaded += 1
-                except Exception as e:
-                    logger.error(f"Error loading reference image {filename}: {str(e)}")
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                self._template_sources[os.path.splitext(filename)[0]] = os.path.join(ref_dir, filename)
+        
+        # Derlenmiş şablon deposu varsa sadece değişen dosyaları çöz
+        if self.template_store is not None:
+            try:
+                templates = self.template_store.sync(
+                    ref_dir, self._template_variant_spec, self._build_template_variant)
+                if not self.lazy_templates:
+                    for name, variants in templates.items():
+                        self.templates.put(name, variants)
+                
+                logger.info(f"Loaded {len(templates)} reference images from template store")
+                return
+            except Exception as e:
+                logger.error(f"Error using template store, decoding images directly: {str(e)}")
+        
+        if self.lazy_templates:
+            logger.info(f"Found {len(self._template_sources)} reference images (loaded on first use)")
+            return
+        
+        loaded = 0
+        for name in list(self._template_sources):
+            if self._load_template(name) is not None:
+                loaded += 1
         
         logger.info(f"Loaded {loaded} reference images")
     
+    def _load_template(self, template_name):
+        """
+        Get the variants of a template, loading it if it is not in memory.
+        
+        Args:
+            template_name: Name of the template
+            
+        Returns:
+            dict: {(mode, levels): numpy.ndarray} or None if the template is unknown
+        """
+        variants = self.templates.get(template_name)
+        if variants is not None:
+            return variants
+        
+        img_path = self._template_sources.get(template_name)
+        if img_path is None:
+            return None
+        
+        try:
+            # Önce derlenmiş depoya bak, yoksa dosyayı çöz
+            if self.template_store is not None and template_name in self.template_store.entries:
+                variants = self.template_store.variants(template_name)
+            else:
+                img = cv2.imread(img_path)
+                if img is None:
+                    logger.warning(f"Failed to load reference image: {img_path}")
+                    return None
+                variants = {('color', 0): img}
+            
+            self.templates.put(template_name, variants)
+            variants = self.templates.entries.get(template_name, variants)
+            self._prepare_template(template_name, variants)
+            return variants
+        except Exception as e:
+            logger.error(f"Error loading reference image {img_path}: {str(e)}")
+            return None
+    
+    def has_template(self, template_name):
+        """
+        Check whether a reference image exists for a template.
+        
+        Args:
+            template_name: Name of the template
+            
+        Returns:
+            bool: True if the template can be matched
+        """
+        return template_name in self._template_sources
+    
+    def reload_templates(self, changed, removed=()):
+        """
+        Load, replace or remove templates whose files changed on disk.
+        
+        Replacements are fully decoded and prepared before they are swapped
+        into the cache in a single step, so a detection running at the same
+        time sees either the old or the new template, never a partial one.
+        
+        Args:
+            changed: {template_name: file path} of added or modified files
+            removed: Names of templates whose files were deleted
+            
+        Returns:
+            set: Names of templates that could not be loaded (to retry later)
+        """
+        failed = set()
+        
+        for name in removed:
+            self._template_sources.pop(name, None)
+            self.templates.discard(name)
+            self._forget_template(name)
+            logger.info(f"Removed reference image: {name}")
+        
+        for name, path in changed.items():
+            # Tembel modda bellekte olmayan şablonu sadece kaydet, ilk kullanımda yüklenir
+            if self.lazy_templates and name not in self.templates:
+                self._template_sources[name] = path
+                self._forget_template(name)
+                continue
+            
+            try:
+                img = cv2.imread(path)
+            except Exception as e:
+                logger.error(f"Error loading reference image {path}: {str(e)}")
+                img = None
+            
+            if img is None:
+                # Dosya hâlâ yazılıyor olabilir; eski şablonu koru
+                failed.add(name)
+                continue
+            
+            variants = {('color', 0): img}
+            self._prepare_template(name, variants)
+            
+            self._template_sources[name] = path
+            self._forget_template(name)
+            self.templates.put(name, variants)
+            logger.info(f"Reloaded reference image: {name}")
+        
+        return failed
+    
+    def _forget_template(self, name):
+        """Drop state learned from a previous version of a template"""
+        # Derlenmiş depodaki kopya artık eski; sonraki başlangıçta yeniden derlenir
+        if self.template_store is not None:
+            self.template_store.entries.pop(name, None)
+        if self.search_regions is not None:
+            self.search_regions.forget(name)
+        if self.frame_diff is not None:
+            self.frame_diff.forget(name)
+    
+    def add_template(self, name, image, path=None):
+        """
+        Add or replace a template in memory.
+        
+        Args:
+            name: Template name
+            image: Template image in BGR format
+            path: Optional source file, used to reload the template after eviction
+        """
+        if path is not None:
+            self._template_sources[name] = path
+            if self.template_watcher is not None:
+                self.template_watcher.note(name, path)
+        
+        variants = {('color', 0): image}
+        self._prepare_template(name, variants)
+        
+        # Eski konum geçmişi yeni şablon için geçersiz
+        self._forget_template(name)
+        self.templates.put(name, variants)
+    
     def capture_reference_image(self, name, region=None):
         """
         Capture a reference image for future matching.
@@ -77,77 +1078,537 @@ class ImageRecognition:
             region: Optional region to capture (left, top, width, height)
             
         Returns:
-            bool: True if capture successful, False otherwise
+            bool: True if capture successful, False otherwise
+        """
+        if not HAS_GUI_SUPPORT:
+            logger.warning("Cannot capture reference image: GUI support not available")
+            return False
+        
+        try:
+            # Ekran görüntüsü al
+            if region is None:
+                screenshot = pyautogui.screenshot()
+            else:
+                screenshot = pyautogui.screenshot(region=region)
+            
+            # OpenCV formatına çevir
+            img = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+            
+            # Referans resimleri dizinini kontrol et
+            ref_dir = self.reference_dir
+            if not os.path.exists(ref_dir):
+                os.makedirs(ref_dir)
+            
+            # Resmi kaydet
+            img_path = os.path.join(ref_dir, f"{name}.png")
+            cv2.imwrite(img_path, img)
+            
+            # Referans şablonlarına ekle
+            self.add_template(name, img, img_path)
+            
+            logger.info(f"Captured reference image: {name}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error capturing reference image: {str(e)}")
+            return False
+    
+    def get_screen(self, force_refresh=False, region=None, max_age=None):
+        """
+        Get the current screen as a numpy array.
+        Uses caching to avoid excessive screenshots.
+        
+        Args:
+            force_refresh: Force taking a new screenshot
+            region: Optional region to capture (left, top, width, height).
+                Region captures are never cached.
+            max_age: Oldest cached or background frame to accept in seconds
+                (defaults to screen_max_age)
+            
+        Returns:
+            numpy.ndarray: Screenshot as a numpy array in BGR format
+        """
+        if not HAS_CV_SUPPORT:
+            return None
+        
+        current_time = time.time()
+        if max_age is None:
+            max_age = self.screen_max_age
+        
+        if region is not None:
+            return self._owned_bgr(*self.grab_screen(region, owned=True))
+        
+        # Arka plan yakalama açıksa en yeni kareyi al; zorunlu yenilemede bu çağrıdan sonrakini bekle
+        latest = self.latest_frame(None, max_age, newer_than=current_time if force_refresh else 0.0)
+        if latest is not None:
+            image, color_format, timestamp, release = latest
+            try:
+                if self.screen_cache is None or timestamp != self.screen_timestamp:
+                    self.screen_cache = self._owned_bgr(image, color_format)
+                    self.screen_timestamp = timestamp
+            finally:
+                release()
+            return self.screen_cache
+        
+        # Önbelleğe alınmış ekran görüntüsü varsa ve yeterince yeniyse kullan
+        if (not force_refresh and 
+            self.screen_cache is not None and 
+            current_time - self.screen_timestamp < max_age):
+            return self.screen_cache
+        
+        # Yeni ekran görüntüsü al ve OpenCV formatına çevir
+        screenshot = self._owned_bgr(*self.grab_screen(owned=True))
+        if screenshot is None:
+            return None
+        
+        self.screen_cache = screenshot
+        self.screen_timestamp = current_time
+        return self.screen_cache
+    
+    def latest_frame(self, region=None, max_age=None, newer_than=0.0):
+        """
+        Take the newest frame of the background capture thread of a region.
+        
+        The thread is started on first use. The returned image is a view of
+        a ring buffer slot that stays untouched until release() is called.
+        
+        Args:
+            region: Region (left, top, width, height), None for the full screen
+            max_age: Oldest frame to accept in seconds (defaults to screen_max_age)
+            newer_than: Only accept frames captured after this time
+            
+        Returns:
+            tuple: (image, color format, capture time, release function), or
+                None if background capture is off or no fresh frame arrived
+                within two capture intervals
+        """
+        if not self.background_capture or not HAS_CV_SUPPORT or self.capture_backend is None:
+            return None
+        
+        if max_age is None:
+            max_age = self.screen_max_age
+        
+        with self._capture_workers_lock:
+            worker = self._capture_workers.get(region)
+            if worker is None or not worker.is_alive():
+                worker = CaptureWorker(self.capture_backend, region,
+                                       interval=self.capture_interval,
+                                       slots=self.capture_ring_size,
+                                       idle_timeout=self.capture_idle_timeout)
+                worker.start()
+                self._capture_workers[region] = worker
+        
+        # İlk kare gelene ya da eski kare yenilenene kadar en fazla iki aralık bekle
+        newer_than = max(newer_than, time.time() - max_age)
+        latest = worker.acquire(newer_than, timeout=2 * self.capture_interval + 0.05)
+        if latest is None:
+            return None
+        
+        slot, image, timestamp = latest
+        return image, worker.color_format, timestamp, lambda: worker.release(slot)
+    
+    def get_capture_stats(self):
+        """
+        Get background capture statistics.
+        
+        Returns:
+            dict: {region: {"captures": int, "alive": bool}} per capture thread
+        """
+        with self._capture_workers_lock:
+            return {str(region): {'captures': worker.captures, 'alive': worker.is_alive()}
+                    for region, worker in self._capture_workers.items()}
+    
+    @staticmethod
+    def _owned_bgr(image, color_format):
+        """Convert a captured image to a BGR array that does not share the capture buffer"""
+        if image is None:
+            return None
+        bgr = convert_color(image, color_format, 'color')
+        if bgr is image:
+            bgr = image.copy()
+        return bgr
+    
+    def grab_screen(self, region=None, owned=False):
+        """
+        Capture the screen without any color conversion or caching.
+        
+        The image is usually a view of a buffer owned by the capture backend,
+        which is overwritten by the next capture of the same region and
+        released when the backend evicts it.
+        
+        Args:
+            region: Optional region to capture (left, top, width, height)
+            owned: Capture into a new array instead, copied while the
+                backend still holds its lock
+            
+        Returns:
+            tuple: (image, color format) such as (numpy.ndarray, "BGRA"),
+                or (None, None) on failure
+        """
+        if not HAS_CV_SUPPORT or self.capture_backend is None:
+            return None, None
+        
+        try:
+            backend = self.capture_backend
+            if owned and backend.shared_buffers:
+                out = np.empty(backend.output_shape(region), dtype=np.uint8)
+                return backend.grab(region, out=out), backend.color_format
+            return backend.grab(region), backend.color_format
+        except Exception as e:
+            logger.error(f"Error capturing screen region {region}: {str(e)}")
+            return None, None
+    
+    def get_client_region(self, client):
+        """
+        Get the capture region of a client window, clipped to the screen.
+
+        Args:
+            client: Client info dictionary with position and size
+
+        Returns:
+            tuple: (left, top, width, height) or None if the whole screen
+                should be captured
+        """
+        if not self.client_scoped_capture or not isinstance(client, dict):
+            return None
+
+        try:
+            left = int(client['position_x'])
+            top = int(client['position_y'])
+            right = left + int(client['width'])
+            bottom = top + int(client['height'])
+
+            # Ekran dışına taşan kısımları kırp
+            if self.capture_backend is not None:
+                screen_width, screen_height = self.capture_backend.screen_size()
+            elif HAS_GUI_SUPPORT:
+                screen_width, screen_height = pyautogui.size()
+            else:
+                return None
+            left, top = max(0, left), max(0, top)
+            right, bottom = min(screen_width, right), min(screen_height, bottom)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.debug(f"Client geometry not available, using full screen: {str(e)}")
+            return None
+
+        if right - left <= 0 or bottom - top <= 0:
+            return None
+
+        return (left, top, right - left, bottom - top)
+
+    def record_frame(self, frame):
+        """
+        Write a freshly captured frame to the recording, if recording is on.
+        
+        Args:
+            frame: FrameContext that was just captured
+        """
+        if self.recorder is None or frame._source is None:
+            return
+        frame.record_index = self.recorder.record_frame(
+            frame.stream_key, frame._source, frame._source_format, frame.origin, frame.timestamp
+        )
+    
+    def record_decision(self, frame, kind, **details):
+        """
+        Write a decision of the bot to the recording, if recording is on.
+        
+        Args:
+            frame: FrameContext the decision was based on, or None
+            kind: Kind of decision, e.g. "screen_state", "click" or "key"
+            **details: JSON serializable details of the decision
+        """
+        if self.recorder is None:
+            return
+        stream = frame.stream_key if isinstance(frame, FrameContext) else None
+        index = frame.record_index if isinstance(frame, FrameContext) else None
+        self.recorder.record_decision(stream, kind, frame=index, **details)
+    
+    def create_frame_context(self, client=None, max_age=None):
+        """
+        Create a frame context to share one capture between detectors.
+
+        Args:
+            client: Optional client info dictionary the frame belongs to
+            max_age: Oldest background frame to accept in seconds
+
+        Returns:
+            FrameContext: New, not yet captured frame context
+        """
+        return FrameContext(self, client, max_age)
+
+    def _resolve_frame(self, screen):
+        """
+        Turn a screen argument into a frame context.
+
+        Args:
+            screen: None, a numpy image or a FrameContext
+
+        Returns:
+            FrameContext: The given context, or a transient one wrapping the image
+        """
+        if isinstance(screen, FrameContext):
+            return screen
+
+        frame = FrameContext(self)
+        if screen is not None:
+            frame.set_image(screen)
+            return frame
+
+        # Önbellekteki ekran görüntüsü aynı kaldıkça aynı kareyi (ve sonuçlarını) kullan
+        screen = self.get_screen()
+        with self._memo_lock:
+            if self._screen_frame is None or self._screen_frame._source is not screen:
+                frame.set_image(screen)
+                self._screen_frame = frame
+            return self._screen_frame
+
+    def _memo_get(self, frame, key):
+        """
+        Look up a detection result computed earlier on the same frame.
+
+        Args:
+            frame: FrameContext the query runs on
+            key: Query key (kind, template name, threshold, ...)
+
+        Returns:
+            tuple: (True, result) on a hit, (False, None) on a miss
+        """
+        if not self.memoize_detections:
+            return False, None
+
+        # Sonuçlar kareye bağlı; yeni yakalamada kare kimliği ve sonuçlar sıfırlanır
+        key = (frame.frame_id,) + key
+        with self._memo_lock:
+            if key in frame.results:
+                self.memo_hits += 1
+                return True, frame.results[key]
+            self.memo_misses += 1
+            return False, None
+
+    def _memo_put(self, frame, key, result):
+        """Remember a detection result for the rest of the frame's lifetime"""
+        if self.memoize_detections and frame.frame_id is not None:
+            with self._memo_lock:
+                frame.results[(frame.frame_id,) + key] = result
+
+    def get_memo_stats(self):
+        """
+        Get detection memo statistics.
+
+        Returns:
+            dict: Hit and miss counts and hit rate
+        """
+        with self._memo_lock:
+            lookups = self.memo_hits + self.memo_misses
+            return {
+                'hits': self.memo_hits,
+                'misses': self.memo_misses,
+                'hit_rate': self.memo_hits / lookups if lookups else 0.0
+            }
+
+    def get_template_setting(self, template_name, key, default=None):
+        """
+        Get a per-template matching setting.
+
+        Args:
+            template_name: Name of the template
+            key: Setting name (e.g. "pyramid_levels")
+            default: Value used when the template has no such setting
+
+        Returns:
+            Setting value or default
+        """
+        settings = self.template_settings.get(template_name)
+        if isinstance(settings, dict) and key in settings:
+            return settings[key]
+        return default
+
+    def _color_mode_for(self, template_name):
+        """
+        Get the matching color mode of a template.
+
+        Returns:
+            str: "color", "gray" or a single channel ("b", "g", "r")
+        """
+        mode = self.get_template_setting(template_name, 'color_mode', self.color_mode)
+        if mode == 'channel':
+            channel = str(self.get_template_setting(template_name, 'channel', 'g')).lower()
+            return channel if channel in _CHANNEL_INDEX else 'g'
+        if mode not in COLOR_MODES:
+            return 'color'
+        return mode
+
+    def _template_image(self, template_name, mode='color', levels=0, variants=None, geometry=None):
+        """
+        Get a template converted to a color mode and pyramid level.
+
+        The template is loaded on first use if needed; conversions are done
+        once and cached with the template. If a frame geometry is given and
+        differs from the template's base resolution, the template is scaled
+        to match it, once per geometry.
+
+        Args:
+            template_name: Name of the template
+            mode: Matching color mode
+            levels: Number of pyramid levels to downscale by
+            variants: Already loaded variants of the template, if at hand
+            geometry: Optional (width, height) of the frame the template is matched on
+
+        Returns:
+            numpy.ndarray: Converted template image, or None if the template is unknown
         """
-        if not HAS_GUI_SUPPORT:
-            logger.warning("Cannot capture reference image: GUI support not available")
-            return False
+        if variants is None:
+            variants = self._load_template(template_name)
+        if variants is None:
+            return None
         
-        try:
-            # Ekran görüntüsü al
-            if region is None:
-                screenshot = pyautogui.screenshot()
+        scale = self._template_scale(template_name, geometry)
+        key = (mode, levels) if scale is None else (mode, levels, tuple(geometry))
+        
+        derived = variants.get(key)
+        if derived is None:
+            if levels > 0:
+                derived = self._downscale(
+                    self._template_image(template_name, mode, variants=variants, geometry=geometry), levels)
+            elif scale is not None:
+                base = self._template_image(template_name, mode, variants=variants)
+                size = (max(1, int(round(base.shape[1] * scale[0]))), max(1, int(round(base.shape[0] * scale[1]))))
+                # Küçültürken alan ortalaması, büyütürken doğrusal aradeğerleme
+                interpolation = cv2.INTER_AREA if size[0] < base.shape[1] else cv2.INTER_LINEAR
+                derived = cv2.resize(base, size, interpolation=interpolation)
             else:
-                screenshot = pyautogui.screenshot(region=region)
-            
-            # OpenCV formatına çevir
-            img = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-            
-            # Referans resimleri dizinini kontrol et
-            ref_dir = "reference_images"
-            if not os.path.exists(ref_dir):
-                os.makedirs(ref_dir)
-            
-            # Resmi kaydet
-            img_path = os.path.join(ref_dir, f"{name}.png")
-            cv2.imwrite(img_path, img)
-            
-            # Referans resmi sözlüğüne ekle
-            self.reference_images[name] = img
-            
-            logger.info(f"Captured reference image: {name}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error capturing reference image: {str(e)}")
-            return False
-    
-    def get_screen(self, force_refresh=False):
+                derived = convert_color(variants[('color', 0)], 'BGR', mode)
+            self.templates.add_variant(template_name, key, derived, variants)
+        return derived
+
+    def _template_scale(self, template_name, geometry):
         """
-        Get the current screen as a numpy array.
-        Uses caching to avoid excessive screenshots.
-        
+        Get the factor a template has to be scaled by for a frame geometry.
+
         Args:
-            force_refresh: Force taking a new screenshot
-            
+            template_name: Name of the template
+            geometry: (width, height) of the frame, or None
+
         Returns:
-            numpy.ndarray: Screenshot as a numpy array in BGR format
+            tuple: (scale_x, scale_y), or None if the template is used as is
         """
-        if not HAS_GUI_SUPPORT:
+        if geometry is None:
             return None
         
-        current_time = time.time()
-        
-        # Önbelleğe alınmış ekran görüntüsü varsa ve yeterince yeniyse kullan
-        if (not force_refresh and 
-            self.screen_cache is not None and 
-            current_time - self.screen_timestamp < 0.5):
-            return self.screen_cache
+        # Şablonların yakalandığı çözünürlük (şablon bazında değiştirilebilir)
+        base = self.get_template_setting(template_name, 'base_resolution', self.template_base_resolution)
+        if not base:
+            return None
         
-        try:
-            # Yeni ekran görüntüsü al
-            screenshot = pyautogui.screenshot()
-            
-            # OpenCV formatına çevir
-            self.screen_cache = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-            self.screen_timestamp = current_time
-            
-            return self.screen_cache
-            
-        except Exception as e:
-            logger.error(f"Error capturing screenshot: {str(e)}")
+        scale_x, scale_y = geometry[0] / float(base[0]), geometry[1] / float(base[1])
+        if abs(scale_x - 1) < 0.02 and abs(scale_y - 1) < 0.02:
             return None
-    
+        return (scale_x, scale_y)
+
+    def _template_variant_spec(self, template_name, template):
+        """
+        Get the variants a template is stored with in the template store.
+
+        Args:
+            template_name: Name of the template
+            template: Template image in BGR format
+
+        Returns:
+            set: Set of (mode, levels) tuples
+        """
+        mode = self._color_mode_for(template_name)
+        spec = {('color', 0), ('gray', 0), (mode, 0)}
+        levels = self._pyramid_levels_for(template_name, template)
+        if levels > 0:
+            spec.add((mode, levels))
+        return spec
+
+    def _build_template_variant(self, template, mode, levels):
+        """Convert a BGR template to a color mode and pyramid level"""
+        return self._downscale(convert_color(template, 'BGR', mode), levels)
+
+    def _prepare_template(self, template_name, variants):
+        """Precompute the converted images a template is matched with"""
+        mode = self._color_mode_for(template_name)
+        template = self._template_image(template_name, mode, variants=variants)
+        levels = self._pyramid_levels_for(template_name, template)
+        if levels > 0:
+            self._template_image(template_name, mode, levels, variants=variants)
+
+    @staticmethod
+    def _downscale(image, levels):
+        """Downscale an image by 2^levels using a Gaussian pyramid"""
+        for _ in range(levels):
+            image = cv2.pyrDown(image)
+        return image
+
+    def _pyramid_levels_for(self, template_name, template):
+        """
+        Get the usable pyramid depth of a template.
+
+        The configured depth is reduced until the downscaled template is
+        still large enough to carry meaningful detail.
+
+        Returns:
+            int: Number of pyramid levels (0 disables pyramid matching)
+        """
+        levels = int(self.get_template_setting(template_name, 'pyramid_levels', self.pyramid_levels))
+        h, w = template.shape[:2]
+        while levels > 0 and min(h, w) >> levels < 8:
+            levels -= 1
+        return levels
+
+    def _pyramid_candidates(self, frame, template_name, mode, levels, threshold, max_candidates):
+        """
+        Search downscaled copies of the frame and template for candidate peaks.
+
+        Args:
+            frame: FrameContext to search
+            template_name: Name of the template
+            mode: Matching color mode
+            levels: Pyramid depth
+            threshold: Full resolution confidence threshold
+            max_candidates: Maximum number of candidates to return
+
+        Returns:
+            tuple: (best coarse confidence, list of (x, y) full resolution candidates)
+        """
+        small_screen = frame.variant(('pyramid', mode, levels),
+                                     lambda: self._downscale(frame.mode_image(mode), levels))
+        small_template = self._template_image(template_name, mode, levels, geometry=frame.size)
+
+        result = self._match(template_name, small_screen, small_template)
+        th, tw = small_template.shape[:2]
+        scale = 1 << levels
+
+        best = cv2.minMaxLoc(result)[1]
+        peaks = extract_peaks(result, threshold - self.pyramid_margin, (tw, th), max_candidates)
+        candidates = [(x * scale, y * scale) for x, y, score in peaks]
+
+        return best, candidates
+
+    def _refine_candidates(self, screen, template, candidates, levels, template_name=None):
+        """
+        Re-match candidates at full resolution in small windows.
+
+        Returns:
+            list: List of (confidence, (x, y)) top-left corners in frame coordinates
+        """
+        h, w = template.shape[:2]
+        sh, sw = screen.shape[:2]
+        pad = 2 << levels
+        refined = []
+
+        for x, y in candidates:
+            window = (max(0, x - pad), max(0, y - pad),
+                      min(sw, x + w + pad), min(sh, y + h + pad))
+            if window[2] - window[0] < w or window[3] - window[1] < h:
+                continue
+            refined.append(self._match_best(screen, template, window, template_name))
+
+        return refined
+
     def find_template(self, template_name, threshold=None, screen=None):
         """
         Find a template image on the screen.
@@ -155,12 +1616,12 @@ class ImageRecognition:
         Args:
             template_name: Name of the template to find
             threshold: Confidence threshold (0-1)
-            screen: Optional screen image to use instead of capturing
+            screen: Optional screen image or FrameContext to use instead of capturing
             
         Returns:
-            tuple: (x, y) position of the center of the template if found, None otherwise
+            tuple: (x, y) screen position of the center of the template if found, None otherwise
         """
-        if not HAS_GUI_SUPPORT:
+        if not HAS_CV_SUPPORT:
             # Simüle edilmiş davranış - Eğitim için rastgele pozitif veya negatif sonuç
             import random
             if random.random() > 0.5:
@@ -171,125 +1632,549 @@ class ImageRecognition:
             threshold = self.confidence_threshold
         
         # Şablon kontrol et
-        if template_name not in self.reference_images:
+        # Şablonu ve kareyi aynı renk moduna çevir (şablon gerekirse ilk kullanımda yüklenir)
+        mode = self._color_mode_for(template_name)
+        template = self._template_image(template_name, mode)
+        
+        if template is None:
             logger.warning(f"Template '{template_name}' not found in reference images")
             return None
         
-        template = self.reference_images[template_name]
-        
         # Ekran görüntüsü al
-        if screen is None:
-            screen = self.get_screen()
+        frame = self._resolve_frame(screen)
+        memo_key = ('best', template_name, threshold)
+        found, result = self._memo_get(frame, memo_key)
+        if found:
+            return result
+        
+        screen, origin = frame.mode_image(mode), frame.origin
         
         if screen is None:
             logger.error("Failed to capture screen")
             return None
         
+        # İstemci boyutuna göre ölçeklenmiş şablonu kullan
+        template = self._template_image(template_name, mode, geometry=(screen.shape[1], screen.shape[0]))
+        
         # Şablon eşleştirme yap
         try:
-            result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            h, w = template.shape[:2]
+            geometry = (screen.shape[1], screen.shape[0])
+            max_val, max_loc = self._find_best(frame, screen, template_name, mode, template, threshold)
             
             if max_val >= threshold:
+                if self.search_regions is not None:
+                    self.search_regions.record(template_name, geometry, max_loc)
+                
                 # Merkez noktayı hesapla
-                h, w = template.shape[:2]
-                center_x = max_loc[0] + w//2
-                center_y = max_loc[1] + h//2
+                center_x = max_loc[0] + w//2 + origin[0]
+                center_y = max_loc[1] + h//2 + origin[1]
                 
                 logger.debug(f"Found template '{template_name}' at ({center_x}, {center_y}) with confidence {max_val:.2f}")
+                self._memo_put(frame, memo_key, (center_x, center_y))
                 return (center_x, center_y)
             else:
                 logger.debug(f"Template '{template_name}' not found (max confidence: {max_val:.2f}, threshold: {threshold:.2f})")
+                self._memo_put(frame, memo_key, None)
                 return None
                 
         except Exception as e:
             logger.error(f"Error finding template '{template_name}': {str(e)}")
             return None
     
-    def find_all_templates(self, template_name, threshold=None, screen=None, limit=10):
+    def _frame_diff_seq(self, frame):
+        """Register a frame with the frame difference tracker once and get its sequence number"""
+        with frame._lock:
+            if frame.diff_seq is None:
+                frame.diff_seq = self.frame_diff.update(frame.stream_key, frame._source)
+            return frame.diff_seq
+    
+    def _find_best(self, frame, screen, template_name, mode, template, threshold):
+        """
+        Find the best match of a template, re-matching only changed tiles if possible.
+        
+        A previous result is returned unchanged if no tile of the frame changed
+        since it was computed. Otherwise, as long as the previous best match
+        itself is untouched, only the windows around the changed tiles are
+        matched and compared against it.
+        
+        Returns:
+            tuple: (confidence, (x, y)) top-left corner in frame coordinates
+        """
+        tracker = self.frame_diff
+        if tracker is None:
+            return self._search_best(frame, screen, template_name, mode, template, threshold)
+        
+        h, w = template.shape[:2]
+        stream, seq = frame.stream_key, self._frame_diff_seq(frame)
+        result_key = (stream, template_name, 'best', mode, threshold)
+        cached = tracker.get_result(result_key)
+        result, outcome = None, 'full'
+        
+        if cached is not None and cached[0] <= seq:
+            since, (max_val, max_loc) = cached
+            windows = tracker.dirty_windows(stream, since, (w, h))
+            if windows == []:
+                result, outcome = (max_val, max_loc), 'reused'
+            elif windows is not None and (max_val < threshold or
+                                          tracker.is_clean(stream, since, (max_loc[0], max_loc[1], w, h))):
+                # Önceki en iyi eşleşme yerinde; sadece değişen bölgelerde daha iyisi olabilir
+                result, outcome = (max_val, max_loc), 'partial'
+                for window in windows:
+                    candidate = self._match_best(screen, template, window, template_name)
+                    if candidate[0] > result[0]:
+                        result = candidate
+        
+        if result is None:
+            result = self._search_best(frame, screen, template_name, mode, template, threshold)
+        
+        tracker.put_result(result_key, seq, result, outcome)
+        return result
+    
+    def _search_best(self, frame, screen, template_name, mode, template, threshold):
+        """
+        Search a whole frame for the best match of a template.
+        
+        Returns:
+            tuple: (confidence, (x, y)) top-left corner in frame coordinates;
+                the position may be None if the template is clearly absent
+        """
+        h, w = template.shape[:2]
+        geometry = (screen.shape[1], screen.shape[0])
+        max_val, max_loc = -1.0, None
+        
+        # Önce şablonun beklenen bölgesinde ara
+        window = None
+        if self.search_regions is not None:
+            window = self.search_regions.lookup(template_name, geometry, (w, h))
+        
+        if window is not None:
+            max_val, max_loc = self._match_best(screen, template, window, template_name)
+        
+        # Bölgede bulunamadıysa tüm karede ara
+        if max_val < threshold:
+            levels = self._pyramid_levels_for(template_name, template)
+            if levels > 0:
+                # Kaba-ince arama: küçültülmüş karede aday bul, tam çözünürlükte doğrula
+                coarse_val, candidates = self._pyramid_candidates(
+                    frame, template_name, mode, levels, threshold, max_candidates=3)
+                refined = self._refine_candidates(screen, template, candidates, levels, template_name)
+                if refined:
+                    max_val, max_loc = max(refined, key=lambda r: r[0])
+                elif not candidates:
+                    max_val = max(max_val, coarse_val)
+            else:
+                max_val, max_loc = self._match_best(screen, template, template_name=template_name)
+        
+        return max_val, max_loc
+    
+    def _match_best(self, screen, template, window=None, template_name=None):
+        """
+        Find the best match of a template in a frame or a window of it.
+        
+        Args:
+            screen: Frame image
+            template: Template image
+            window: Optional (left, top, right, bottom) area of the frame to search
+            template_name: Name of the template, used to pick its matching backend
+            
+        Returns:
+            tuple: (confidence, (x, y)) top-left corner in frame coordinates
+        """
+        if window is None:
+            left, top = 0, 0
+        else:
+            left, top, right, bottom = window
+            screen = screen[top:bottom, left:right]
+        
+        result = self._match(template_name, screen, template, window is not None)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        return max_val, (max_loc[0] + left, max_loc[1] + top)
+    
+    def _match(self, template_name, screen, template, window=False):
+        """
+        Match a template with the backend chosen for it.
+        
+        Args:
+            template_name: Name of the template (None for the default backend)
+            screen: Frame image or window of it
+            template: Template image
+            window: True if screen is a small window rather than a whole frame
+            
+        Returns:
+            numpy.ndarray: Score map, 1.0 being a perfect match
+        """
+        return self._backend_for(template_name, screen, template, window).match(screen, template)
+    
+    def _backend_for(self, template_name, screen, template, window=False):
+        """
+        Pick the matching backend of a template.
+        
+        A backend named in the template settings (or by match_backend) is
+        always used. In "auto" mode, the equivalent backends are timed once
+        per template and frame size on the first full-frame search and the
+        fastest one is kept; small windows and templates below
+        fft_min_template_area always use OpenCV.
+        
+        Returns:
+            MatchBackend: Backend to match with
+        """
+        setting = self.match_backend
+        if template_name is not None:
+            setting = self.get_template_setting(template_name, 'match_backend', setting)
+        
+        if setting in self.match_backends:
+            return self.match_backends[setting]
+        
+        default = self.match_backends['opencv']
+        h, w = template.shape[:2]
+        if template_name is None or window or h * w < self.fft_min_template_area:
+            return default
+        
+        key = (template_name, template.shape, screen.shape)
+        with self._backend_lock:
+            choice = self._backend_choice.get(key)
+        if choice is not None:
+            return choice
+        
+        # Eşdeğer arka uçları bu boyutlarda bir kez ölçüp en hızlısını seç
+        timings = {name: time_backend(backend, screen, template, repeat=1)
+                   for name, backend in self.match_backends.items() if backend.equivalent}
+        choice = self.match_backends[min(timings, key=timings.get)]
+        logger.debug(f"Matching backend for '{template_name}' at {screen.shape[1]}x{screen.shape[0]}: "
+                     f"{choice.name} ({', '.join(f'{n} {t * 1000:.1f} ms' for n, t in timings.items())})")
+        
+        with self._backend_lock:
+            self._backend_choice[key] = choice
+        return choice
+    
+    def benchmark_match_backends(self, screen_size=(1280, 720), repeat=3):
+        """
+        Time every matching backend on the loaded template library.
+        
+        Args:
+            screen_size: (width, height) of the synthetic screen
+            repeat: Runs per measurement
+            
+        Returns:
+            dict: Report from match_backends.benchmark_backends, including the
+                template area from which each backend beats OpenCV
+        """
+        templates = {}
+        for name in list(self._template_sources):
+            template = self._template_image(name)
+            if template is not None:
+                templates[name] = template
+        
+        report = benchmark_backends(templates, screen_size, self.match_backends, repeat)
+        for name, area in report['crossover'].items():
+            logger.info(f"Backend {name} beats opencv from template area: {area}")
+        return report
+    
+    def find_all_templates(self, template_name, threshold=None, screen=None, limit=10, with_scores=False):
         """
         Find all occurrences of a template on the screen.
         
         Args:
             template_name: Name of the template to find
             threshold: Confidence threshold (0-1)
-            screen: Optional screen image to use instead of capturing
+            screen: Optional screen image or FrameContext to use instead of capturing
             limit: Maximum number of matches to return
+            with_scores: Return (x, y, confidence) tuples instead of (x, y)
             
         Returns:
-            list: List of (x, y) positions of the centers of matched templates
+            list: Screen positions of the centers of matched templates,
+                sorted by confidence (highest first)
         """
-        if not HAS_GUI_SUPPORT:
+        if not HAS_CV_SUPPORT:
             # Simüle edilmiş davranış - Eğitim için rastgele sonuçlar
             import random
             count = random.randint(0, 5)
-            return [(random.randint(100, 900), random.randint(100, 700)) for _ in range(count)]
+            points = [(random.randint(100, 900), random.randint(100, 700)) for _ in range(count)]
+            if with_scores:
+                return [(x, y, 1.0) for x, y in points]
+            return points
         
         if threshold is None:
             threshold = self.confidence_threshold
         
         # Şablon kontrol et
-        if template_name not in self.reference_images:
+        # Şablonu ve kareyi aynı renk moduna çevir (şablon gerekirse ilk kullanımda yüklenir)
+        mode = self._color_mode_for(template_name)
+        template = self._template_image(template_name, mode)
+        
+        if template is None:
             logger.warning(f"Template '{template_name}' not found in reference images")
             return []
         
-        template = self.reference_images[template_name]
-        
         # Ekran görüntüsü al
-        if screen is None:
-            screen = self.get_screen()
+        frame = self._resolve_frame(screen)
+        memo_key = ('all', template_name, threshold, limit)
+        found, matches = self._memo_get(frame, memo_key)
+        if found:
+            if with_scores:
+                return list(matches)
+            return [(x, y) for x, y, score in matches]
+        
+        screen, origin = frame.mode_image(mode), frame.origin
         
         if screen is None:
             logger.error("Failed to capture screen")
             return []
         
+        # İstemci boyutuna göre ölçeklenmiş şablonu kullan
+        template = self._template_image(template_name, mode, geometry=(screen.shape[1], screen.shape[0]))
+        
         # Şablon eşleştirme yap
         try:
-            result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
             h, w = template.shape[:2]
+            peaks = self._find_peaks(frame, screen, template_name, mode, template, threshold, limit)
             
-            # Eşik değeriyle eşleşen konumları bul
-            locations = np.where(result >= threshold)
-            points = list(zip(*locations[::-1]))
-            
-            # Çok yakın eşleşmeleri filtrele
-            filtered_points = []
+            # Merkez noktaları hesapla ve ekran koordinatlarına çevir
+            matches = [(x + w//2 + origin[0], y + h//2 + origin[1], score) for x, y, score in peaks]
+            self._memo_put(frame, memo_key, tuple(matches))
             
-            for point in points:
-                # Merkez noktayı hesapla
-                center_x = point[0] + w//2
-                center_y = point[1] + h//2
-                
-                # Yakın noktaları kontrol et
-                too_close = False
-                for existing_point in filtered_points:
-                    dist_x = abs(center_x - existing_point[0])
-                    dist_y = abs(center_y - existing_point[1])
-                    
-                    if dist_x < w//2 and dist_y < h//2:
-                        too_close = True
-                        break
-                
-                if not too_close:
-                    filtered_points.append((center_x, center_y))
-                    
-                    # Limit kontrolü
-                    if len(filtered_points) >= limit:
-                        break
-            
-            logger.debug(f"Found {len(filtered_points)} instances of template '{template_name}'")
-            return filtered_points
+            logger.debug(f"Found {len(matches)} instances of template '{template_name}'")
+            if with_scores:
+                return matches
+            return [(x, y) for x, y, score in matches]
                 
         except Exception as e:
             logger.error(f"Error finding templates '{template_name}': {str(e)}")
             return []
     
+    def _find_peaks(self, frame, screen, template_name, mode, template, threshold, limit):
+        """
+        Find all matches of a template, re-matching only changed tiles if possible.
+        
+        Previous matches whose area did not change are kept and combined with
+        the matches found in the windows around the changed tiles. A full
+        search is done if a previous match changed while the previous result
+        was cut off at the limit, since the next-best matches are not known.
+        
+        Returns:
+            list: List of (x, y, confidence) top-left corners in frame coordinates
+        """
+        tracker = self.frame_diff
+        if tracker is None:
+            return self._search_all(frame, screen, template_name, mode, template, threshold, limit)
+        
+        h, w = template.shape[:2]
+        stream, seq = frame.stream_key, self._frame_diff_seq(frame)
+        result_key = (stream, template_name, 'all', mode, threshold, limit)
+        cached = tracker.get_result(result_key)
+        peaks, outcome = None, 'full'
+        
+        if cached is not None and cached[0] <= seq:
+            since, previous = cached
+            windows = tracker.dirty_windows(stream, since, (w, h))
+            if windows == []:
+                peaks, outcome = previous, 'reused'
+            elif windows is not None:
+                kept = [p for p in previous if tracker.is_clean(stream, since, (p[0], p[1], w, h))]
+                if len(kept) == len(previous) or len(previous) < limit:
+                    found = list(kept)
+                    for left, top, right, bottom in windows:
+                        result = self._match(template_name, screen[top:bottom, left:right], template, True)
+                        found.extend((x + left, y + top, score)
+                                     for x, y, score in extract_peaks(result, threshold, (w, h), limit))
+                    peaks, outcome = [], 'partial'
+                    if found:
+                        # Pencere sınırlarında tekrar bulunan eşleşmeleri ele
+                        peaks = suppress_overlaps(
+                            np.array([p[0] for p in found]),
+                            np.array([p[1] for p in found]),
+                            np.array([p[2] for p in found]),
+                            (w, h), limit
+                        )
+        
+        if peaks is None:
+            peaks = self._search_all(frame, screen, template_name, mode, template, threshold, limit)
+        
+        tracker.put_result(result_key, seq, peaks, outcome)
+        return peaks
+    
+    def _search_all(self, frame, screen, template_name, mode, template, threshold, limit):
+        """
+        Search a whole frame for all matches of a template.
+        
+        Returns:
+            list: List of (x, y, confidence) top-left corners in frame coordinates
+        """
+        h, w = template.shape[:2]
+        levels = self._pyramid_levels_for(template_name, template)
+        
+        if levels > 0:
+            # Kaba-ince arama: adayları küçültülmüş karede bul, tam çözünürlükte doğrula
+            coarse_val, candidates = self._pyramid_candidates(
+                frame, template_name, mode, levels, threshold, max_candidates=limit * 4)
+            refined = [r for r in self._refine_candidates(screen, template, candidates, levels, template_name)
+                       if r[0] >= threshold]
+            if not refined:
+                return []
+            
+            # Aynı hedefe yakınsayan adayları ele
+            return suppress_overlaps(
+                np.array([loc[0] for val, loc in refined]),
+                np.array([loc[1] for val, loc in refined]),
+                np.array([val for val, loc in refined]),
+                (w, h), limit
+            )
+        
+        result = self._match(template_name, screen, template)
+        
+        # Yerel tepeleri bul ve çok yakın eşleşmeleri ele
+        return extract_peaks(result, threshold, (w, h), limit)
+    
+    def _get_executor(self):
+        """Get the shared perception thread pool, creating it on first use"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.perception_workers,
+                    thread_name_prefix='perception'
+                )
+            return self._executor
+    
+    def find_many(self, template_names, screen=None, threshold=None, find_all=False, limit=10,
+                  with_scores=False):
+        """
+        Run several templates against the same frame in one call.
+        
+        The frame is captured and color converted once, then the templates
+        are matched in parallel on the perception thread pool.
+        
+        Args:
+            template_names: Names of the templates to find
+            screen: Optional screen image or FrameContext to use instead of capturing
+            threshold: Confidence threshold (0-1)
+            find_all: Find all occurrences (find_all_templates) instead of the best one
+            limit: Maximum number of matches per template when find_all is set
+            with_scores: Include confidences in find_all results (see find_all_templates)
+            
+        Returns:
+            dict: {template_name: result} where result is an (x, y) position or
+                None, or a list of positions when find_all is set
+        """
+        template_names = list(template_names)
+        frame = self._resolve_frame(screen) if HAS_CV_SUPPORT else screen
+        
+        def find(name):
+            if find_all:
+                return self.find_all_templates(name, threshold=threshold, screen=frame, limit=limit,
+                                               with_scores=with_scores)
+            return self.find_template(name, threshold=threshold, screen=frame)
+        
+        if not HAS_CV_SUPPORT or len(template_names) <= 1 or self.perception_workers <= 1:
+            return {name: find(name) for name in template_names}
+        
+        # Renk dönüşümlerini ve kare farkı kaydını iş parçacıklarına dağıtmadan önce bir kez yap
+        for mode in {self._color_mode_for(name) for name in template_names}:
+            frame.mode_image(mode)
+        if self.frame_diff is not None and frame.is_valid:
+            self._frame_diff_seq(frame)
+        
+        executor = self._get_executor()
+        futures = {name: executor.submit(find, name) for name in template_names}
+        return {name: future.result() for name, future in futures.items()}
+    
+    def _state_detectors(self):
+        """Template detectors of each screen state, in the default check order"""
+        return OrderedDict([
+            ('login', self.detect_login_screen),
+            ('main_menu', self.detect_main_menu),
+            ('in_game', self.detect_in_game)
+        ])
+    
+    def classify_screen(self, screen=None):
+        """
+        Detect the screen state of a frame.
+        
+        The frame's fingerprint is looked up in the learned state table first.
+        On a miss, the template detectors run starting with the client's last
+        known state, and the result is learned for the next time. A cached
+        state is re-checked with its detector every state_verify_interval
+        uses per client, and forgotten if the check fails.
+        
+        Args:
+            screen: Optional screen image or FrameContext to use instead of capturing
+            
+        Returns:
+            str: "login", "main_menu", "in_game" or "unknown"
+        """
+        detectors = self._state_detectors()
+        
+        if not HAS_CV_SUPPORT:
+            for state, detect in detectors.items():
+                if detect(screen):
+                    return state
+            return 'unknown'
+        
+        frame = self._resolve_frame(screen)
+        found, state = self._memo_get(frame, ('state',))
+        if found:
+            return state
+        
+        stream = frame.stream_key
+        last_state, unverified = self._last_states.get(stream, (None, 0))
+        geometry = fingerprint = None
+        state = None
+        
+        if self.state_cache is not None and frame.size is not None:
+            geometry = frame.size
+            fingerprint = frame.variant(('dhash',), lambda: difference_hash(frame._source))
+            state = self.state_cache.lookup(geometry, fingerprint)
+            
+            if state is not None:
+                unverified += 1
+                # Ara sıra tahmini şablonlarla doğrula
+                if self.state_verify_interval > 0 and unverified >= self.state_verify_interval:
+                    unverified = 0
+                    if not detectors[state](frame):
+                        logger.debug(f"Cached screen state '{state}' no longer matches, relearning")
+                        self.state_cache.forget(geometry, fingerprint)
+                        state = None
+        
+        if state is None:
+            unverified = 0
+            
+            # Son bilinen durumu önce dene
+            order = list(detectors)
+            if last_state in detectors:
+                order.remove(last_state)
+                order.insert(0, last_state)
+            
+            state = 'unknown'
+            for candidate in order:
+                if detectors[candidate](frame):
+                    state = candidate
+                    break
+            
+            # Bilinmeyen ekranlar (yükleme vb.) geçicidir, öğrenme
+            if state != 'unknown' and fingerprint is not None:
+                self.state_cache.learn(geometry, fingerprint, state)
+        
+        self._last_states[stream] = (state, unverified)
+        self._memo_put(frame, ('state',), state)
+        return state
+    
+    def get_state_cache_stats(self):
+        """
+        Get screen state cache statistics.
+        
+        Returns:
+            dict: Learned fingerprint count and hit/miss counters
+        """
+        if self.state_cache is None:
+            return {}
+        return self.state_cache.stats()
+    
     def detect_login_screen(self, screen=None):
         """
         Detect if the current screen is the login screen.
         
         Args:
-            screen: Optional screen image to use instead of capturing
+            screen: Optional screen image or FrameContext to use instead of capturing
             
         Returns:
             bool: True if login screen detected
@@ -303,7 +2188,7 @@ class ImageRecognition:
         Detect if the current screen is the main menu.
         
         Args:
-            screen: Optional screen image to use instead of capturing
+            screen: Optional screen image or FrameContext to use instead of capturing
             
         Returns:
             bool: True if main menu detected
@@ -317,30 +2202,24 @@ class ImageRecognition:
         Detect if the current screen is in-game.
         
         Args:
-            screen: Optional screen image to use instead of capturing
+            screen: Optional screen image or FrameContext to use instead of capturing
             
         Returns:
             bool: True if in-game detected
         """
-        # Sağlık/mana barı gibi in-game UI elementlerini ara
-        health_bar = self.find_template("health_bar", screen=screen)
-        
-        if health_bar is not None:
-            return True
-            
-        # Alternatif UI elementleri
-        for ui_element in ["minimap", "inventory_button", "character_button"]:
-            if self.find_template(ui_element, screen=screen) is not None:
-                return True
-        
-        return False
+        # Sağlık/mana barı ve alternatif in-game UI elementlerini birlikte ara
+        results = self.find_many(
+            ["health_bar", "minimap", "inventory_button", "character_button"],
+            screen=screen
+        )
+        return any(pos is not None for pos in results.values())
     
     def detect_low_health(self, screen=None):
         """
         Detect if health is low.
         
         Args:
-            screen: Optional screen image to use instead of capturing
+            screen: Optional screen image or FrameContext to use instead of capturing
             
         Returns:
             bool: True if low health detected
@@ -353,7 +2232,7 @@ class ImageRecognition:
         Detect if inventory is full.
         
         Args:
-            screen: Optional screen image to use instead of capturing
+            screen: Optional screen image or FrameContext to use instead of capturing
             
         Returns:
             bool: True if full inventory detected
@@ -370,29 +2249,119 @@ class ImageRecognition:
         """Find play button on screen"""
         return self.find_template("play_button", screen=screen)
     
-    def find_resource_nodes(self, screen=None, limit=5):
-        """Find resource nodes on screen"""
-        all_nodes = []
+    def track_targets(self, group, template_names, screen=None, limit=5, threshold=None):
+        """
+        Find targets of several templates and follow them across frames.
+        
+        Known targets are re-localized in small windows around their predicted
+        positions; the whole frame is searched only every few frames or when
+        a target could not be found again (see TargetTracker). Each target
+        keeps the same ID for as long as it is tracked.
+        
+        Args:
+            group: Name of the target group (e.g. "enemies"), one tracker per group and client
+            template_names: Names of the templates of the group
+            screen: Optional screen image or FrameContext to use instead of capturing
+            limit: Maximum number of targets to return (and to detect per template)
+            threshold: Confidence threshold (0-1)
+            
+        Returns:
+            list: Target dicts with id, template, x, y (screen position of the
+                center) and score, sorted by confidence (highest first)
+        """
+        if threshold is None:
+            threshold = self.confidence_threshold
+        
+        if not HAS_CV_SUPPORT or not self.target_tracking:
+            # Takip yok: her çağrıda tam arama, kimlikler kalıcı değil
+            results = self.find_many(template_names, screen=screen, threshold=threshold,
+                                     find_all=True, limit=limit, with_scores=True)
+            targets = [{'id': None, 'template': name, 'x': x, 'y': y, 'score': score}
+                       for name, matches in results.items() for x, y, score in matches]
+            targets.sort(key=lambda target: -target['score'])
+            return targets[:limit]
+        
+        frame = self._resolve_frame(screen)
+        memo_key = ('track', group, tuple(template_names), limit, threshold)
+        found, targets = self._memo_get(frame, memo_key)
+        if found:
+            return [dict(target) for target in targets]
         
-        # Farklı kaynak türlerini ara
-        for resource_type in ["ore_node", "herb_node", "wood_node"]:
-            nodes = self.find_all_templates(resource_type, screen=screen, limit=limit)
-            all_nodes.extend(nodes)
+        if frame.size is None:
+            logger.error("Failed to capture screen")
+            return []
+        
+        with self._trackers_lock:
+            tracker = self._trackers.get((frame.stream_key, group))
+            if tracker is None:
+                tracker = TargetTracker(**self.track_settings)
+                self._trackers[(frame.stream_key, group)] = tracker
+        
+        timestamp = frame.timestamp
+        full_search = tracker.needs_full_search()
+        
+        if not full_search:
+            # Bilinen hedefleri tahmini konumları çevresinde ara
+            observations = {}
+            for track in tracker.tracks:
+                mode = self._color_mode_for(track.template_name)
+                template = self._template_image(track.template_name, mode, geometry=frame.size)
+                window = tracker.local_window(track, timestamp, frame.size)
+                if template is None or window is None:
+                    continue
+                
+                max_val, max_loc = self._match_best(frame.mode_image(mode), template, window,
+                                                    track.template_name)
+                if max_val >= threshold:
+                    h, w = template.shape[:2]
+                    observations[track.id] = ((max_loc[0] + w // 2, max_loc[1] + h // 2), max_val)
+            
+            # Kaybolan hedef varsa yeni hedefleri de bulmak için tam arama yap
+            full_search = not tracker.apply_local(observations, timestamp)
+        
+        if full_search:
+            results = self.find_many(template_names, screen=frame, threshold=threshold,
+                                     find_all=True, limit=limit, with_scores=True)
+            detections = []
+            for name, matches in results.items():
+                template = self._template_image(name, self._color_mode_for(name), geometry=frame.size)
+                if template is None:
+                    continue
+                size = (template.shape[1], template.shape[0])
+                for x, y, score in matches:
+                    detections.append((name, (x - frame.origin[0], y - frame.origin[1]), size, score))
+            tracker.apply_full(detections, timestamp)
         
-        # Limit'e göre filtrele
-        return all_nodes[:limit]
+        targets = []
+        for track in tracker.tracks:
+            if track.misses:
+                continue
+            x, y = frame.to_screen(track.center)
+            targets.append({'id': track.id, 'template': track.template_name,
+                            'x': int(x), 'y': int(y), 'score': float(track.score)})
+        targets.sort(key=lambda target: -target['score'])
+        targets = targets[:limit]
+        
+        self._memo_put(frame, memo_key, tuple(targets))
+        return [dict(target) for target in targets]
+    
+    def track_resource_nodes(self, screen=None, limit=5):
+        """Find and track resource nodes on screen (see track_targets)"""
+        return self.track_targets("resource_nodes", ["ore_node", "herb_node", "wood_node"],
+                                  screen=screen, limit=limit)
+    
+    def track_enemies(self, screen=None, limit=3):
+        """Find and track enemies on screen (see track_targets)"""
+        return self.track_targets("enemies", ["enemy_wolf", "enemy_boar", "enemy_bandit"],
+                                  screen=screen, limit=limit)
+    
+    def find_resource_nodes(self, screen=None, limit=5):
+        """Find resource nodes on screen"""
+        return [(node['x'], node['y']) for node in self.track_resource_nodes(screen, limit=limit)]
     
     def find_enemies(self, screen=None, limit=3):
         """Find enemies on screen"""
-        all_enemies = []
-        
-        # Farklı düşman türlerini ara
-        for enemy_type in ["enemy_wolf", "enemy_boar", "enemy_bandit"]:
-            enemies = self.find_all_templates(enemy_type, screen=screen, limit=limit)
-            all_enemies.extend(enemies)
-        
-        # Limit'e göre filtrele
-        return all_enemies[:limit]
+        return [(enemy['x'], enemy['y']) for enemy in self.track_enemies(screen, limit=limit)]
     
     def find_mission_objectives(self, screen=None):
         """Find mission objectives on screen"""
@@ -14,7 +14,7 @@ bot_instance = None
 
 # Platforma göre modül içe aktarma
 try:
-    from app import app, init_db
+    from app import app, init_db, register_bot
     HAS_WEB_INTERFACE = True
 except ImportError as e:
     print(f"Flask web arayüzü içe aktarılamadı: {e}")
@@ -108,6 +108,9 @@ def run_bot_with_web_client():
         # Botu başlat
         bot = DarkEpochBot(config)
         bot_instance = bot
+        if HAS_WEB_INTERFACE:
+            # Web API'nin başlat/durdur/duraklat komutları bu bota uygulanır
+            register_bot(bot)
         
         # Botu ayrı bir thread'de başlat
         bot_thread = threading.Thread(target=bot.start)
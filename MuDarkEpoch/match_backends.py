@@ -0,0 +1,279 @@
+"""
+Dark Epoch Bot - Template Matching Backends
+Interchangeable implementations of template matching, plus a small
+benchmark to find which one is fastest for each template size.
+"""
+
+import os
+import sys
+import time
+import logging
+
+# Koşullu olarak OpenCV ve numpy'ı içe aktar
+try:
+    import cv2
+    import numpy as np
+    HAS_CV_SUPPORT = True
+except ImportError:
+    HAS_CV_SUPPORT = False
+
+# Loglama yapılandırması
+logger = logging.getLogger('DarkEpochBot.MatchBackends')
+
+class MatchBackend:
+    """
+    Base class of matching backends.
+
+    A backend turns a frame and a template into a score map of shape
+    (H - h + 1, W - w + 1), where higher is better and 1.0 is a perfect
+    match, like cv2.TM_CCOEFF_NORMED.
+    """
+    name = None
+
+    # Sonuçları TM_CCOEFF_NORMED ile aynı anlama gelen arka uçlar otomatik seçilebilir
+    equivalent = True
+
+    def match(self, screen, template):
+        """
+        Match a template at every position of a frame.
+
+        Args:
+            screen: Frame image (gray or multi-channel)
+            template: Template image with the same channel count
+
+        Returns:
+            numpy.ndarray: float32 score map
+        """
+        raise NotImplementedError
+
+class OpenCVBackend(MatchBackend):
+    """cv2.matchTemplate with TM_CCOEFF_NORMED (OpenCV picks direct or DFT correlation itself)"""
+    name = 'opencv'
+
+    def match(self, screen, template):
+        return cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+
+class FFTBackend(MatchBackend):
+    """
+    Normalized cross-correlation computed with a single FFT per channel.
+
+    Gives the same scores as TM_CCOEFF_NORMED. The correlation term is
+    computed in the frequency domain and the local frame statistics come
+    from integral images, so the cost hardly depends on the template size,
+    which pays off for large templates such as panels and dialogs.
+    """
+    name = 'fft'
+
+    def __init__(self):
+        self._template_spectra = {}  # {(id, şekil, fft boyutu): (spektrumlar, norm)}
+
+    def _template_spectrum(self, template, fft_shape):
+        """Get the spectra of the zero-mean template channels, cached per template"""
+        key = (id(template), template.shape, fft_shape)
+        cached = self._template_spectra.get(key)
+        if cached is not None and cached[0] is template:
+            return cached[1], cached[2]
+
+        t = template.astype(np.float64)
+        if t.ndim == 2:
+            t = t[:, :, None]
+        t = t - t.reshape(-1, t.shape[2]).mean(axis=0)
+        norm = np.sqrt((t * t).sum())
+        # Korelasyon için şablonu ters çevir
+        spectra = [np.fft.rfft2(t[::-1, ::-1, c], fft_shape) for c in range(t.shape[2])]
+
+        if len(self._template_spectra) > 256:
+            self._template_spectra.clear()
+        self._template_spectra[key] = (template, spectra, norm)
+        return spectra, norm
+
+    def match(self, screen, template):
+        H, W = screen.shape[:2]
+        h, w = template.shape[:2]
+        n = h * w
+        fft_shape = (cv2.getOptimalDFTSize(H + h - 1), cv2.getOptimalDFTSize(W + w - 1))
+        spectra, t_norm = self._template_spectrum(template, fft_shape)
+
+        image = screen if screen.ndim == 3 else screen[:, :, None]
+        numerator = np.zeros((H - h + 1, W - w + 1))
+        variance = np.zeros((H - h + 1, W - w + 1))
+
+        for c, spectrum in enumerate(spectra):
+            channel = np.ascontiguousarray(image[:, :, c])
+            corr = np.fft.irfft2(np.fft.rfft2(channel, fft_shape) * spectrum, fft_shape)
+            numerator += corr[h - 1:H, w - 1:W]
+
+            # Pencere toplamları integral görüntülerden
+            s, sq = cv2.integral2(channel, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+            window_sum = s[h:, w:] - s[:-h, w:] - s[h:, :-w] + s[:-h, :-w]
+            window_sq = sq[h:, w:] - sq[:-h, w:] - sq[h:, :-w] + sq[:-h, :-w]
+            variance += window_sq - window_sum * window_sum / n
+
+        denominator = np.sqrt(np.maximum(variance, 0)) * t_norm
+        result = np.zeros_like(numerator)
+        np.divide(numerator, denominator, out=result, where=denominator > 1e-6 * max(t_norm, 1.0))
+        return np.clip(result, -1.0, 1.0).astype(np.float32)
+
+class SqDiffBackend(MatchBackend):
+    """
+    Squared-difference matching with early exit, for exact-pixel UI elements.
+
+    A handful of high-contrast anchor pixels of the template are compared
+    at every position first; positions where an anchor differs by more than
+    the tolerance are dropped, which usually leaves no or very few
+    candidates after two or three anchors. Only the survivors are scored
+    with TM_SQDIFF_NORMED, reported as 1 - difference. Every other position
+    scores 0, so this backend only suits templates that appear pixel-exact.
+    """
+    name = 'sqdiff'
+    equivalent = False
+
+    def __init__(self, tolerance=12, anchors=8, max_candidates=64):
+        """
+        Initialize the backend.
+
+        Args:
+            tolerance: Largest per-channel difference an anchor pixel may have
+            anchors: Number of anchor pixels checked before full scoring
+            max_candidates: Candidates above which full scoring is used everywhere
+        """
+        self.tolerance = tolerance
+        self.anchors = anchors
+        self.max_candidates = max_candidates
+
+    def _anchor_points(self, template):
+        """Pick pixels that differ most from the template mean, spread over the template"""
+        gray = template if template.ndim == 2 else template.astype(np.int32).sum(axis=2)
+        contrast = np.abs(gray - gray.mean())
+        order = np.argsort(contrast, axis=None)[::-1]
+        h, w = gray.shape
+        points = []
+        for index in order:
+            y, x = divmod(int(index), w)
+            if all(abs(x - px) + abs(y - py) > 2 for py, px in points):
+                points.append((y, x))
+                if len(points) >= self.anchors:
+                    break
+        return points
+
+    def match(self, screen, template):
+        H, W = screen.shape[:2]
+        h, w = template.shape[:2]
+        rows, cols = H - h + 1, W - w + 1
+        candidates = None
+
+        for y, x in self._anchor_points(template):
+            # Bu çapa pikselinin her konumda karşılık geldiği ekran dilimi toleransta mı
+            pixel = np.atleast_1d(template[y, x]).astype(np.int32)
+            lower = np.clip(pixel - self.tolerance, 0, 255).astype(np.float64)
+            upper = np.clip(pixel + self.tolerance, 0, 255).astype(np.float64)
+            ok = cv2.inRange(screen[y:y + rows, x:x + cols], lower, upper)
+            candidates = ok if candidates is None else cv2.bitwise_and(candidates, ok)
+            if not cv2.countNonZero(candidates):
+                # Erken çıkış: hiçbir konum uymuyor
+                return np.zeros((rows, cols), dtype=np.float32)
+
+        ys, xs = np.nonzero(candidates)
+        if len(ys) > self.max_candidates:
+            return (1.0 - cv2.matchTemplate(screen, template, cv2.TM_SQDIFF_NORMED)).astype(np.float32)
+
+        result = np.zeros((rows, cols), dtype=np.float32)
+        for y, x in zip(ys, xs):
+            patch = screen[y:y + h, x:x + w]
+            result[y, x] = 1.0 - cv2.matchTemplate(patch, template, cv2.TM_SQDIFF_NORMED)[0, 0]
+        return result
+
+def create_backends(config=None):
+    """
+    Create one instance of every matching backend.
+
+    Args:
+        config: Optional bot configuration dictionary
+
+    Returns:
+        dict: {backend name: MatchBackend}
+    """
+    config = config or {}
+    return {
+        'opencv': OpenCVBackend(),
+        'fft': FFTBackend(),
+        'sqdiff': SqDiffBackend(tolerance=int(config.get('sqdiff_tolerance', 12)))
+    }
+
+def time_backend(backend, screen, template, repeat=3):
+    """
+    Measure the fastest of several runs of a backend.
+
+    Returns:
+        float: Seconds per match
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        backend.match(screen, template)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_backends(templates, screen_size=(1280, 720), backends=None, repeat=3):
+    """
+    Time every backend on every template against a synthetic screen.
+
+    Args:
+        templates: {name: template image (BGR)}
+        screen_size: (width, height) of the synthetic screen
+        backends: Optional {name: MatchBackend}, all backends by default
+        repeat: Runs per measurement (the fastest is kept)
+
+    Returns:
+        dict: {"screen": [w, h], "results": [...], "crossover": {...}} where each
+            result holds the template name, size and milliseconds per backend,
+            and crossover gives the smallest template area at which each
+            backend beat OpenCV
+    """
+    backends = backends or create_backends()
+    rng = np.random.default_rng(0)
+    screen = rng.integers(0, 256, (screen_size[1], screen_size[0], 3), dtype=np.uint8)
+
+    results = []
+    for name, template in sorted(templates.items(), key=lambda item: item[1].shape[0] * item[1].shape[1]):
+        h, w = template.shape[:2]
+        if h > screen_size[1] or w > screen_size[0]:
+            continue
+        # Şablonu ekrana yerleştir ki erken çıkış yolu da gerçek bir eşleşme bulsun
+        screen[:h, :w] = template[:, :, :3] if template.ndim == 3 else template[:, :, None]
+        timings = {backend_name: round(time_backend(backend, screen, template, repeat) * 1000, 3)
+                   for backend_name, backend in backends.items()}
+        results.append({'template': name, 'size': [w, h], 'area': w * h, 'ms': timings})
+
+    crossover = {}
+    for backend_name in backends:
+        if backend_name == 'opencv':
+            continue
+        faster = [r['area'] for r in results if r['ms'][backend_name] < r['ms']['opencv']]
+        crossover[backend_name] = min(faster) if faster else None
+
+    return {'screen': list(screen_size), 'results': results, 'crossover': crossover}
+
+def load_templates(ref_dir):
+    """Load every reference image of a directory as {name: BGR image}"""
+    templates = {}
+    for filename in sorted(os.listdir(ref_dir)):
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            image = cv2.imread(os.path.join(ref_dir, filename))
+            if image is not None:
+                templates[os.path.splitext(filename)[0]] = image
+    return templates
+
+if __name__ == "__main__":
+    # Kullanım: python match_backends.py [referans_dizini] [genişlikxyükseklik]
+    ref_dir = sys.argv[1] if len(sys.argv) > 1 else 'reference_images'
+    width, height = (int(v) for v in (sys.argv[2] if len(sys.argv) > 2 else '1280x720').split('x'))
+
+    report = benchmark_backends(load_templates(ref_dir), (width, height))
+    print(f"Screen {width}x{height}")
+    print(f"{'template':<28}{'size':>12}" + ''.join(f"{name:>10}" for name in create_backends()))
+    for r in report['results']:
+        size = f"{r['size'][0]}x{r['size'][1]}"
+        print(f"{r['template']:<28}{size:>12}" + ''.join(f"{ms:>10.2f}" for ms in r['ms'].values()))
+    for name, area in report['crossover'].items():
+        print(f"{name} faster than opencv from template area: {area if area is not None else 'never'}")
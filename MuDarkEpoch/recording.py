@@ -0,0 +1,407 @@
+"""
+Dark Epoch Bot - Frame Recording
+Records raw client frames and the bot's decisions to disk and plays them
+back as a capture backend, so perception runs can be reproduced without
+the game or a display.
+
+A recording is a directory with:
+    recording.json      Format version and settings
+    frames.jsonl        One line per frame: stream, time, origin, chunk, slot
+    decisions.jsonl     One line per decision: stream, time, frame, kind, details
+    <stream>_<n>.npy    Chunks of up to chunk_frames BGR frames of one stream,
+                        loadable with numpy.load(..., mmap_mode='r')
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import threading
+
+from capture import CaptureBackend, CaptureError
+
+# Koşullu olarak OpenCV ve numpy'ı içe aktar
+try:
+    import cv2
+    import numpy as np
+    HAS_CV_SUPPORT = True
+except ImportError:
+    HAS_CV_SUPPORT = False
+
+# Loglama yapılandırması
+logger = logging.getLogger('DarkEpochBot.Recording')
+
+FORMAT_VERSION = 1
+
+def _stream_name(stream):
+    """Turn a client id into a name usable in file names"""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', str(stream if stream is not None else 'screen'))
+
+def _to_bgr(image, color_format):
+    """Convert a captured image to BGR (alpha is not recorded)"""
+    if color_format == 'RGB':
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    if color_format == 'BGRA':
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image
+
+class FrameRecorder:
+    """
+    Writes frames and decisions of one or more client streams to a recording.
+
+    Frames are written straight into memory-mapped chunk files. A frame that
+    is identical to the previous frame of its stream is not stored again but
+    points at the earlier slot, which keeps recordings of idle screens small.
+    """
+    def __init__(self, path, chunk_frames=128, skip_duplicates=True):
+        """
+        Initialize the frame recorder.
+
+        Args:
+            path: Directory to write the recording to (created if missing)
+            chunk_frames: Frames per chunk file
+            skip_duplicates: Store repeated identical frames only once
+        """
+        self.path = path
+        self.chunk_frames = max(1, int(chunk_frames))
+        self.skip_duplicates = skip_duplicates
+        self.lock = threading.Lock()
+        self.frame_count = 0
+        self.stored_count = 0
+        self.decision_count = 0
+        self._streams = {}  # {akış: {'chunk', 'file', 'number', 'used', 'shape', 'last'}}
+        self._closed = False
+
+        os.makedirs(path, exist_ok=True)
+        self._write_metadata()
+        self._frames_file = open(os.path.join(path, 'frames.jsonl'), 'a', encoding='utf-8')
+        self._decisions_file = open(os.path.join(path, 'decisions.jsonl'), 'a', encoding='utf-8')
+        logger.info(f"Recording frames to {path}")
+
+    def _write_metadata(self):
+        metadata = {
+            'version': FORMAT_VERSION,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'chunk_frames': self.chunk_frames,
+            'frames': self.frame_count,
+            'stored_frames': self.stored_count,
+            'decisions': self.decision_count
+        }
+        with open(os.path.join(self.path, 'recording.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+
+    def _open_chunk(self, name, state, shape):
+        """Start a new chunk file for a stream"""
+        self._close_chunk(state)
+        state['number'] = state.get('number', -1) + 1
+        state['file'] = f"{name}_{state['number']:05d}.npy"
+        state['chunk'] = np.lib.format.open_memmap(
+            os.path.join(self.path, state['file']), mode='w+',
+            dtype=np.uint8, shape=(self.chunk_frames,) + shape
+        )
+        state['used'] = 0
+        state['shape'] = shape
+        state['last'] = None
+
+    def _close_chunk(self, state):
+        """Flush a chunk and cut unused slots off the end of the file"""
+        chunk = state.get('chunk')
+        if chunk is None:
+            return
+        used = state['used']
+        path = os.path.join(self.path, state['file'])
+        chunk.flush()
+
+        if used < len(chunk):
+            trimmed_path = path + '.tmp'
+            trimmed = np.lib.format.open_memmap(trimmed_path, mode='w+', dtype=np.uint8,
+                                                shape=(used,) + chunk.shape[1:])
+            trimmed[:] = chunk[:used]
+            trimmed.flush()
+            del trimmed
+            # Eşlenmiş dosya açıkken değiştirilemez (Windows)
+            state['chunk'] = chunk = None
+            os.replace(trimmed_path, path)
+
+        state['chunk'] = None
+
+    def record_frame(self, stream, image, color_format='BGR', origin=(0, 0), timestamp=None):
+        """
+        Append a frame to a stream.
+
+        Args:
+            stream: Stream the frame belongs to (client id, None for the screen)
+            image: Captured image
+            color_format: Channel order of the image ("BGR", "RGB" or "BGRA")
+            origin: (x, y) screen position of the frame's top-left corner
+            timestamp: Capture time (defaults to now)
+
+        Returns:
+            int: Frame number within the recording, or None on failure
+        """
+        if image is None:
+            return None
+
+        try:
+            bgr = _to_bgr(image, color_format)
+            name = _stream_name(stream)
+            with self.lock:
+                if self._closed:
+                    return None
+                state = self._streams.setdefault(name, {})
+
+                # Önceki kareyle aynıysa tekrar yazma, önceki yuvayı göster
+                last = state.get('last')
+                if (self.skip_duplicates and last is not None and state.get('chunk') is not None and
+                        state['shape'] == bgr.shape and np.array_equal(state['chunk'][last], bgr)):
+                    slot = last
+                else:
+                    if (state.get('chunk') is None or state['shape'] != bgr.shape or
+                            state['used'] >= self.chunk_frames):
+                        self._open_chunk(name, state, bgr.shape)
+                    slot = state['used']
+                    state['chunk'][slot] = bgr
+                    state['used'] += 1
+                    state['last'] = slot
+                    self.stored_count += 1
+
+                number = self.frame_count
+                self.frame_count += 1
+                entry = {
+                    'frame': number,
+                    'stream': name,
+                    'time': time.time() if timestamp is None else timestamp,
+                    'origin': [int(origin[0]), int(origin[1])],
+                    'size': [bgr.shape[1], bgr.shape[0]],
+                    'chunk': state['file'],
+                    'slot': slot
+                }
+                self._frames_file.write(json.dumps(entry) + '\n')
+                self._frames_file.flush()
+                return number
+        except Exception as e:
+            logger.error(f"Error recording frame: {str(e)}")
+            return None
+
+    def record_decision(self, stream, kind, frame=None, timestamp=None, **details):
+        """
+        Append a decision of the bot.
+
+        Args:
+            stream: Stream the decision belongs to
+            kind: Kind of decision, e.g. "screen_state", "click" or "key"
+            frame: Frame number the decision was based on
+            timestamp: Time of the decision (defaults to now)
+            **details: JSON serializable details of the decision
+        """
+        entry = {
+            'stream': _stream_name(stream),
+            'time': time.time() if timestamp is None else timestamp,
+            'frame': frame,
+            'kind': kind,
+            'details': details
+        }
+        try:
+            with self.lock:
+                if self._closed:
+                    return
+                self._decisions_file.write(json.dumps(entry, default=str) + '\n')
+                self._decisions_file.flush()
+                self.decision_count += 1
+        except Exception as e:
+            logger.error(f"Error recording decision: {str(e)}")
+
+    def close(self):
+        """Finish every chunk and close the recording"""
+        with self.lock:
+            if self._closed:
+                return
+            self._closed = True
+            for state in self._streams.values():
+                self._close_chunk(state)
+            self._frames_file.close()
+            self._decisions_file.close()
+            self._write_metadata()
+        logger.info(f"Recorded {self.frame_count} frames ({self.stored_count} stored) "
+                    f"and {self.decision_count} decisions to {self.path}")
+
+class Recording:
+    """Read access to a recording written by FrameRecorder"""
+    def __init__(self, path):
+        """
+        Open a recording.
+
+        Args:
+            path: Recording directory
+        """
+        self.path = path
+        metadata_path = os.path.join(path, 'recording.json')
+        if not os.path.exists(metadata_path):
+            raise CaptureError(f"No recording found at {path}")
+        with open(metadata_path, encoding='utf-8') as f:
+            self.metadata = json.load(f)
+        if self.metadata.get('version') != FORMAT_VERSION:
+            raise CaptureError(f"Unsupported recording version: {self.metadata.get('version')}")
+
+        self.frames = self._read_lines('frames.jsonl')
+        self.decisions = self._read_lines('decisions.jsonl')
+        self._chunks = {}
+
+    def _read_lines(self, filename):
+        path = os.path.join(self.path, filename)
+        if not os.path.exists(path):
+            return []
+        entries = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Yarım kalmış son satır (kayıt kesildiyse)
+                    logger.warning(f"Skipping damaged line in {path}")
+        return entries
+
+    @property
+    def streams(self):
+        """Stream names in order of their first frame"""
+        return list(dict.fromkeys(entry['stream'] for entry in self.frames))
+
+    def stream_frames(self, stream=None):
+        """Frame entries of one stream, or of all streams if None"""
+        if stream is None:
+            return list(self.frames)
+        name = _stream_name(stream)
+        return [entry for entry in self.frames if entry['stream'] == name]
+
+    def stream_decisions(self, stream=None):
+        """Decision entries of one stream, or of all streams if None"""
+        if stream is None:
+            return list(self.decisions)
+        name = _stream_name(stream)
+        return [entry for entry in self.decisions if entry['stream'] == name]
+
+    def load_frame(self, entry):
+        """
+        Get the image of a frame entry.
+
+        Returns:
+            numpy.ndarray: Read-only BGR view into the memory-mapped chunk
+        """
+        chunk = self._chunks.get(entry['chunk'])
+        if chunk is None:
+            chunk = np.load(os.path.join(self.path, entry['chunk']), mmap_mode='r')
+            self._chunks[entry['chunk']] = chunk
+        return chunk[entry['slot']]
+
+    def iter_frames(self, stream=None):
+        """Yield (entry, image) for the frames of a stream in recording order"""
+        for entry in self.stream_frames(stream):
+            yield entry, self.load_frame(entry)
+
+    def __len__(self):
+        return len(self.frames)
+
+class ReplayCapture(CaptureBackend):
+    """
+    Capture backend that plays a recording back instead of the screen.
+
+    Each stream is played back on its own: a grab of a region returns the
+    next frame of the stream recorded at that region (or containing it), a
+    grab of the full screen the next frame of the stream recorded without a
+    region, or of the only stream. Every grab advances its stream by one
+    frame, so the same bot code sees the same frames in the same order.
+    """
+    name = 'replay'
+    color_format = 'BGR'
+    shared_buffers = False
+
+    def __init__(self, path, loop=False):
+        """
+        Initialize the replay backend.
+
+        Args:
+            path: Recording directory
+            loop: Start over after the last frame of a stream instead of
+                repeating it
+        """
+        super().__init__()
+        self.recording = Recording(path)
+        self.loop = loop
+        self.streams = {}  # {akış: kare girdileri}
+        for entry in self.recording.frames:
+            self.streams.setdefault(entry['stream'], []).append(entry)
+        if not self.streams:
+            raise CaptureError(f"Recording at {path} has no frames")
+        self.positions = {name: 0 for name in self.streams}
+
+    @staticmethod
+    def _entry_region(entry):
+        return (entry['origin'][0], entry['origin'][1], entry['size'][0], entry['size'][1])
+
+    def screen_size(self):
+        width = max(e['origin'][0] + e['size'][0] for frames in self.streams.values() for e in frames)
+        height = max(e['origin'][1] + e['size'][1] for frames in self.streams.values() for e in frames)
+        return (width, height)
+
+    def _stream_for(self, region):
+        """Find the stream recorded at, or around, a region"""
+        if region is None:
+            if 'screen' in self.streams:
+                return 'screen'
+            if len(self.streams) == 1:
+                return next(iter(self.streams))
+            raise CaptureError("Full screen replay needs a recorded screen stream")
+
+        left, top, width, height = region
+        fallback = None
+        for name, frames in self.streams.items():
+            position = min(self.positions[name], len(frames) - 1)
+            x, y, w, h = self._entry_region(frames[position])
+            if (x, y, w, h) == (left, top, width, height):
+                return name
+            if fallback is None and x <= left and y <= top and left + width <= x + w and top + height <= y + h:
+                fallback = name
+        if fallback is None:
+            raise CaptureError(f"No recorded stream covers region {region}")
+        return fallback
+
+    def grab(self, region=None, out=None):
+        region = tuple(int(v) for v in region) if region is not None else None
+        with self.lock:
+            name = self._stream_for(region)
+            frames = self.streams[name]
+            entry = frames[self.positions[name]]
+            if self.positions[name] + 1 < len(frames):
+                self.positions[name] += 1
+            elif self.loop:
+                self.positions[name] = 0
+
+        frame = self.recording.load_frame(entry)
+        if region is not None:
+            # Kayıtlı kareye göre kırp
+            x, y = region[0] - entry['origin'][0], region[1] - entry['origin'][1]
+            frame = frame[y:y + region[3], x:x + region[2]]
+
+        if out is not None:
+            np.copyto(out, frame)
+            return out
+        return frame
+
+if __name__ == "__main__":
+    # Kullanım: python recording.py <kayıt_dizini>
+    recording = Recording(sys.argv[1] if len(sys.argv) > 1 else 'recordings')
+    print(f"{len(recording)} frames, {len(recording.decisions)} decisions")
+    for stream in recording.streams:
+        frames = recording.stream_frames(stream)
+        duration = frames[-1]['time'] - frames[0]['time']
+        stored = len({(e['chunk'], e['slot']) for e in frames})
+        print(f"{stream}: {len(frames)} frames ({stored} stored) over {duration:.1f}s, "
+              f"{frames[-1]['size'][0]}x{frames[-1]['size'][1]}, "
+              f"{len(recording.stream_decisions(stream))} decisions")
@@ -0,0 +1,223 @@
+"""
+Dark Epoch Bot - Task Scheduler
+Runs step-based client tasks. Task handlers are generators that yield Wait
+effects instead of sleeping, so one thread can drive another client while
+a client waits for an animation, a loading screen or travel.
+"""
+
+import time
+import heapq
+import random
+import itertools
+import logging
+import threading
+
+# Loglama yapılandırması
+logger = logging.getLogger('DarkEpochBot.Scheduler')
+
+class Wait:
+    """
+    Effect yielded by a step generator to pause it.
+
+    Like safe_wait, the duration is picked at random within the range.
+    """
+    __slots__ = ('duration',)
+
+    def __init__(self, min_seconds, max_seconds=None):
+        """
+        Initialize the wait.
+
+        Args:
+            min_seconds: Minimum seconds to wait
+            max_seconds: Maximum seconds to wait (if None, use min_seconds)
+        """
+        if max_seconds is None:
+            max_seconds = min_seconds
+        self.duration = min_seconds + (random.random() * (max_seconds - min_seconds))
+
+    def __repr__(self):
+        return f"Wait({self.duration:.2f})"
+
+class WaitControl:
+    """
+    Stop and pause state shared by all waits of a bot.
+
+    sleep blocks like time.sleep, but returns as soon as stop is called and
+    holds on while paused, so stop and pause take effect within the wait
+    instead of after it.
+    """
+    def __init__(self):
+        """Initialize the control in the running state"""
+        self._condition = threading.Condition()
+        self.stopped = False
+        self.paused = False
+
+    def _set(self, stopped, paused):
+        with self._condition:
+            self.stopped = stopped
+            self.paused = paused
+            self._condition.notify_all()
+
+    def reset(self):
+        """Return to the running state (before a new start)"""
+        self._set(False, False)
+
+    def stop(self):
+        """Interrupt every current and future wait"""
+        self._set(True, False)
+
+    def pause(self):
+        """Hold every wait until resume or stop"""
+        self._set(self.stopped, True)
+
+    def resume(self):
+        """Release the waits held by pause"""
+        self._set(self.stopped, False)
+
+    def sleep(self, seconds):
+        """
+        Sleep unless stopped first; while paused, keep waiting past the time.
+
+        Args:
+            seconds: Seconds to sleep
+
+        Returns:
+            bool: True if the time passed, False if stopped
+        """
+        deadline = time.monotonic() + seconds
+        with self._condition:
+            while not self.stopped:
+                if self.paused:
+                    self._condition.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._condition.wait(remaining)
+            return False
+
+def run_blocking(steps, sleep=time.sleep):
+    """
+    Run a step generator to completion on the calling thread.
+
+    Every Wait is slept through, which gives the behaviour of a plain
+    function calling safe_wait. If sleep returns False (see
+    WaitControl.sleep), the generator is closed at that wait.
+
+    Args:
+        steps: Generator yielding Wait effects
+        sleep: Function used to sleep a number of seconds
+
+    Returns:
+        The return value of the generator, None if it was stopped
+    """
+    try:
+        effect = next(steps)
+        while True:
+            if isinstance(effect, Wait) and sleep(effect.duration) is False:
+                steps.close()
+                return None
+            effect = next(steps)
+    except StopIteration as stop:
+        return stop.value
+
+def wait_until(predicate, timeout, poll_interval=0.25, min_wait=0.0):
+    """
+    Step generator waiting until a condition holds, at most timeout seconds.
+
+    The predicate is checked first after min_wait seconds (a screen rarely
+    changes the instant an input is sent) and then every poll_interval
+    seconds, yielding Wait effects in between so the waiting client does
+    not block the others.
+
+    Args:
+        predicate: Function returning a truthy value once the condition holds
+        timeout: Maximum seconds to wait
+        poll_interval: Seconds between two checks
+        min_wait: Seconds to wait before the first check
+
+    Returns:
+        The first truthy value of the predicate, or None on timeout
+    """
+    deadline = time.monotonic() + timeout
+    if min_wait > 0:
+        yield Wait(min(min_wait, timeout))
+
+    while True:
+        result = predicate()
+        if result:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        yield Wait(min(poll_interval, remaining))
+
+class TaskScheduler:
+    """
+    Cooperative scheduler interleaving step generators on one thread.
+
+    The task that is due the earliest runs until it yields its next Wait;
+    it is then put back with its wake-up time and the next due task runs.
+    Yielding None hands over to other due tasks without waiting. If sleep
+    returns False (see WaitControl.sleep), the remaining tasks are closed.
+    """
+    def __init__(self, sleep=time.sleep):
+        """
+        Initialize the scheduler.
+
+        Args:
+            sleep: Function used to sleep until the next task is due
+        """
+        self.sleep = sleep
+        self._queue = []  # [(uyanma zamanı, sıra, ad, üreteç)]
+        self._order = itertools.count()
+        self.results = {}
+        self.waited = 0.0  # Görevlerin toplam bekleme süresi
+        self.steps = 0
+
+    def add(self, name, steps):
+        """
+        Add a task that starts right away.
+
+        Args:
+            name: Task name, the key of its result
+            steps: Generator yielding Wait effects
+        """
+        heapq.heappush(self._queue, (time.monotonic(), next(self._order), name, steps))
+
+    def run(self):
+        """
+        Run every task to completion.
+
+        A task raising an exception is logged and dropped; its result is None.
+
+        Returns:
+            dict: {task name: return value of the task}
+        """
+        while self._queue:
+            wake_time, _, name, steps = heapq.heappop(self._queue)
+            delay = wake_time - time.monotonic()
+            if delay > 0 and self.sleep(delay) is False:
+                # Durduruldu: bekleyen görevleri kapat
+                steps.close()
+                for _, _, _, waiting in self._queue:
+                    waiting.close()
+                self._queue = []
+                break
+
+            try:
+                effect = next(steps)
+            except StopIteration as stop:
+                self.results[name] = stop.value
+                continue
+            except Exception as e:
+                logger.error(f"Task {name} failed: {str(e)}")
+                self.results[name] = None
+                continue
+
+            self.steps += 1
+            duration = effect.duration if isinstance(effect, Wait) else 0.0
+            self.waited += duration
+            heapq.heappush(self._queue, (time.monotonic() + duration, next(self._order), name, steps))
+
+        return self.results
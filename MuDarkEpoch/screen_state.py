@@ -0,0 +1,147 @@
+"""
+Dark Epoch Bot - Screen State Cache
+Remembers which screen state (login, main menu, in-game) a screen looked
+like, using small perceptual fingerprints of whole client frames.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+# Koşullu olarak OpenCV ve numpy'ı içe aktar
+try:
+    import cv2
+    import numpy as np
+    HAS_CV_SUPPORT = True
+except ImportError:
+    HAS_CV_SUPPORT = False
+
+# Loglama yapılandırması
+logger = logging.getLogger('DarkEpochBot.ScreenState')
+
+# Parmak izi boyutu: 16x16 = 256 bit
+HASH_SIZE = 16
+
+def difference_hash(image, hash_size=HASH_SIZE):
+    """
+    Compute the difference hash (dHash) of an image.
+
+    The image is shrunk to (hash_size + 1) x hash_size gray pixels and each
+    bit records whether a pixel is brighter than its right neighbour, so the
+    hash survives small changes like animated sprites or a moving cursor.
+
+    Args:
+        image: Image in BGR, BGRA, RGB or gray format
+        hash_size: Edge length of the bit grid
+
+    Returns:
+        int: Hash with hash_size * hash_size bits
+    """
+    # Büyük kareleri önce seyrek örnekle, alan ortalaması küçük resimde yeterli
+    step = max(1, min(image.shape[0], image.shape[1]) // (hash_size * 8))
+    small = image[::step, ::step]
+    if small.ndim == 3:
+        code = cv2.COLOR_BGRA2GRAY if small.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        small = cv2.cvtColor(np.ascontiguousarray(small), code)
+
+    small = cv2.resize(small, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+class ScreenStateCache:
+    """
+    Learned table of frame fingerprints and the screen state they showed.
+
+    Entries are added after the template detectors classified a frame and
+    looked up by Hamming distance, so later frames of the same screen are
+    classified without any template matching. The least recently used
+    entries are dropped when the table is full.
+    """
+    def __init__(self, max_distance=8, max_entries=256):
+        """
+        Initialize the screen state cache.
+
+        Args:
+            max_distance: Largest Hamming distance still treated as the same screen
+            max_entries: Maximum number of remembered fingerprints
+        """
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # {(geometry, hash): state}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, geometry, fingerprint):
+        """
+        Find the state of the closest remembered fingerprint.
+
+        Args:
+            geometry: (width, height) of the frame
+            fingerprint: Frame hash
+
+        Returns:
+            str: Screen state, or None if no fingerprint is close enough
+        """
+        with self.lock:
+            state = self.entries.get((geometry, fingerprint))
+            best_key = (geometry, fingerprint) if state is not None else None
+
+            if best_key is None:
+                best_distance = self.max_distance + 1
+                for key, entry_state in self.entries.items():
+                    if key[0] != geometry:
+                        continue
+                    distance = hamming_distance(key[1], fingerprint)
+                    if distance < best_distance:
+                        best_key, best_distance, state = key, distance, entry_state
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(best_key)
+            self.hits += 1
+            return state
+
+    def learn(self, geometry, fingerprint, state):
+        """
+        Remember the state of a fingerprint.
+
+        Args:
+            geometry: (width, height) of the frame
+            fingerprint: Frame hash
+            state: Screen state detected by the template detectors
+        """
+        with self.lock:
+            self.entries[(geometry, fingerprint)] = state
+            self.entries.move_to_end((geometry, fingerprint))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def forget(self, geometry, fingerprint):
+        """Drop every remembered fingerprint close to the given one"""
+        with self.lock:
+            for key in [key for key in self.entries
+                        if key[0] == geometry and hamming_distance(key[1], fingerprint) <= self.max_distance]:
+                del self.entries[key]
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Entry count, hit/miss counters and hit rate
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,587 @@
+"""
+Dark Epoch Bot - Compiled Template Store
+Keeps decoded and pre-converted reference images in a single
+memory-mappable file so they do not have to be decoded on every start.
+"""
+
+import os
+import json
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Koşullu olarak OpenCV ve numpy'ı içe aktar
+try:
+    import cv2
+    import numpy as np
+    HAS_CV_SUPPORT = True
+except ImportError:
+    HAS_CV_SUPPORT = False
+
+# Loglama yapılandırması
+logger = logging.getLogger('DarkEpochBot.TemplateStore')
+
+STORE_MAGIC = b'DETS'
+STORE_VERSION = 1
+STORE_ALIGNMENT = 64
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Bu kadar eski geçici dosyalar yarım kalmış yazmalardan kalmıştır
+STALE_TEMP_SECONDS = 300
+
+# Dosya başlığı: magic, sürüm, JSON başlık uzunluğu
+_PREFIX = struct.Struct('<4sIQ')
+
+def _align(offset):
+    """Round an offset up to the store alignment"""
+    return (offset + STORE_ALIGNMENT - 1) // STORE_ALIGNMENT * STORE_ALIGNMENT
+
+def _variant_key(mode, levels):
+    return f"{mode}/{levels}"
+
+def file_digest(path):
+    """
+    Compute the content hash of a file.
+
+    Args:
+        path: File path
+
+    Returns:
+        str: SHA-1 hex digest of the file content
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TemplateStore:
+    """
+    Single-file store of decoded template variants.
+
+    File layout: a small binary prefix, a JSON header describing every
+    entry, then the raw pixel data of each variant aligned to 64 bytes.
+    The data section is opened with numpy.memmap, so variants are served
+    as read-only views without decoding or copying, and the pages can be
+    shared between bot processes using the same store.
+    """
+    def __init__(self, path):
+        """
+        Initialize the template store.
+
+        Args:
+            path: Path of the store file
+        """
+        self.path = path
+        self.entries = {}  # {name: header entry}
+        self._data = None
+        self._data_offset = 0
+        self._fallback_path = None  # Yerine konamayan, doğrudan açılan geçici dosya
+
+    def open(self, path=None):
+        """
+        Open an existing store file.
+
+        Args:
+            path: Optional file to open instead of the store path
+
+        Returns:
+            bool: True if the store was opened successfully
+        """
+        self.close()
+        path = path or self.path
+
+        if not os.path.exists(path):
+            return False
+
+        try:
+            with open(path, 'rb') as f:
+                magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+                if magic != STORE_MAGIC or version != STORE_VERSION:
+                    logger.warning(f"Ignoring template store with unknown format: {path}")
+                    return False
+                header = json.loads(f.read(header_len).decode('utf-8'))
+
+            self._data_offset = _align(_PREFIX.size + header_len)
+            if os.path.getsize(path) > self._data_offset:
+                self._data = np.memmap(path, dtype=np.uint8, mode='r', offset=self._data_offset)
+            self.entries = header.get('entries', {})
+            return True
+        except Exception as e:
+            logger.error(f"Error opening template store {path}: {str(e)}")
+            self.close()
+            return False
+
+    def close(self):
+        """Release the memory map and delete a temporary store opened as a fallback"""
+        self.entries = {}
+        self._data = None
+
+        if self._fallback_path is not None:
+            try:
+                os.remove(self._fallback_path)
+            except OSError as e:
+                # Windows'ta hâlâ eşlenmiş olabilir; bir sonraki sync temizler
+                logger.debug(f"Could not remove temporary template store {self._fallback_path}: {str(e)}")
+            self._fallback_path = None
+
+    def _sweep_temps(self):
+        """Delete temporary store files left behind by interrupted or fallback syncs"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(self.path) + '.'
+        now = time.time()
+
+        try:
+            filenames = os.listdir(directory)
+        except OSError:
+            return
+
+        for filename in filenames:
+            if not (filename.startswith(prefix) and filename.endswith('.tmp')):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                # Başka bir sürecin şu an yazmakta olduğu dosyaya dokunma
+                if now - os.path.getmtime(path) >= STALE_TEMP_SECONDS:
+                    os.remove(path)
+                    logger.debug(f"Removed stale temporary template store {path}")
+            except OSError:
+                pass
+
+    def get(self, name, mode='color', levels=0):
+        """
+        Get a stored template variant.
+
+        Args:
+            name: Template name
+            mode: Color mode of the variant
+            levels: Pyramid level of the variant
+
+        Returns:
+            numpy.ndarray: Read-only view of the variant, or None if not stored
+        """
+        entry = self.entries.get(name)
+        if entry is None or self._data is None:
+            return None
+
+        info = entry['variants'].get(_variant_key(mode, levels))
+        if info is None:
+            return None
+
+        count = int(np.prod(info['shape']))
+        start = info['offset']
+        return self._data[start:start + count].reshape(info['shape'])
+
+    def variants(self, name):
+        """
+        Get every stored variant of a template.
+
+        Returns:
+            dict: {(mode, levels): numpy.ndarray}
+        """
+        entry = self.entries.get(name, {})
+        result = {}
+        for key in entry.get('variants', {}):
+            mode, levels = key.rsplit('/', 1)
+            result[(mode, int(levels))] = self.get(name, mode, int(levels))
+        return result
+
+    def sync(self, ref_dir, variant_spec, build_variant):
+        """
+        Bring the store up to date with a reference image directory.
+
+        Only entries whose source file changed (by content hash) are decoded
+        again; unchanged entries are copied from the existing store. Missing
+        variants of unchanged entries are derived from their stored color
+        image, so changing matching settings does not force a decode either.
+
+        Args:
+            ref_dir: Directory containing the reference images
+            variant_spec: Function (name, color_image) -> iterable of (mode, levels)
+            build_variant: Function (color_image, mode, levels) -> numpy.ndarray
+
+        Returns:
+            dict: {name: {(mode, levels): numpy.ndarray}} for every template
+        """
+        self.open()
+        self._sweep_temps()
+        old_entries = dict(self.entries)
+
+        new_entries = {}
+        images = {}
+        decoded = 0
+
+        for filename in sorted(os.listdir(ref_dir)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+
+            path = os.path.join(ref_dir, filename)
+            name = os.path.splitext(filename)[0]
+
+            try:
+                stat = os.stat(path)
+                old = old_entries.get(name)
+
+                # Boyut ve zaman değişmediyse özeti yeniden hesaplama
+                if old and old.get('file') == filename and old.get('size') == stat.st_size \
+                        and old.get('mtime_ns') == stat.st_mtime_ns:
+                    digest = old['sha1']
+                else:
+                    digest = file_digest(path)
+
+                variants = {}
+                if old and old.get('sha1') == digest:
+                    variants = self.variants(name)
+                    color = variants.get(('color', 0))
+                else:
+                    color = None
+
+                if color is None:
+                    color = cv2.imread(path)
+                    if color is None:
+                        logger.warning(f"Failed to load reference image: {filename}")
+                        continue
+                    variants = {('color', 0): color}
+                    decoded += 1
+
+                # Eksik varyantları renkli görüntüden türet
+                for mode, levels in variant_spec(name, color):
+                    if (mode, levels) not in variants:
+                        variants[(mode, levels)] = build_variant(color, mode, levels)
+
+                images[name] = variants
+                new_entries[name] = {
+                    'file': filename,
+                    'sha1': digest,
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns
+                }
+            except Exception as e:
+                logger.error(f"Error loading reference image {filename}: {str(e)}")
+
+        unchanged = decoded == 0 and set(new_entries) == set(old_entries) and all(
+            all(old_entries[name].get(k) == v for k, v in new_entries[name].items())
+            and set(images[name]) == set(self.variants(name))
+            for name in images)
+        if unchanged:
+            logger.info(f"Template store up to date ({len(images)} templates)")
+            return images
+
+        # Değişiklik varsa yeni dosyayı yaz
+        tmp_path = self._write_temp(new_entries, images)
+        if tmp_path is None:
+            return images
+
+        # Eski eşlemeye ait tüm görünümleri bırak, aksi halde Windows
+        # eşlenmiş dosyanın değiştirilmesine izin vermez
+        images = variants = color = None
+        self.close()
+
+        try:
+            os.replace(tmp_path, self.path)
+            self.open()
+        except OSError as e:
+            # Başka bir süreç eski dosyayı kullanıyor olabilir; bu sefer geçici dosyayı kullan
+            logger.warning(f"Could not replace template store {self.path}: {str(e)}")
+            if self.open(tmp_path):
+                self._fallback_path = tmp_path
+            else:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        logger.info(f"Template store rebuilt: {len(self.entries)} templates, {decoded} decoded")
+        return {name: self.variants(name) for name in self.entries}
+
+    def _write_temp(self, entries, images):
+        """
+        Write a complete store next to the store file.
+
+        Args:
+            entries: {name: entry metadata (file, sha1, size, mtime_ns)}
+            images: {name: {(mode, levels): numpy.ndarray}}
+
+        Returns:
+            str: Path of the written temporary file, or None on failure
+        """
+        header_entries = {}
+        blobs = []
+        offset = 0
+
+        for name, entry in entries.items():
+            variants = {}
+            for (mode, levels), image in images[name].items():
+                image = np.ascontiguousarray(image, dtype=np.uint8)
+                variants[_variant_key(mode, levels)] = {
+                    'offset': offset,
+                    'shape': list(image.shape)
+                }
+                blobs.append((offset, image))
+                offset = _align(offset + image.nbytes)
+            header_entries[name] = dict(entry, variants=variants)
+
+        header = json.dumps({'entries': header_entries}).encode('utf-8')
+        data_offset = _align(_PREFIX.size + len(header))
+        tmp_path = None
+
+        try:
+            # Benzersiz ad: aynı anda başlayan iki süreç aynı geçici dosyaya yazmasın
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                            prefix=os.path.basename(self.path) + '.', suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_PREFIX.pack(STORE_MAGIC, STORE_VERSION, len(header)))
+                f.write(header)
+                for blob_offset, image in blobs:
+                    f.seek(data_offset + blob_offset)
+                    f.write(image.tobytes())
+                f.truncate(data_offset + offset)
+            return tmp_path
+        except Exception as e:
+            logger.error(f"Error writing template store {self.path}: {str(e)}")
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            return None
+
+class TemplateCache:
+    """
+    In-memory cache of template variants with an optional byte budget.
+
+    Each entry holds every variant of one template as
+    {(mode, levels): numpy.ndarray}. With a budget set, the least recently
+    used templates are evicted once the total size exceeds it.
+    """
+    def __init__(self, max_bytes=None):
+        """
+        Initialize the template cache.
+
+        Args:
+            max_bytes: Maximum total size of cached variants (None for unbounded)
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, name):
+        """
+        Get the variants of a template and mark it recently used.
+
+        Returns:
+            dict: {(mode, levels): numpy.ndarray} or None on a miss
+        """
+        with self.lock:
+            variants = self.entries.get(name)
+            if variants is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(name)
+            self.hits += 1
+            return variants
+
+    def put(self, name, variants):
+        """
+        Add or replace a template.
+
+        Args:
+            name: Template name
+            variants: {(mode, levels): numpy.ndarray}
+        """
+        with self.lock:
+            self.discard(name)
+            self.entries[name] = dict(variants)
+            self.nbytes += sum(image.nbytes for image in variants.values())
+            self._evict(keep=name)
+
+    def add_variant(self, name, key, image, variants):
+        """
+        Add a derived variant to the variants of a template.
+
+        The variant is always stored in the given dict, but only counted
+        against the budget if that dict is still the cached entry, so a
+        variant derived from a template that was replaced in the meantime
+        never ends up in the new entry.
+
+        Args:
+            name: Template name
+            key: (mode, levels) of the variant
+            image: Variant image
+            variants: Variants dict the image was derived from
+        """
+        with self.lock:
+            if key in variants:
+                return
+            variants[key] = image
+            if self.entries.get(name) is variants:
+                self.nbytes += image.nbytes
+                self._evict(keep=name)
+
+    def discard(self, name):
+        """Remove a template from the cache"""
+        with self.lock:
+            variants = self.entries.pop(name, None)
+            if variants is not None:
+                self.nbytes -= sum(image.nbytes for image in variants.values())
+
+    def _evict(self, keep=None):
+        """Evict least recently used templates until the budget is met"""
+        if self.max_bytes is None:
+            return
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            name = next(iter(self.entries))
+            if name == keep:
+                self.entries.move_to_end(name)
+                name = next(iter(self.entries))
+            self.discard(name)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Entry count, size, budget, hit/miss/eviction counters and hit rate
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'templates': len(self.entries),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+class ReferenceWatcher:
+    """
+    Background poller for a reference image directory.
+
+    Compares the size and modification time of every image file on each
+    poll and reports added/changed and removed templates to a callback.
+    Polling is used instead of OS notifications so it behaves the same on
+    Windows and Linux without extra dependencies.
+    """
+    def __init__(self, ref_dir, on_change, interval=2.0):
+        """
+        Initialize the watcher.
+
+        Args:
+            ref_dir: Directory containing the reference images
+            on_change: Function (changed, removed) -> set of names that failed to
+                load; changed is {name: path}, removed is a set of names
+            interval: Poll interval in seconds
+        """
+        self.ref_dir = ref_dir
+        self.on_change = on_change
+        self.interval = interval
+        self._snapshot = {}  # {name: (dosya yolu, boyut, zaman)}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        """Get the current state of the directory as {name: (path, size, mtime_ns)}"""
+        snapshot = {}
+        try:
+            filenames = sorted(os.listdir(self.ref_dir))
+        except OSError:
+            return snapshot
+
+        for filename in filenames:
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(self.ref_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[os.path.splitext(filename)[0]] = (path, stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def start(self):
+        """Take the initial snapshot and start polling"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._snapshot = self._scan()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='ReferenceWatcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Watching reference images in {self.ref_dir}")
+
+    def stop(self):
+        """Stop polling"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def note(self, name, path):
+        """
+        Record a file the owner has already loaded, so it is not reported again.
+
+        Args:
+            name: Template name
+            path: File path of the template
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._snapshot[name] = (path, stat.st_size, stat.st_mtime_ns)
+
+    def poll(self):
+        """
+        Check the directory once and report changes.
+
+        Returns:
+            bool: True if any change was reported
+        """
+        current = self._scan()
+
+        with self._lock:
+            previous = self._snapshot
+            changed = {name: state[0] for name, state in current.items() if previous.get(name) != state}
+            removed = set(previous) - set(current)
+
+        if not changed and not removed:
+            return False
+
+        failed = set(self.on_change(changed, removed) or ())
+
+        # Yüklenemeyenler (örn. hâlâ yazılan dosyalar) bir sonraki turda tekrar denenir
+        with self._lock:
+            for name in failed:
+                if name in previous:
+                    current[name] = previous[name]
+                else:
+                    current.pop(name, None)
+            self._snapshot = current
+        return True
+
+    def _run(self):
+        """Polling loop"""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error watching reference images: {str(e)}")
@@ -0,0 +1,200 @@
+"""
+Dark Epoch Bot - Target Tracking
+Keeps detected enemies and resource nodes alive across frames so they can
+be re-localized with small local searches and keep stable IDs.
+"""
+
+import itertools
+import logging
+
+from utils import calculate_distance
+
+# Loglama yapılandırması
+logger = logging.getLogger('DarkEpochBot.Tracking')
+
+# Tüm izleyicilerde benzersiz hedef kimlikleri
+_track_ids = itertools.count(1)
+
+class Track:
+    """A single target followed across frames"""
+    def __init__(self, template_name, center, size, score, timestamp):
+        """
+        Initialize a track.
+
+        Args:
+            template_name: Template the target was detected with
+            center: (x, y) frame-relative center of the target
+            size: (width, height) of the template
+            score: Match confidence
+            timestamp: Time of the detection
+        """
+        self.id = next(_track_ids)
+        self.template_name = template_name
+        self.center = center
+        self.size = size
+        self.score = score
+        self.velocity = (0.0, 0.0)  # Piksel / saniye
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.misses = 0
+
+    def predict(self, timestamp):
+        """
+        Predict the center of the target at a given time.
+
+        Returns:
+            tuple: Predicted (x, y) frame-relative center
+        """
+        dt = max(0.0, timestamp - self.last_seen)
+        return (int(round(self.center[0] + self.velocity[0] * dt)),
+                int(round(self.center[1] + self.velocity[1] * dt)))
+
+    def update(self, center, score, timestamp, smoothing=0.5):
+        """
+        Update the track with a new observation.
+
+        Args:
+            center: Observed (x, y) frame-relative center
+            score: Match confidence
+            timestamp: Time of the observation
+            smoothing: Weight of the new velocity estimate (0-1)
+        """
+        dt = timestamp - self.last_seen
+        if dt > 0:
+            vx = (center[0] - self.center[0]) / dt
+            vy = (center[1] - self.center[1]) / dt
+            self.velocity = (self.velocity[0] + smoothing * (vx - self.velocity[0]),
+                             self.velocity[1] + smoothing * (vy - self.velocity[1]))
+        self.center = center
+        self.score = score
+        self.last_seen = timestamp
+        self.misses = 0
+
+class TargetTracker:
+    """
+    Tracks the targets of one template group on one client's screen.
+
+    Every frame, live tracks are re-localized in a small window around their
+    predicted position. A full-frame search runs every full_search_interval
+    frames and whenever a track could not be re-localized; its detections
+    are associated with the existing tracks by distance, so a target keeps
+    its ID for as long as it stays on screen.
+    """
+    def __init__(self, search_radius=48, max_distance=64, max_misses=2, full_search_interval=10):
+        """
+        Initialize the target tracker.
+
+        Args:
+            search_radius: Extra pixels searched around the predicted position
+            max_distance: Largest distance between a detection and a track to associate them
+            max_misses: Consecutive misses after which a track is dropped
+            full_search_interval: Frames between two periodic full searches
+        """
+        self.search_radius = search_radius
+        self.max_distance = max_distance
+        self.max_misses = max_misses
+        self.full_search_interval = full_search_interval
+        self.tracks = []
+        self.frames_since_full = None  # Henüz tam arama yapılmadı
+
+    def needs_full_search(self):
+        """True if the next frame should be searched completely"""
+        return (self.frames_since_full is None or not self.tracks or
+                self.frames_since_full >= self.full_search_interval)
+
+    def local_window(self, track, timestamp, frame_size):
+        """
+        Get the window a track is re-localized in.
+
+        Args:
+            track: Track to search for
+            timestamp: Time of the frame
+            frame_size: (width, height) of the frame
+
+        Returns:
+            tuple: (left, top, right, bottom) window, or None if the
+                predicted position left the frame
+        """
+        cx, cy = track.predict(timestamp)
+        w, h = track.size
+        r = self.search_radius
+        left = max(0, cx - w // 2 - r)
+        top = max(0, cy - h // 2 - r)
+        right = min(frame_size[0], cx - w // 2 + w + r)
+        bottom = min(frame_size[1], cy - h // 2 + h + r)
+
+        if right - left < w or bottom - top < h:
+            return None
+        return (left, top, right, bottom)
+
+    def apply_local(self, observations, timestamp):
+        """
+        Update the tracks with the results of the local searches.
+
+        Nothing is updated if a track was not found; the caller is expected
+        to run a full search instead, which accounts for the misses.
+
+        Args:
+            observations: {track_id: (center, score)} of the tracks found again
+            timestamp: Time of the frame
+
+        Returns:
+            bool: True if every track was found again
+        """
+        if any(track.id not in observations for track in self.tracks):
+            return False
+
+        for track in self.tracks:
+            center, score = observations[track.id]
+            track.update(center, score, timestamp)
+
+        self.frames_since_full += 1
+        return True
+
+    def apply_full(self, detections, timestamp):
+        """
+        Associate the detections of a full search with the tracks.
+
+        Closest track/detection pairs of the same template are matched first;
+        unmatched detections start new tracks and unmatched tracks count a miss.
+
+        Args:
+            detections: List of (template_name, center, size, score)
+            timestamp: Time of the frame
+        """
+        pairs = []
+        for t_index, track in enumerate(self.tracks):
+            predicted = track.predict(timestamp)
+            for d_index, (name, center, size, score) in enumerate(detections):
+                if name != track.template_name:
+                    continue
+                distance = calculate_distance(predicted, center)
+                if distance <= self.max_distance:
+                    pairs.append((distance, t_index, d_index))
+
+        matched_tracks, matched_detections = set(), set()
+        for distance, t_index, d_index in sorted(pairs):
+            if t_index in matched_tracks or d_index in matched_detections:
+                continue
+            name, center, size, score = detections[d_index]
+            self.tracks[t_index].update(center, score, timestamp)
+            matched_tracks.add(t_index)
+            matched_detections.add(d_index)
+
+        for t_index, track in enumerate(self.tracks):
+            if t_index not in matched_tracks:
+                track.misses += 1
+
+        for d_index, (name, center, size, score) in enumerate(detections):
+            if d_index not in matched_detections:
+                self.tracks.append(Track(name, center, size, score, timestamp))
+
+        self.frames_since_full = 0
+        self.prune()
+
+    def prune(self):
+        """Drop tracks that were missed too many times in a row"""
+        lost = [track for track in self.tracks if track.misses > self.max_misses]
+        if lost:
+            logger.debug(f"Dropping {len(lost)} lost tracks: {[track.id for track in lost]}")
+            self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
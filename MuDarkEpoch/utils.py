@@ -12,16 +12,17 @@ import platform
 from datetime import datetime
 
 # Koşullu olarak grafik kütüphanelerini içe aktar
+# (ekransız Linux'ta pyautogui KeyError('DISPLAY') fırlatabilir)
 try:
     import pyautogui
     HAS_GUI_SUPPORT = True
-except ImportError:
+except Exception:
     HAS_GUI_SUPPORT = False
 
 # Loglama yapılandırması
 logger = logging.getLogger('DarkEpochBot.Utils')
 
-def safe_wait(min_seconds, max_seconds=None):
+def safe_wait(min_seconds, max_seconds=None, control=None):
     """
     Wait for a random amount of time within the given range.
     Helps avoid detection by adding human-like randomness.
@@ -29,12 +30,16 @@ def safe_wait(min_seconds, max_seconds=None):
     Args:
         min_seconds: Minimum seconds to wait
         max_seconds: Maximum seconds to wait (if None, use min_seconds)
+        control: Optional WaitControl that can interrupt or hold the wait
     """
     if max_seconds is None:
         max_seconds = min_seconds
         
     wait_time = min_seconds + (random.random() * (max_seconds - min_seconds))
-    time.sleep(wait_time)
+    if control is not None:
+        control.sleep(wait_time)
+    else:
+        time.sleep(wait_time)
     return wait_time
 
 def calculate_distance(point1, point2):